@@ -2,6 +2,9 @@
 """
 app.py - TARS-AI Mirror Edition (4GB RAM Optimized)
 Soporte para Memoria Inteligente. Sin Servos/Visión.
+Arranque: primero el oído (puedes hablar ya), después UI, personaje,
+memoria y red en paralelo. Lo que digas mientras tanto espera en la cola
+del orquestador. Al final se imprime la cronología del arranque.
 """
 
 import os
@@ -9,6 +12,7 @@ import sys
 import threading
 import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 warnings.filterwarnings("ignore")
 
 # === Configuración de Rutas ===
@@ -16,45 +20,39 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 os.chdir(BASE_DIR)
 sys.path.insert(0, BASE_DIR)
 
+# === Cronología del arranque (antes que ningún otro import) ===
+from modules.module_startup import timeline
+timeline.install_import_hook()
+
 # === Módulos Core ===
-from modules.module_config import load_config
-from modules.module_messageQue import queue_message
+with timeline.step("imports core"):
+    from modules.module_config import load_config
+    from modules.module_messageQue import queue_message
+    from modules.module_settings import get_setting
 
 CONFIG = load_config()
 VERSION = "5.0 (Mirror 4GB)"
 
-# === Imports Esenciales ===
-from modules.module_character import CharacterManager
-from modules.module_tts import update_tts_settings
-from modules.module_llm import initialize_manager_llm
-from modules.module_stt import STTManager
-from modules.module_cputemp import CPUTempModule
-
-# Traemos funciones de lógica principal
-from modules.module_main import (
-    initialize_managers,
-    wake_word_callback,
-    utterance_callback,
-    post_utterance_callback
-)
-
-# === Memoria (Inteligente vs Lite) ===
-# Intentamos cargar la memoria avanzada para aprovechar tus 4GB de RAM
-try:
-    from modules.module_memory import MemoryManager
-    queue_message("LOAD: Smart Memory (Embeddings) ENABLED for 4GB RAM")
-except ImportError as e:
-    # Si faltan librerías pesadas, usamos la Lite por seguridad
-    from modules.module_memory_lite import MemoryManagerLite as MemoryManager
-    queue_message(f"WARNING: Smart Memory libs not found ({e}). Using Lite Mode.")
-
-# === UI (Pantalla) ===
-try:
-    from modules.module_ui import UIManager
-    UI_AVAILABLE = True
-except ImportError:
-    UI_AVAILABLE = False
-    queue_message("WARNING: UI module not found")
+# === Imports Esenciales (lo justo para oír y contestar) ===
+# pygame (UI), los embeddings de la memoria, openai, libsndfile y tiktoken
+# no se importan aquí: se cargan en hilos mientras el micro ya escucha
+with timeline.step("imports oído + orquestador"):
+    from modules.module_tts import update_tts_settings, stop_playback, prewarm_cache
+    from modules.module_llm import initialize_manager_llm, conversation
+    from modules.module_stt import STTManager
+    from modules.module_cputemp import CPUTempModule
+    from modules.module_clients import client_hub
+    from modules.module_turns import turns
+    from modules.module_tracing import tracer, TRACING_HTTP_PORT
+
+    # Traemos funciones de lógica principal
+    from modules.module_main import (
+        initialize_managers,
+        wake_word_callback,
+        utterance_callback,
+        post_utterance_callback,
+        pipeline
+    )
 
 # === Clases Dummy (Batería Falsa) ===
 class BatteryStub:
@@ -64,78 +62,150 @@ class BatteryStub:
     def get_level(self): return 100
     def get_status(self): return "AC Power (Mirror)"
 
+class UIManagerStub:
+    def update_data(self, *args): pass
+    def deactivate_screensaver(self): pass
+    def start(self): pass
+    def stop(self): pass
+
+# === Arranque en paralelo (hilos 'startup') ===
+def start_ui(shutdown_event, battery, cpu_temp):
+    """UI (Pantalla): pygame se importa aquí."""
+    if not CONFIG["UI"]["UI_enabled"]:
+        return UIManagerStub()
+    with timeline.step("UI"):
+        try:
+            from modules.module_ui import UIManager
+        except ImportError:
+            queue_message("WARNING: UI module not found")
+            return UIManagerStub()
+        ui_manager = UIManager(
+            shutdown_event=shutdown_event,
+            battery_module=battery,
+            cpu_temp_module=cpu_temp
+        )
+        ui_manager.start()
+    return ui_manager
+
+def start_brain(ui_future):
+    """Personaje + Memoria (Inteligente vs Lite)."""
+    with timeline.step("memoria (import)"):
+        # Intentamos cargar la memoria avanzada para aprovechar tus 4GB de RAM
+        try:
+            from modules.module_memory import MemoryManager
+            queue_message("LOAD: Smart Memory (Embeddings) ENABLED for 4GB RAM")
+        except ImportError as e:
+            # Si faltan librerías pesadas, usamos la Lite por seguridad
+            from modules.module_memory_lite import MemoryManagerLite as MemoryManager
+            queue_message(f"WARNING: Smart Memory libs not found ({e}). Using Lite Mode.")
+
+    with timeline.step("personaje"):
+        from modules.module_character import CharacterManager
+        char_manager = CharacterManager(config=CONFIG)
+
+    # La memoria avisa por pantalla: necesita la UI ya creada
+    ui_manager = ui_future.result()
+    with timeline.step("memoria"):
+        memory_manager = MemoryManager(
+            config=CONFIG,
+            char_name=char_manager.char_name,
+            char_greeting=char_manager.char_greeting,
+            ui_manager=ui_manager
+        )
+    return char_manager, memory_manager
+
+def warm_network():
+    """Conexiones con OpenAI abiertas (importa openai); después, frases fijas a la caché de voz."""
+    with timeline.step("red"):
+        client_hub.warm_up()
+        prewarm_cache()
+
+def warm_imports():
+    """Lo que la primera frase necesitaría importar: codificador de audio y tokenizador."""
+    with timeline.step("códec + tokenizador"):
+        import soundfile
+        conversation.count.load()
+
 # === Main ===
 if __name__ == "__main__":
     queue_message(f"LOAD: TARS-AI {VERSION} starting...")
-    
+
     shutdown_event = threading.Event()
-    
+
     # Sensores Básicos
     cpu_temp = CPUTempModule()
     battery = BatteryStub()
 
-    # === Inicializar UI ===
-    if UI_AVAILABLE and CONFIG["UI"]["UI_enabled"]:
-        ui_manager = UIManager(
+    # === Gestor de Oído (lo primero: el micro se abre antes que todo lo demás) ===
+    with timeline.step("oído"):
+        stt_manager = STTManager(
+            config=CONFIG,
             shutdown_event=shutdown_event,
-            battery_module=battery,
-            cpu_temp_module=cpu_temp
+            ui_manager=None  # Se enchufa cuando la UI esté lista
         )
-        ui_manager.start()
-    else:
-        class UIManagerStub:
-            def update_data(self, *args): pass
-            def start(self): pass
-            def stop(self): pass
-        ui_manager = UIManagerStub()
-
-    ui_manager.update_data("System", "TARS System Online", "SYSTEM")
-
-    # === Gestores de IA ===
-    char_manager = CharacterManager(config=CONFIG)
-    
-    # Inicializamos la memoria (puede tardar un poco más en arrancar la primera vez)
-    memory_manager = MemoryManager(
-        config=CONFIG,
-        char_name=char_manager.char_name,
-        char_greeting=char_manager.char_greeting,
-        ui_manager=ui_manager
-    )
 
-    # === Gestor de Oído ===
-    stt_manager = STTManager(
-        config=CONFIG,
-        shutdown_event=shutdown_event,
-        ui_manager=ui_manager
-    )
-    
     stt_manager.set_wake_word_callback(wake_word_callback)
     stt_manager.set_utterance_callback(utterance_callback)
     stt_manager.set_post_utterance_callback(post_utterance_callback)
+    # Barge-in: si hablas mientras TARS habla, se calla
+    stt_manager.set_barge_in_callback(stop_playback)
 
-    # === Inicializar Lógica Principal ===
-    initialize_managers(
-        memory_manager,
-        char_manager,
-        stt_manager,
-        ui_manager,
-        shutdown_event,
-        battery
-    )
-    
-    initialize_manager_llm(memory_manager, char_manager)
+    startup = ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup")
+    ui_manager = None
 
     # === Bucle Principal ===
     try:
+        # Orquestador antes que el oído: la primera frase ya tiene quién la conteste
+        pipeline.start()
         stt_manager.start()
-        queue_message("SYSTEM: TARS Listening.")
-        
+
+        # === UI, Gestores de IA y red, en paralelo con el oído ===
+        ui_future = startup.submit(start_ui, shutdown_event, battery, cpu_temp)
+        brain_future = startup.submit(start_brain, ui_future)
+        startup.submit(warm_network)
+        startup.submit(warm_imports)
+
+        if stt_manager.mic_open.wait(5.0):
+            timeline.mark("micro abierto")
+            queue_message("SYSTEM: TARS Listening.")
+
+        ui_manager = ui_future.result()
+        ui_manager.update_data("System", "TARS System Online", "SYSTEM")
+        stt_manager.ui_manager = ui_manager
+        char_manager, memory_manager = brain_future.result()
+
+        # === Inicializar Lógica Principal (libera los turnos que estuvieran esperando) ===
+        initialize_managers(
+            memory_manager,
+            char_manager,
+            stt_manager,
+            ui_manager,
+            shutdown_event,
+            battery
+        )
+
+        initialize_manager_llm(memory_manager, char_manager)
+        tracer.serve(TRACING_HTTP_PORT)  # Solo si TRACING.http_port != 0
+        timeline.mark("TARS listo")
+        startup.shutdown(wait=True)
+        timeline.remove_import_hook()
+        timeline.report(top=get_setting(CONFIG, 'STARTUP', 'report_top', 15))
+
         while not shutdown_event.is_set():
             time.sleep(0.5)
 
     except KeyboardInterrupt:
         shutdown_event.set()
     finally:
+        startup.shutdown(wait=False, cancel_futures=True)
         stt_manager.stop()
-        ui_manager.stop()
+        pipeline.stop()
+        queue_message(f"SYSTEM: Orquestador {pipeline.metrics()}")
+        if ui_manager:
+            ui_manager.stop()
+        queue_message(f"SYSTEM: Conexiones OpenAI {client_hub.metrics()}")
+        queue_message(f"SYSTEM: Turnos {turns.metrics()}")
+        queue_message(f"SYSTEM: Latencias {tracer.histograms()}")
+        tracer.close()
+        client_hub.close()
         queue_message("SYSTEM: TARS Shutdown.")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+bench_audioprep.py - Bytes por frase y tiempo de codificación
+Compara lo que se subía antes (WAV 44.1 kHz estéreo) con la nueva
+preparación (mono 16 kHz + FLAC / Opus) sobre frases sintéticas.
+
+Uso: python3 bench_audioprep.py [--repeat 5]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import numpy as np
+import soundfile as sf
+from modules.module_audioprep import prepare_upload
+
+FS = 44100
+
+
+def make_utterance(seconds, seed=0):
+    """Voz sintética (armónicos + envolvente silábica) con algo de ruido de sala."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * FS)) / FS
+    f0 = 140 * (1 + 0.08 * np.sin(2 * np.pi * 0.5 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / FS
+    voice = sum(np.sin(k * phase) / k for k in range(1, 25))
+    voice *= np.clip(np.sin(2 * np.pi * 4 * t), 0.1, 1)
+    mono = 0.1 * voice / np.max(np.abs(voice)) + 0.002 * rng.standard_normal(len(t))
+    return np.repeat(mono[:, None], 2, axis=1).astype(np.float32)
+
+
+def legacy_wav(recording):
+    buffer = io.BytesIO()
+    buffer.name = 'audio.wav'
+    sf.write(buffer, recording, FS)
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("--- BENCH PREPARACIÓN DE AUDIO (44.1 kHz estéreo -> 16 kHz mono) ---")
+    print(f"{'frase':>6} {'formato':<18}{'bytes':>10}{'ratio':>8}{'resample ms':>13}{'encode ms':>11}")
+    for seconds in (1.5, 4.0, 10.0):
+        recording = make_utterance(seconds)
+
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            base = legacy_wav(recording)
+        wav_ms = 1000 * (time.perf_counter() - t0) / args.repeat
+        base_bytes = len(base.getbuffer())
+        print(f"{seconds:>5.1f}s {'wav 44.1k (antes)':<18}{base_bytes:>10}{1.0:>8.1f}{0.0:>13.2f}{wav_ms:>11.2f}")
+
+        for fmt in ("flac", "opus"):
+            resample_ms = encode_ms = 0.0
+            for _ in range(args.repeat):
+                _, stats = prepare_upload(recording, FS, 16000, fmt)
+                resample_ms += stats["resample_ms"] / args.repeat
+                encode_ms += stats["encode_ms"] / args.repeat
+            label = f"{stats['format']} 16k"
+            ratio = base_bytes / stats["bytes"]
+            print(f"{'':>6} {label:<18}{stats['bytes']:>10}{ratio:>8.1f}{resample_ms:>13.2f}{encode_ms:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+bench_e2e.py - Banco de pruebas de punta a punta (oído -> LLM -> voz) sin hardware
+Arranca fake_api_server.py en otro proceso (latencias, streaming y ritmo
+de síntesis configurables), cambia sounddevice por un micro que reproduce
+un corpus de WAVs en tiempo real y un altavoz mudo que consume al ritmo
+real, y pasa las frases por el STTManager, el orquestador y el TTS de
+verdad. Mide:
+  - latencia por turno: p50 / p95 / p99 de cada etapa (module_tracing)
+  - CPU por etapa: hilos agrupados por nombre durante la prueba completa
+  - CPU y RSS pico por fase (import, solo oído, solo LLM, solo voz,
+    completo), reiniciando VmHWM con /proc/self/clear_refs
+
+Funciona en cualquier Linux sin tarjeta de sonido ni red. Sin --corpus
+usa voz sintética. La API falsa va en otro proceso: su CPU y su memoria
+no cuentan.
+
+Uso: python3 bench_e2e.py [--corpus carpeta_wav] [--turns 5] [--speed 1.0]
+                          [--latency chat=0.35] [--jitter 0.25] [--json resultado.json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import deque
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import numpy as np
+
+FS = 44100          # Lo que abre el STTManager: 44.1 kHz estéreo
+CHANNELS = 2
+SPEED = 1.0         # >1 = el micro y el altavoz van más rápido que el reloj
+
+LATENCY = {"transcriptions": 0.45, "chat": 0.35, "speech": 0.25, "models": 0.05}
+TRANSCRIPTS = [
+    "oye tars qué tiempo va a hacer mañana",
+    "cuéntame algo interesante sobre marte",
+    "cuánto se tarda en llegar a la luna",
+    "recomiéndame una película de ciencia ficción",
+    "por qué el cielo es azul",
+]
+REPLIES = [
+    "Mañana, cielo despejado y veintidós grados. Ideal para que salgas y me dejes en paz un rato.",
+    "Marte tiene el volcán más alto del sistema solar. El Monte Olimpo mide unos veintidós kilómetros.",
+    "Unos tres días con la tecnología de las misiones Apolo. Yo lo haría en menos, pero nadie me pregunta.",
+    "Interstellar. Sale un robot con un ajuste de humor muy parecido al mío, pura coincidencia.",
+    "Por la dispersión de Rayleigh: el aire desvía más la luz azul. Y no, no es un reflejo del mar.",
+]
+
+# Etapa -> trozos del nombre de sus hilos
+STAGE_THREADS = (
+    ("captura+VAD", ("mic-file", "_listen_loop")),
+    ("ASR", ("asr-",)),
+    ("red (API)", ("resilience",)),
+    ("turno/LLM", ("pipe-llm", "context-summary")),
+    ("TTS", ("tts-synth", "tts-producer")),
+    ("altavoz", ("pipe-audio",)),
+    ("orquestador", ("pipeline",)),
+)
+
+
+# === Audio sin hardware ===
+
+class _Tape:
+    """Lo que 'oye' el micro: audio encolado y, cuando no hay, ruido de fondo."""
+    def __init__(self, noise_level=0.002, seed=0):
+        self._lock = threading.Lock()
+        self._chunks = deque()
+        self._offset = 0
+        self.empty = threading.Event()
+        self.empty.set()
+        self.noise_level = noise_level
+        self._rng = np.random.default_rng(seed)
+
+    def queue(self, mono):
+        with self._lock:
+            self._chunks.append(np.asarray(mono, dtype=np.float32))
+            self.empty.clear()
+
+    def read(self, n):
+        out = (self.noise_level * self._rng.standard_normal(n)).astype(np.float32)
+        with self._lock:
+            filled = 0
+            while filled < n and self._chunks:
+                chunk = self._chunks[0]
+                take = min(n - filled, len(chunk) - self._offset)
+                out[filled:filled + take] += chunk[self._offset:self._offset + take]
+                filled += take
+                self._offset += take
+                if self._offset >= len(chunk):
+                    self._chunks.popleft()
+                    self._offset = 0
+            if not self._chunks:
+                self.empty.set()
+        return out
+
+
+TAPE = _Tape()
+
+
+class FileInputStream:
+    """Sustituto de sd.InputStream: entrega TAPE por bloques al ritmo del reloj."""
+    def __init__(self, samplerate=FS, channels=CHANNELS, blocksize=2048, device=None,
+                 dtype='float32', callback=None, **kwargs):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.callback = callback
+        self.latency = 0.01
+        self._running = False
+        self._thread = None
+
+    def __enter__(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="mic-file", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._running = False
+        self._thread.join(1.0)
+
+    def _run(self):
+        period = self.blocksize / self.samplerate / SPEED
+        next_t = time.monotonic()
+        while self._running:
+            mono = TAPE.read(self.blocksize)
+            self.callback(np.repeat(mono[:, None], self.channels, axis=1), self.blocksize, None, None)
+            next_t += period
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+class NullOutputStream:
+    """Sustituto de sd.OutputStream: se traga el audio al ritmo real (buffer de 100 ms)."""
+    def __init__(self, samplerate, channels, blocksize=None, dtype='float32', **kwargs):
+        self.samplerate = samplerate
+        self.latency = 0.02
+        self._clock = time.monotonic()
+
+    def start(self):
+        self._clock = time.monotonic()
+
+    def write(self, data):
+        now = time.monotonic()
+        self._clock = max(self._clock, now) + len(data) / self.samplerate / SPEED
+        ahead = self._clock - now - 0.1
+        if ahead > 0:
+            time.sleep(ahead)
+
+    def stop(self):
+        remaining = self._clock - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def abort(self):
+        self._clock = time.monotonic()
+
+    def close(self):
+        pass
+
+
+def install_sounddevice():
+    """Antes de importar module_stt / module_tts: nada de PortAudio."""
+    sd = types.ModuleType("sounddevice")
+    sd.InputStream = FileInputStream
+    sd.OutputStream = NullOutputStream
+    sys.modules["sounddevice"] = sd
+
+
+# === Corpus ===
+
+def _voice(rng, seconds, level=0.08):
+    """Voz sintética: armónicos con formantes y envolvente silábica (como bench_vad)."""
+    n = int(seconds * FS)
+    t = np.arange(n) / FS
+    f0 = rng.uniform(95, 220) * (1 + 0.05 * np.sin(2 * np.pi * 0.7 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / FS
+    sig = np.zeros(n)
+    for k in range(1, 30):
+        fk = k * f0.mean()
+        if fk > 4000:
+            break
+        w = sum(np.exp(-((fk - f) / 250.0) ** 2) for f in (500, 1500, 2500)) + 0.05
+        sig += w * np.sin(k * phase)
+    sig *= np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t + rng.uniform(0, 6)), 0.15, 1)
+    return (level * sig / np.sqrt(np.mean(sig ** 2))).astype(np.float32)
+
+
+def load_corpus(folder, turns, seed):
+    """Frases mono a 44.1 kHz: los WAV de 'folder' o voz sintética."""
+    from modules.module_resample import downmix, resample
+    if folder:
+        import soundfile as sf
+        corpus = []
+        for path in sorted(glob.glob(os.path.join(folder, "*.wav")))[:turns]:
+            data, fs = sf.read(path, dtype="float32", always_2d=True)
+            corpus.append((os.path.basename(path), resample(downmix(data), fs, FS)))
+        if corpus:
+            return corpus
+        print(f"(sin WAVs en {folder}: se usa voz sintética)")
+    rng = np.random.default_rng(seed)
+    return [(f"sintética {i + 1}", _voice(rng, rng.uniform(1.2, 2.4))) for i in range(turns)]
+
+
+# === API falsa en otro proceso ===
+
+def start_fake_api(args):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    cmd = [sys.executable, os.path.join(BASE_DIR, "fake_api_server.py"), "--port", str(port),
+           "--jitter", str(args.jitter), "--token-delay", str(args.token_delay),
+           "--speech-rtf", str(args.speech_rtf), "--seed", str(args.seed)]
+    latency = dict(LATENCY, **{k: float(v) for k, v in (item.split("=") for item in args.latency)})
+    for route, seconds in latency.items():
+        cmd += ["--latency", f"{route}={seconds}"]
+    for text in REPLIES:
+        cmd += ["--reply", text]
+    for text in TRANSCRIPTS:
+        cmd += ["--transcript", text]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    proc.stdout.readline()  # "API falsa en ..." = ya escucha
+    return proc, f"http://127.0.0.1:{port}/v1", latency
+
+
+# === Medidas ===
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """VmHWM vuelve al RSS actual (Linux >= 4.0). False si no se puede."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class Phase:
+    """CPU, tiempo real y RSS pico de un bloque de código."""
+    results = []
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.exact_peak = _reset_peak_rss()
+        self.t0, self.cpu0 = time.monotonic(), _cpu_seconds()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.monotonic() - self.t0
+        self.cpu = _cpu_seconds() - self.cpu0
+        peak_kb = _status_kb("VmHWM") or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.peak_mb = peak_kb / 1024
+        Phase.results.append(self)
+
+
+class ThreadCPU:
+    """Muestrea la CPU de cada hilo (/proc/self/task) y la reparte por etapas."""
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.tick = os.sysconf("SC_CLK_TCK")
+        self._seen = {}  # tid -> (nombre, ticks al empezar, último valor)
+        self._running = False
+
+    def _ticks(self, tid):
+        try:
+            with open(f"/proc/self/task/{tid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return int(fields[11]) + int(fields[12])  # utime + stime
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def sample(self):
+        for thread in threading.enumerate():
+            tid = thread.native_id
+            ticks = self._ticks(tid) if tid else None
+            if ticks is None:
+                continue
+            name, start, _ = self._seen.get(tid, (thread.name, ticks, ticks))
+            self._seen[tid] = (name, start, ticks)
+
+    def _loop(self):
+        while self._running:
+            self.sample()
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._running = True
+        self.sample()
+        self._thread = threading.Thread(target=self._loop, name="bench-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._running = False
+        self._thread.join()
+        self.sample()
+
+    def by_stage(self):
+        totals = {}
+        for name, start, last in self._seen.values():
+            if name == "bench-sampler":
+                continue
+            stage = next((label for label, parts in STAGE_THREADS if any(p in name for p in parts)), "otros")
+            totals[stage] = totals.get(stage, 0.0) + (last - start) / self.tick
+        return totals
+
+
+# === Prueba ===
+
+def speak_corpus(corpus, ready, timeout=30.0, lead=0.4, tail=1.0):
+    """Dice cada frase al micro y espera (con el micro abierto) a que ready(n) se cumpla."""
+    for i, (name, audio) in enumerate(corpus):
+        TAPE.queue(np.zeros(int(lead * FS), dtype=np.float32))
+        TAPE.queue(audio)
+        TAPE.queue(np.zeros(int(tail * FS), dtype=np.float32))
+        TAPE.empty.wait()
+        t0 = time.monotonic()
+        while not ready(i + 1):
+            if time.monotonic() - t0 > timeout:
+                print(f"   ⚠️ '{name}': sin respuesta en {timeout:.0f}s")
+                break
+            time.sleep(0.02)
+
+
+def main():
+    global SPEED
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=None, help="Carpeta con WAVs (una frase por fichero)")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--speed", type=float, default=1.0, help="Ritmo del micro/altavoz frente al reloj")
+    parser.add_argument("--latency", action="append", default=[], metavar="RUTA=SEGUNDOS")
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--token-delay", type=float, default=0.03)
+    parser.add_argument("--speech-rtf", type=float, default=0.25)
+    parser.add_argument("--cache", action="store_true", help="Dejar activas las cachés de LLM y TTS")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="Guardar el resultado en este fichero")
+    args = parser.parse_args()
+    SPEED = args.speed
+
+    print(f"--- BENCH DE PUNTA A PUNTA ({args.turns} turnos, micro x{SPEED:g}) ---")
+    install_sounddevice()
+    proc, base_url, latency = start_fake_api(args)
+    print(f"API falsa en {base_url}  latencias {latency}  jitter {args.jitter}")
+
+    try:
+        with Phase("import"):
+            from modules.module_config import load_config
+            from modules.module_clients import client_hub
+            from modules.module_state import tars_state, IDLE, THINKING
+            from modules.module_stt import STTManager
+            from modules.module_tracing import tracer
+            from modules.module_turns import turns
+            import modules.module_llm as llm
+            import modules.module_main as main_logic
+            import modules.module_tts as tts
+            from modules.module_ttscache import TTSCache
+
+        client_hub.point_to(base_url, api_key="bench")
+        tracer.jsonl_path = None
+        workdir = tempfile.TemporaryDirectory()
+
+        def fresh_tts_cache(name):
+            # Vacía en cada fase: sin --cache todo pasa por la "red"
+            if not args.cache:
+                tts.tts_cache = TTSCache(os.path.join(workdir.name, name), 16 << 20, 4 << 20)
+        if not args.cache:
+            llm.CACHE_ENABLED = False
+        corpus = load_corpus(args.corpus, args.turns, args.seed)
+        print(f"Corpus: {', '.join(f'{n} ({len(a) / FS:.1f}s)' for n, a in corpus)}")
+
+        shutdown_event = threading.Event()
+        stt = STTManager(config=load_config(), shutdown_event=shutdown_event, ui_manager=None)
+
+        # 1. Solo oído: captura + VAD + fin de frase + ASR
+        print("\n1. Solo oído...")
+        heard = []
+
+        def on_text(text, trace=None):
+            tracer.finish(trace, "ok")
+            heard.append(text)
+            tars_state.set(IDLE, expected=THINKING)
+        stt.set_utterance_callback(on_text)
+        with Phase("solo oído"):
+            stt.start()
+            speak_corpus(corpus, lambda n: len(heard) >= n)
+        print(f"   {len(heard)} de {len(corpus)} frases transcritas")
+
+        # 2. Solo LLM (streaming)
+        print("2. Solo LLM...")
+        llm_ms = []
+        with Phase("solo LLM"):
+            for text in heard or TRANSCRIPTS[:args.turns]:
+                t0 = time.monotonic()
+                first = None
+                for _ in llm.stream_completion(text):
+                    first = first or time.monotonic()
+                llm_ms.append((1000 * (first - t0), 1000 * (time.monotonic() - t0)))
+
+        # 3. Solo voz: TTS + remuestreo + altavoz mudo
+        print("3. Solo voz...")
+        fresh_tts_cache("voz")
+        with Phase("solo voz"):
+            for text in REPLIES[:args.turns]:
+                tts.speak_text(text)
+
+        # 4. Todo junto, con el orquestador
+        print("4. Punta a punta...")
+        tracer.reset()
+        fresh_tts_cache("e2e")
+        done = [0]
+        take_turn = main_logic.pipeline.respond
+
+        def counted(text, trace=None):
+            try:
+                take_turn(text, trace)
+            finally:
+                done[0] += 1
+        main_logic.pipeline.respond = counted
+        main_logic.initialize_managers(None, None, stt, None, shutdown_event, None)
+        stt.set_utterance_callback(main_logic.utterance_callback)
+        main_logic.pipeline.start()
+        with Phase("punta a punta"), ThreadCPU() as cpu:
+            speak_corpus(corpus, lambda n: done[0] >= n and tars_state.state == IDLE)
+        stt.stop()
+        main_logic.pipeline.stop()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    # === Informe ===
+    hist = tracer.histograms()
+    print(f"\nLatencias por turno (ms, {tracer.stats['ok']} turnos completos)")
+    print(f"  {'etapa':<18}{'p50':>9}{'p95':>9}{'p99':>9}{'media':>9}")
+    for name, row in hist.items():
+        print(f"  {name:<18}{row['p50']:>9.0f}{row['p95']:>9.0f}{row['p99']:>9.0f}{row['mean']:>9.0f}")
+    if llm_ms:
+        first, total = np.array(llm_ms).T
+        print(f"  (solo LLM: primer token p50 {np.percentile(first, 50):.0f} ms, "
+              f"respuesta entera p50 {np.percentile(total, 50):.0f} ms)")
+
+    stage_cpu = cpu.by_stage()
+    busy = sum(stage_cpu.values()) or 1e-9
+    print(f"\nCPU por etapa en la prueba completa ({Phase.results[-1].wall:.1f}s de reloj)")
+    for stage, seconds in sorted(stage_cpu.items(), key=lambda kv: -kv[1]):
+        print(f"  {stage:<18}{seconds:>8.2f} s{100 * seconds / busy:>7.0f}%")
+
+    exact = all(p.exact_peak for p in Phase.results)
+    print(f"\nPor fase{'' if exact else ' (sin clear_refs: el pico es el de todo el proceso)'}")
+    print(f"  {'fase':<18}{'real s':>9}{'CPU s':>9}{'RSS pico MB':>13}")
+    for p in Phase.results:
+        print(f"  {p.name:<18}{p.wall:>9.2f}{p.cpu:>9.2f}{p.peak_mb:>13.1f}")
+    print(f"\nTurnos: {turns.metrics()}")
+    print(f"Conexiones: {client_hub.metrics()}")
+
+    if args.json:
+        result = {
+            "turns": args.turns, "speed": SPEED, "latency": latency, "jitter": args.jitter,
+            "histograms_ms": hist, "traces": tracer.recent(args.turns),
+            "cpu_by_stage_s": {k: round(v, 3) for k, v in stage_cpu.items()},
+            "phases": [{"name": p.name, "wall_s": round(p.wall, 3), "cpu_s": round(p.cpu, 3),
+                        "peak_rss_mb": round(p.peak_mb, 1), "exact_peak": p.exact_peak}
+                       for p in Phase.results],
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+        print(f"Resultado en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
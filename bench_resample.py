@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+bench_resample.py - Remuestreo en proceso vs ffmpeg
+Mide tiempo real y CPU de las dos conversiones del camino de audio:
+  - TTS: PCM 24 kHz mono -> 44.1 kHz estéreo (altavoz)
+  - STT: captura 44.1 kHz estéreo -> 16 kHz mono (Whisper)
+con module_resample (de golpe y por trozos) frente a lanzar
+'ffmpeg -ar <fs> -ac <canales>' como subproceso con archivos WAV.
+
+Uso: python3 bench_resample.py [--seconds 5] [--repeat 5]
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import numpy as np
+import soundfile as sf
+from modules.module_resample import StreamResampler, design_filter, map_channels, resample
+
+CASES = (
+    ("tts 24k mono -> 44.1k est.", 24000, 1, 44100, 2),
+    ("stt 44.1k est. -> 16k mono", 44100, 2, 16000, 1),
+)
+
+
+def make_signal(seconds, fs, channels, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * fs)) / fs
+    mono = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.01 * rng.standard_normal(len(t))
+    return map_channels(mono.astype(np.float32), channels)
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def timed(fn, repeat):
+    """Devuelve (ms reales, ms de CPU propios + de hijos) por iteración."""
+    wall0, cpu0, child0 = time.perf_counter(), time.process_time(), children_cpu()
+    for _ in range(repeat):
+        out = fn()
+    wall = time.perf_counter() - wall0
+    cpu = (time.process_time() - cpu0) + (children_cpu() - child0)
+    return 1000 * wall / repeat, 1000 * cpu / repeat, out
+
+
+def in_process(audio, fs_in, fs_out, channels):
+    return map_channels(resample(audio, fs_in, fs_out), channels)
+
+
+def streamed(audio, fs_in, fs_out, channels, chunk_ms=100):
+    resampler = StreamResampler(fs_in, fs_out)
+    step = int(fs_in * chunk_ms / 1000)
+    parts = [resampler.process(audio[i:i + step]) for i in range(0, len(audio), step)]
+    parts.append(resampler.flush())
+    return map_channels(np.concatenate(parts), channels)
+
+
+def with_ffmpeg(audio, fs_in, fs_out, channels, workdir):
+    src = os.path.join(workdir, "in.wav")
+    dst = os.path.join(workdir, "out.wav")
+    sf.write(src, audio, fs_in, subtype="FLOAT")
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", src,
+                    "-ar", str(fs_out), "-ac", str(channels), "-c:a", "pcm_f32le", dst],
+                   check=True)
+    out, _ = sf.read(dst, dtype="float32")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ffmpeg = shutil.which("ffmpeg")
+    print(f"--- BENCH REMUESTREO ({args.seconds:.1f}s de audio, {args.repeat} repeticiones) ---")
+    if not ffmpeg:
+        print("(ffmpeg no está instalado: solo se mide el remuestreo en proceso)")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, fs_in, ch_in, fs_out, ch_out in CASES:
+            audio = make_signal(args.seconds, fs_in, ch_in)
+            design_filter.cache_clear()
+            t0 = time.perf_counter()
+            in_process(audio[:fs_in // 10], fs_in, fs_out, ch_out)
+            first_ms = 1000 * (time.perf_counter() - t0)
+
+            print(f"\n{label}  (diseño del kernel + primera llamada: {first_ms:.1f} ms)")
+            print(f"  {'método':<22}{'real ms':>10}{'CPU ms':>10}{'x tiempo real':>15}")
+            runs = [("en proceso", lambda: in_process(audio, fs_in, fs_out, ch_out)),
+                    ("en proceso, trozos", lambda: streamed(audio, fs_in, fs_out, ch_out))]
+            if ffmpeg:
+                runs.append(("ffmpeg subproceso", lambda: with_ffmpeg(audio, fs_in, fs_out, ch_out, workdir)))
+
+            reference = None
+            for name, fn in runs:
+                wall_ms, cpu_ms, out = timed(fn, args.repeat)
+                speed = 1000 * args.seconds / max(wall_ms, 1e-6)
+                line = f"  {name:<22}{wall_ms:>10.2f}{cpu_ms:>10.2f}{speed:>14.0f}x"
+                if reference is None:
+                    reference = out
+                else:
+                    n = min(len(out), len(reference))
+                    line += f"   max dif. {np.max(np.abs(out[:n] - reference[:n])):.1e}"
+                print(line)
+        print(f"\nKernels en caché: {design_filter.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+conftest.py - Las pruebas importan como app.py: modules.module_x
+En la Raspberry estos ficheros viven dentro del paquete 'modules'; en un
+checkout suelto no hay tal paquete, así que se registra este directorio
+como 'modules' (sin tocar nada si ya existe uno de verdad).
+"""
+
+import importlib.util
+import os
+import sys
+import types
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+if importlib.util.find_spec("modules") is None:
+    package = types.ModuleType("modules")
+    package.__path__ = [BASE_DIR]
+    package.__file__ = os.path.join(BASE_DIR, "__init__.py")
+    sys.modules["modules"] = package
+
+# Diagnóstico de hardware (micro/altavoz) a ejecutar a mano, no es una prueba
+collect_ignore = ["test_crash.py"]
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+fake_api_server.py - Imitación local de la API de OpenAI con fallos a la carta
+Responde lo justo para Whisper, chat (normal y en streaming), TTS en PCM
+y /models, y permite inyectar retrasos o errores por ruta para probar
+plazos, peticiones duplicadas y cortacircuitos sin tocar la red.
+
+Rutas: "models", "transcriptions", "chat", "speech".
+
+Realismo (para bench_e2e.py): latencia base por ruta con dispersión
+log-normal (en el chat es el tiempo hasta el primer token), retardo entre
+tokens, TTS que entrega el audio al ritmo de síntesis (speech_rtf segundos
+por segundo de audio) y varias respuestas / transcripciones que se turnan.
+
+Uso como programa:
+  python3 fake_api_server.py --port 8765 --delay chat=2.0 --status speech=500
+  python3 fake_api_server.py --latency chat=0.4 --latency speech=0.25 --jitter 0.3
+y luego CLIENTS.base_url = http://127.0.0.1:8765/v1
+
+Uso desde código:
+  server = FakeAPIServer().start()
+  server.inject("chat", delay=3.0, times=1)   # Solo la próxima petición
+  ...
+  server.stop()
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+PCM_RATE = 24000
+
+
+class Fault:
+    def __init__(self, delay=0.0, status=200, times=None):
+        self.delay = delay
+        self.status = status
+        self.times = times  # None = todas las peticiones
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # El cliente cerró la conexión (plazo vencido, turno cancelado): no es un error
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeAPIServer:
+    def __init__(self, host="127.0.0.1", port=0, reply="Afirmativo. Todo en orden, humano.",
+                 transcript="hola tars", token_delay=0.01, speech_seconds_per_char=0.06,
+                 replies=None, transcripts=None, latency=None, jitter=0.0, speech_rtf=0.0, seed=None):
+        self.reply = reply
+        self.transcript = transcript
+        self.replies = replies            # Si hay lista, se turnan (si no, siempre 'reply')
+        self.transcripts = transcripts
+        self.token_delay = token_delay
+        self.speech_seconds_per_char = speech_seconds_per_char
+        self.latency = dict(latency or {})  # ruta -> segundos antes de responder
+        self.jitter = jitter                # sigma log-normal (0 = latencia fija)
+        self.speech_rtf = speech_rtf        # 0 = todo el audio de golpe
+        self._rng = np.random.default_rng(seed)
+        self._faults = {}
+        self._lock = threading.Lock()
+        self.requests = {"models": 0, "transcriptions": 0, "chat": 0, "speech": 0}
+        server = self
+
+        class Handler(_Handler):
+            api = server
+
+        self.httpd = _Server((host, port), Handler)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # --- Fallos ---
+    def inject(self, route, delay=0.0, status=200, times=None):
+        """Retraso (s) y/o código de error para las próximas 'times' peticiones a 'route'."""
+        with self._lock:
+            self._faults.setdefault(route, []).append(Fault(delay, status, times))
+
+    def clear(self, route=None):
+        with self._lock:
+            if route is None:
+                self._faults.clear()
+            else:
+                self._faults.pop(route, None)
+
+    # --- Realismo ---
+    def latency_for(self, route):
+        base = self.latency.get(route, 0.0)
+        if not base or not self.jitter:
+            return base
+        with self._lock:
+            return base * float(self._rng.lognormal(0.0, self.jitter))
+
+    def next_text(self, route):
+        """La respuesta o transcripción de turno (se turnan si hay varias)."""
+        options = self.replies if route == "chat" else self.transcripts
+        if not options:
+            return self.reply if route == "chat" else self.transcript
+        return options[(self.requests[route] - 1) % len(options)]
+
+    def _take_fault(self, route):
+        with self._lock:
+            self.requests[route] += 1
+            faults = self._faults.get(route)
+            if not faults:
+                return None
+            fault = faults[0]
+            if fault.times is not None:
+                fault.times -= 1
+                if fault.times <= 0:
+                    faults.pop(0)
+            return fault
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, como la API de verdad
+    api = None
+
+    def log_message(self, *args):
+        pass
+
+    # --- Utilidades ---
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # El cliente ya no espera (plazo vencido)
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _fault(self, route):
+        """Aplica el fallo inyectado. Devuelve True si ya se ha respondido con error."""
+        fault = self.api._take_fault(route)
+        delay = self.api.latency_for(route)
+        if delay:
+            time.sleep(delay)  # Latencia normal de la ruta (antes de cualquier fallo)
+        if fault is None:
+            return False
+        if fault.delay:
+            time.sleep(fault.delay)
+        if fault.status != 200:
+            self._json({"error": {"message": f"fallo inyectado ({fault.status})", "type": "server_error"}},
+                       status=fault.status)
+            return True
+        return False
+
+    # --- Rutas ---
+    def do_GET(self):
+        match = re.match(r"^/v1/models/([^/?]+)", self.path)
+        if not match:
+            return self._json({"error": {"message": "no encontrado"}}, status=404)
+        if self._fault("models"):
+            return
+        self._json({"id": match.group(1), "object": "model", "created": 0, "owned_by": "fake"})
+
+    def do_POST(self):
+        body = self._body()
+        if self.path.startswith("/v1/audio/transcriptions"):
+            if self._fault("transcriptions"):
+                return
+            return self._json({"text": self.api.next_text("transcriptions")})
+        if self.path.startswith("/v1/chat/completions"):
+            request = json.loads(body or b"{}")
+            if self._fault("chat"):
+                return
+            reply = self.api.next_text("chat")
+            return self._chat_stream(reply) if request.get("stream") else self._chat(reply)
+        if self.path.startswith("/v1/audio/speech"):
+            request = json.loads(body or b"{}")
+            if self._fault("speech"):
+                return
+            return self._speech(request.get("input", ""))
+        self._json({"error": {"message": "no encontrado"}}, status=404)
+
+    def _chat(self, reply):
+        self._json({
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+            "model": "fake",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def _chat_stream(self, reply):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in re.findall(r"\S+\s*", reply):
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                         "created": int(time.time()), "model": "fake",
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                time.sleep(self.api.token_delay)
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # El cliente cortó (p.ej. perdió la carrera)
+
+    def _speech(self, text):
+        seconds = max(0.2, len(text) * self.api.speech_seconds_per_char)
+        t = np.arange(int(seconds * PCM_RATE)) / PCM_RATE
+        pcm = (0.2 * 32767 * np.sin(2 * np.pi * 180 * t)).astype("<i2").tobytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/pcm")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            step = PCM_RATE // 5  # 100 ms por trozo
+            for i in range(0, len(pcm), step):
+                self._chunk(pcm[i:i + step])
+                if self.api.speech_rtf:
+                    time.sleep(0.1 * self.api.speech_rtf)  # Al ritmo de la síntesis
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", action="append", default=[], metavar="RUTA=SEGUNDOS")
+    parser.add_argument("--status", action="append", default=[], metavar="RUTA=CODIGO")
+    parser.add_argument("--latency", action="append", default=[], metavar="RUTA=SEGUNDOS")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--speech-rtf", type=float, default=0.0)
+    parser.add_argument("--reply", action="append", default=[], help="Respuestas del chat (se turnan)")
+    parser.add_argument("--transcript", action="append", default=[], help="Transcripciones (se turnan)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    latency = {route: float(value) for route, value in (item.split("=") for item in args.latency)}
+    server = FakeAPIServer(port=args.port, latency=latency, jitter=args.jitter, token_delay=args.token_delay,
+                           speech_rtf=args.speech_rtf, replies=args.reply or None,
+                           transcripts=args.transcript or None, seed=args.seed)
+    for item in args.delay:
+        route, value = item.split("=")
+        server.inject(route, delay=float(value))
+    for item in args.status:
+        route, value = item.split("=")
+        server.inject(route, status=int(value))
+    print(f"API falsa en {server.base_url} (Ctrl+C para salir)", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+module_aec.py - Cancelación de eco acústico (AEC)
+Para poder escuchar mientras TARS habla hay que quitar del micrófono su
+propia voz. El TTS deja aquí lo que reproduce (la "referencia") y el oído
+lo resta con un filtro adaptativo NLMS en frecuencia (overlap-save).
+Un detector de doble habla congela la adaptación cuando tú también
+hablas (el eco residual se dispara de golpe), para que el filtro no
+aprenda a borrarte.
+"""
+
+import threading
+import numpy as np
+from modules.module_audiobuffer import AudioRingBuffer
+from modules.module_resample import downmix
+
+
+class PlaybackReference:
+    """Lo que sale por el altavoz, en mono y con posiciones absolutas."""
+    def __init__(self, fs=44100, seconds=5.0, blocksize=2048):
+        self.fs = fs
+        self.ring = AudioRingBuffer(seconds, fs, 1, blocksize=blocksize)
+        self.output_latency = 0.0  # Segundos, lo rellena quien abre el OutputStream
+        self._lock = threading.Lock()
+        self.active = False
+
+    @property
+    def total(self):
+        return self.ring.total
+
+    def push(self, block):
+        """Llamar con cada bloque que se escribe al altavoz (frames, canales) o mono."""
+        mono = downmix(block)
+        with self._lock:
+            self.ring.write(mono.reshape(-1, 1))
+
+    def read(self, start, end):
+        with self._lock:
+            return self.ring.read(start, end)[:, 0]
+
+
+# Referencia compartida entre module_tts (escribe) y module_stt (lee)
+playback_reference = PlaybackReference()
+
+
+class EchoCanceller:
+    def __init__(self, block=2048, mu=0.25, power_smoothing=0.9, dt_margin_db=8.0, dt_hold=4):
+        self.N = block
+        self.mu = mu
+        self.beta = power_smoothing
+        self.dt_margin_db = dt_margin_db
+        self.dt_hold = dt_hold
+        self.reset()
+
+    def reset(self):
+        N = self.N
+        self.W = np.zeros(N + 1, dtype=np.complex128)   # Filtro en frecuencia (rfft de 2N)
+        self.P = None                                    # Potencia de la referencia por bin
+        self._x_prev = np.zeros(N)
+        self._dt_hold = 0
+        self.double_talk = False
+        self.erle_db = 0.0
+        self.erle_smooth = 0.0
+
+    def process(self, mic, ref):
+        """mic y ref: bloques mono de N muestras. Devuelve el micro sin eco."""
+        N = self.N
+        x = np.concatenate((self._x_prev, ref))
+        self._x_prev = ref.astype(np.float64, copy=True)
+
+        X = np.fft.rfft(x)
+        echo = np.fft.irfft(X * self.W)[N:]
+        e = mic - echo
+
+        mic_pow = float(np.dot(mic, mic)) + 1e-12
+        err_pow = float(np.dot(e, e)) + 1e-12
+        self.erle_db = 10.0 * np.log10(mic_pow / err_pow)
+
+        # Doble habla: con el filtro ya convergido, el residuo sube de repente
+        if self.erle_smooth > 6.0 and self.erle_db < self.erle_smooth - self.dt_margin_db:
+            self._dt_hold = self.dt_hold
+        elif self._dt_hold > 0:
+            self._dt_hold -= 1
+        self.double_talk = self._dt_hold > 0
+        self.erle_smooth = 0.95 * self.erle_smooth + 0.05 * self.erle_db
+
+        if not self.double_talk:
+            power = np.abs(X) ** 2
+            self.P = power if self.P is None else self.beta * self.P + (1 - self.beta) * power
+            E = np.fft.rfft(np.concatenate((np.zeros(N), e)))
+            G = self.mu * np.conj(X) * E / (self.P + 0.01 * self.P.mean() + 1e-10)
+            g = np.fft.irfft(G)[:N]  # Restricción de gradiente (filtro causal de N taps)
+            self.W += np.fft.rfft(np.concatenate((g, np.zeros(N))))
+
+        return e.astype(np.float32)
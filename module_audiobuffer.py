@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+module_audiobuffer.py - Buffer circular de audio preasignado
+El micrófono escribe aquí de forma continua. Las posiciones son absolutas
+(frames desde el arranque), así el oído puede pedir "desde 300 ms antes
+de que empezaras a hablar" sin haber estado grabando.
+"""
+
+import threading
+import numpy as np
+
+
+class AudioRingBuffer:
+    def __init__(self, seconds, fs, channels, blocksize=2048, dtype=np.float32):
+        self.fs = fs
+        self.channels = channels
+        self.blocksize = blocksize
+        # Capacidad múltiplo del bloque: un bloque nunca cruza el final del buffer
+        blocks = max(2, int(np.ceil(seconds * fs / blocksize)))
+        self.capacity = blocks * blocksize
+        self._buf = np.zeros((self.capacity, channels), dtype=dtype)
+        self.total = 0  # Frames escritos desde el arranque
+        self.data_ready = threading.Event()
+
+    @property
+    def oldest(self):
+        """Primer frame absoluto que sigue disponible en el buffer."""
+        return max(0, self.total - self.capacity)
+
+    def write(self, chunk):
+        """Copia el bloque dentro del buffer (sin reservar memoria)."""
+        n = len(chunk)
+        if n >= self.capacity:
+            chunk = chunk[-self.capacity:]
+            self.total += n - self.capacity
+            n = self.capacity
+
+        start = self.total % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            self._buf[start:end] = chunk
+        else:
+            first = self.capacity - start
+            self._buf[start:] = chunk[:first]
+            self._buf[:n - first] = chunk[first:]
+
+        self.total += n
+        self.data_ready.set()
+
+    def view(self, start, frames):
+        """Vista sin copia de [start, start+frames). Solo válida si no cruza el final."""
+        offset = start % self.capacity
+        if offset + frames > self.capacity:
+            return self.read(start, start + frames)
+        return self._buf[offset:offset + frames]
+
+    def read(self, start, end=None):
+        """Extrae [start, end) con una única copia. Recorta lo ya sobrescrito."""
+        if end is None:
+            end = self.total
+        start = max(start, self.oldest)
+        end = min(end, self.total)
+        if end <= start:
+            return np.empty((0, self.channels), dtype=self._buf.dtype)
+
+        n = end - start
+        offset = start % self.capacity
+        if offset + n <= self.capacity:
+            return self._buf[offset:offset + n].copy()
+
+        out = np.empty((n, self.channels), dtype=self._buf.dtype)
+        first = self.capacity - offset
+        out[:first] = self._buf[offset:]
+        out[first:] = self._buf[:n - first]
+        return out
+
+    def seconds(self, frames):
+        return frames / float(self.fs)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+module_audioprep.py - Preparación del audio antes de subirlo a Whisper
+La captura va a 44.1 kHz estéreo float; Whisper solo necesita 16 kHz mono.
+Aquí: mezcla a mono -> remuestreo polifásico con filtro anti-aliasing ->
+recorte de silencios -> compresión FLAC (u Opus si libsndfile lo trae).
+~10x menos bytes por frase.
+"""
+
+import io
+import time
+
+import numpy as np
+from modules.module_resample import downmix, resample
+
+
+def trim_silence(audio, fs, margin_ms=150, max_pause_ms=500, frame_ms=10,
+                 min_snr_db=8.0, dynamic_range_db=45.0):
+    """
+    Quita el silencio del principio y del final (dejando margin_ms) y acorta
+    las pausas internas a max_pause_ms. El umbral se saca del propio audio:
+    por encima del ruido de fondo (percentil 10) y como mucho 45 dB bajo el pico.
+    Devuelve (audio recortado, segundos ahorrados).
+    """
+    frame = max(1, int(fs * frame_ms / 1000))
+    n_frames = len(audio) // frame
+    if n_frames < 3:
+        return audio, 0.0
+
+    mono = downmix(audio)
+    frames = mono[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10.0 * np.log10(np.einsum('ij,ij->i', frames, frames) / frame + 1e-12)
+    noise, peak = np.percentile(energy_db, [10, 99])
+    if peak - noise < min_snr_db:
+        return audio, 0.0  # Todo parece ruido: no tocamos nada
+    active = energy_db > max(noise + min_snr_db, peak - dynamic_range_db)
+
+    margin = int(round(margin_ms / frame_ms))
+    max_pause = int(round(max_pause_ms / frame_ms))
+    keep = np.ones(n_frames, dtype=bool)
+
+    # Tramos de silencio: bordes donde cambia 'active'
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], active.astype(np.int8), [1]))))
+    for start, end in zip(edges[::2], edges[1::2]):
+        if start == 0:
+            keep[:max(0, end - margin)] = False
+        elif end == n_frames:
+            keep[start + margin:] = False
+        elif end - start > max_pause:
+            keep[start + max_pause // 2:end - (max_pause - max_pause // 2)] = False
+
+    if keep.all():
+        return audio, 0.0
+    sample_keep = np.repeat(keep, frame)
+    tail = len(audio) - len(sample_keep)
+    if tail:
+        sample_keep = np.concatenate((sample_keep, np.full(tail, keep[-1])))
+    trimmed = audio[sample_keep]
+    return trimmed, (len(audio) - len(trimmed)) / float(fs)
+
+
+def encode(audio, fs, fmt="flac"):
+    """Codifica a FLAC/Opus/WAV en memoria. Devuelve un BytesIO con .name para la API."""
+    import soundfile as sf  # libsndfile: se carga en la primera frase (o al calentar), no al arrancar
+    fmt = (fmt or "flac").lower()
+    if fmt == "opus" and "OPUS" not in sf.available_subtypes("OGG"):
+        fmt = "flac"
+
+    buffer = io.BytesIO()
+    if fmt == "opus":
+        buffer.name = "audio.ogg"
+        sf.write(buffer, audio, fs, format="OGG", subtype="OPUS")
+    elif fmt == "wav":
+        buffer.name = "audio.wav"
+        sf.write(buffer, audio, fs, format="WAV", subtype="PCM_16")
+    else:
+        buffer.name = "audio.flac"
+        sf.write(buffer, audio, fs, format="FLAC", subtype="PCM_16")
+    buffer.seek(0)
+    return buffer
+
+
+def condition(recording, fs, target_fs=16000, trim=None):
+    """
+    Captura cruda -> mono a target_fs (y sin silencios si trim no es None).
+    trim: None para no recortar, o dict con los parámetros de trim_silence.
+    """
+    t0 = time.perf_counter()
+    mono = resample(downmix(recording), fs, target_fs)
+    trimmed_seconds = 0.0
+    if trim is not None:
+        mono, trimmed_seconds = trim_silence(mono, target_fs, **trim)
+    np.clip(mono, -1.0, 1.0, out=mono)
+
+    stats = {
+        "raw_bytes": int(recording.size * 2),  # Lo que pesaba el WAV PCM_16 de antes
+        "resample_ms": 1000 * (time.perf_counter() - t0),
+        "seconds": len(recording) / float(fs),
+        "trimmed_seconds": trimmed_seconds,
+    }
+    return mono, stats
+
+
+def prepare_upload(recording, fs, target_fs=16000, fmt="flac", trim=None):
+    """Captura cruda -> archivo comprimido listo para transcribir, más estadísticas."""
+    mono, stats = condition(recording, fs, target_fs, trim)
+    t0 = time.perf_counter()
+    buffer = encode(mono, target_fs, fmt)
+    stats["encode_ms"] = 1000 * (time.perf_counter() - t0)
+    stats["bytes"] = len(buffer.getbuffer())
+    stats["format"] = encoded_format(buffer)
+    return buffer, stats
+
+
+def encoded_format(buffer):
+    return "opus" if buffer.name.endswith(".ogg") else buffer.name.rsplit(".", 1)[-1]
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+module_clients.py - Un solo cliente de OpenAI para oído, cerebro y voz
+Antes cada módulo creaba su propio OpenAI() (el TTS uno por frase) y cada
+conexión nueva era un handshake TCP+TLS en mitad del turno. Aquí hay un
+único cliente con un pool httpx keep-alive que se calienta al arrancar,
+una sola forma de encontrar la API key y contadores de reutilización de
+conexiones (extensión 'trace' de httpx).
+
+Ajustes (sección CLIENTS):
+  max_connections 8, keepalive_connections 4, keepalive_expiry 90 (s),
+  connect_timeout 5, read_timeout 30, warm_connections 2,
+  max_retries 0 (los reintentos los decide module_resilience),
+  base_url (vacío = api.openai.com; útil para apuntar a un servidor local)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from modules.module_config import load_config
+from modules.module_settings import get_setting
+
+# openai (con pydantic) y httpx tardan en importarse: se cargan al crear el cliente,
+# en el hilo que calienta la red al arrancar, no al importar este módulo
+OpenAI = None
+httpx = None
+
+
+def _load_libraries():
+    """Importa openai / httpx la primera vez. False si no está openai."""
+    global OpenAI, httpx
+    if OpenAI is None:
+        try:
+            from openai import OpenAI
+        except ImportError:
+            return False
+    if httpx is None:
+        try:
+            import httpx
+        except ImportError:
+            pass
+    return True
+
+
+def resolve_api_key(config):
+    """Clave de OpenAI: LLM.api_key, TTS.openai_api_key, STT.openai_api_key o OPENAI_API_KEY."""
+    for section, key in (('LLM', 'api_key'), ('TTS', 'openai_api_key'), ('STT', 'openai_api_key')):
+        value = get_setting(config, section, key, None)
+        if value:
+            return value
+    return os.environ.get("OPENAI_API_KEY")
+
+
+class _ConnectionStats:
+    """Cuenta peticiones, conexiones nuevas y handshakes a partir de la traza de httpcore."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.connect_ms = deque(maxlen=100)
+        self.tls_ms = deque(maxlen=100)
+
+    def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        started = {}
+
+        def trace(event, info):
+            if event.endswith(".started"):
+                started[event[:-8]] = time.perf_counter()
+                return
+            if event == "connection.connect_tcp.complete":
+                with self._lock:
+                    self.connections += 1
+                    self.connect_ms.append(1000 * (time.perf_counter() - started.get("connection.connect_tcp", time.perf_counter())))
+            elif event == "connection.start_tls.complete":
+                with self._lock:
+                    self.tls_handshakes += 1
+                    self.tls_ms.append(1000 * (time.perf_counter() - started.get("connection.start_tls", time.perf_counter())))
+
+        request.extensions["trace"] = trace
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(0, self.requests - self.connections)
+            return {
+                "requests": self.requests,
+                "new_connections": self.connections,
+                "tls_handshakes": self.tls_handshakes,
+                "reused": reused,
+                "reuse_rate": round(reused / self.requests, 3) if self.requests else None,
+                "connect_ms": round(sum(self.connect_ms) / len(self.connect_ms), 1) if self.connect_ms else None,
+                "tls_ms": round(sum(self.tls_ms) / len(self.tls_ms), 1) if self.tls_ms else None,
+            }
+
+
+class ClientHub:
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._openai = None
+        self._http = None
+        self._base_url = None  # point_to(): por encima de CLIENTS.base_url
+        self._api_key = None
+        self.stats = _ConnectionStats()
+
+    def _build_http(self):
+        limits = httpx.Limits(
+            max_connections=get_setting(self.config, 'CLIENTS', 'max_connections', 8),
+            max_keepalive_connections=get_setting(self.config, 'CLIENTS', 'keepalive_connections', 4),
+            keepalive_expiry=get_setting(self.config, 'CLIENTS', 'keepalive_expiry', 90.0),
+        )
+        timeout = httpx.Timeout(
+            get_setting(self.config, 'CLIENTS', 'read_timeout', 30.0),
+            connect=get_setting(self.config, 'CLIENTS', 'connect_timeout', 5.0),
+        )
+        return httpx.Client(limits=limits, timeout=timeout,
+                            event_hooks={"request": [self.stats.on_request]})
+
+    def openai(self):
+        """El cliente compartido (se crea la primera vez). None si no hay librería o clave."""
+        if self._openai is not None:
+            return self._openai
+        with self._lock:
+            if self._openai is None and _load_libraries():
+                api_key = self._api_key or resolve_api_key(self.config)
+                if api_key:
+                    kwargs = {"api_key": api_key,
+                              "max_retries": get_setting(self.config, 'CLIENTS', 'max_retries', 0)}
+                    base_url = self._base_url or get_setting(self.config, 'CLIENTS', 'base_url', None)
+                    if base_url:
+                        kwargs["base_url"] = base_url
+                    if httpx is not None:
+                        self._http = self._build_http()
+                        kwargs["http_client"] = self._http
+                    self._openai = OpenAI(**kwargs)
+        return self._openai
+
+    def warm_up(self, connections=None):
+        """
+        Abre de antemano las conexiones del pool (TCP + TLS) con peticiones
+        que no gastan tokens, en paralelo para que queden varias vivas.
+        """
+        client = self.openai()
+        if client is None:
+            return 0
+        if connections is None:
+            connections = get_setting(self.config, 'CLIENTS', 'warm_connections', 2)
+        t0 = time.perf_counter()
+        ok = []
+
+        def ping():
+            try:
+                client.models.retrieve("whisper-1")
+                ok.append(True)
+            except Exception as e:
+                print(f"CLIENTS: calentamiento fallido: {e}")
+
+        threads = [threading.Thread(target=ping, daemon=True) for _ in range(max(1, connections))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print(f"🌐 {len(ok)} conexiones con OpenAI listas en {1000 * (time.perf_counter() - t0):.0f} ms")
+        return len(ok)
+
+    def point_to(self, base_url, api_key=None):
+        """
+        Redirige el cliente compartido (p.ej. a fake_api_server para bench_e2e).
+        Hay que llamarlo antes de que los módulos guarden el cliente.
+        """
+        self.close()
+        with self._lock:
+            self._base_url = base_url
+            self._api_key = api_key
+
+    def metrics(self):
+        return self.stats.snapshot()
+
+    def close(self):
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+            self._http = None
+            self._openai = None
+
+
+# Hub compartido por module_stt, module_llm y module_tts
+client_hub = ClientHub(load_config())
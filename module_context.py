@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+module_context.py - Memoria de la conversación con presupuesto de tokens
+Cada petición lleva: prompt de sistema + resumen de lo antiguo + los
+últimos turnos + la frase actual, sin pasar nunca de 'budget' tokens.
+Cuando los turnos sin resumir crecen, los más viejos se condensan en el
+resumen desde un hilo aparte; el turno en curso nunca espera por ello
+(si el resumen no está listo, lo que no cabe simplemente no se envía).
+
+Los tokens se cuentan con tiktoken si está instalado y, si no, con una
+estimación por caracteres. Cada mensaje se cuenta una sola vez al entrar.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+MESSAGE_OVERHEAD = 4  # Tokens de rol/separadores por mensaje en el formato chat
+
+
+class TokenCounter:
+    """
+    El tokenizador (tiktoken + su tabla) se carga al primer conteo o con
+    load() desde un hilo al arrancar, no al importar el módulo.
+    """
+    def __init__(self, model="gpt-4o-mini"):
+        self.model = model
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.name = "heuristic"
+
+    def load(self):
+        if self._loaded:
+            return self
+        with self._lock:
+            if not self._loaded:
+                try:
+                    import tiktoken
+                    try:
+                        self._encoding = tiktoken.encoding_for_model(self.model)
+                    except Exception:
+                        self._encoding = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    self._encoding = None
+                self.name = self._encoding.name if self._encoding else "heuristic"
+                self._loaded = True
+        return self
+
+    def __call__(self, text):
+        if not text:
+            return 0
+        self.load()
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        # ~3.5 caracteres por token en castellano con los tokenizadores de OpenAI
+        return max(1, int(len(text) / 3.5 + 0.5))
+
+
+class _Turn:
+    __slots__ = ("user", "assistant", "tokens")
+
+    def __init__(self, user, assistant, count):
+        self.user = user
+        self.assistant = assistant
+        self.tokens = count(user) + count(assistant) + 2 * MESSAGE_OVERHEAD
+
+
+class ConversationContext:
+    def __init__(self, system_prompt, summarize_fn=None, budget=1200, reply_tokens=150,
+                 keep_turns=3, summary_tokens=150, model="gpt-4o-mini"):
+        """
+        summarize_fn(resumen_anterior, [(usuario, tars), ...], max_tokens) -> resumen nuevo.
+        budget: tope de tokens de entrada + respuesta (reply_tokens) por petición.
+        """
+        self.count = TokenCounter(model)
+        self.system_prompt = system_prompt
+        self.summarize_fn = summarize_fn
+        self.budget = budget
+        self.reply_tokens = reply_tokens
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+
+        self._lock = threading.Lock()
+        self._turns = deque()
+        self._turn_tokens = 0
+        self._system_tokens = None  # Se cuenta en la primera petición (tokenizador perezoso)
+        self.summary = ""
+        self._summary_tokens = 0
+        self._summarizing = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-summary")
+        self.stats = {"turns": 0, "summaries": 0, "summary_errors": 0, "dropped_turns": 0,
+                      "last_prompt_tokens": 0, "max_prompt_tokens": 0}
+
+    @property
+    def system_tokens(self):
+        if self._system_tokens is None:
+            self._system_tokens = self.count(self.system_prompt) + MESSAGE_OVERHEAD
+        return self._system_tokens
+
+    # --- Petición ---
+    def messages(self, user_text):
+        """Mensajes para la petición actual, dentro del presupuesto."""
+        user_tokens = self.count(user_text) + MESSAGE_OVERHEAD
+        with self._lock:
+            system = self.system_prompt
+            used = self.system_tokens + user_tokens + self.reply_tokens
+            if self.summary:
+                system = f"{system}\n\nResumen de la conversación hasta ahora: {self.summary}"
+                used += self._summary_tokens
+
+            # Del turno más reciente hacia atrás mientras quepa
+            recent = []
+            for turn in reversed(self._turns):
+                if used + turn.tokens > self.budget:
+                    break
+                recent.append(turn)
+                used += turn.tokens
+            self.stats["last_prompt_tokens"] = used - self.reply_tokens
+            self.stats["max_prompt_tokens"] = max(self.stats["max_prompt_tokens"], used - self.reply_tokens)
+
+        messages = [{"role": "system", "content": system}]
+        for turn in reversed(recent):
+            messages.append({"role": "user", "content": turn.user})
+            messages.append({"role": "assistant", "content": turn.assistant})
+        messages.append({"role": "user", "content": user_text})
+        return messages
+
+    # --- Historial ---
+    def add_turn(self, user_text, reply):
+        if not user_text or not reply:
+            return
+        turn = _Turn(user_text, reply, self.count)
+        with self._lock:
+            self._turns.append(turn)
+            self._turn_tokens += turn.tokens
+            self.stats["turns"] += 1
+            self._maybe_summarize()
+
+    def _maybe_summarize(self):
+        """Con el lock tomado: manda a resumir los turnos viejos si ya ocupan demasiado."""
+        if self._summarizing or len(self._turns) <= self.keep_turns:
+            return
+        room = self.budget - self.reply_tokens - self.system_tokens - self.summary_tokens
+        if self._turn_tokens <= room // 2:
+            return  # Todavía cabe de sobra (la otra mitad queda para la frase actual y los recientes)
+        old = list(self._turns)[:len(self._turns) - self.keep_turns]
+        self._summarizing = True
+        self._executor.submit(self._summarize, self.summary, old)
+
+    def _summarize(self, previous, old):
+        summary, failed = None, False
+        try:
+            if self.summarize_fn is not None:
+                summary = self.summarize_fn(previous, [(t.user, t.assistant) for t in old],
+                                            self.summary_tokens)
+        except Exception as e:
+            print(f"CONTEXT: no se pudo resumir ({e}); se descartan los turnos antiguos")
+            failed = True
+
+        with self._lock:
+            self.stats["summary_errors"] += int(failed)
+            # Quitamos exactamente los turnos resumidos (pueden haber llegado otros mientras)
+            for turn in old:
+                if self._turns and self._turns[0] is turn:
+                    self._turns.popleft()
+                    self._turn_tokens -= turn.tokens
+            if summary:
+                self.summary = summary.strip()
+                self._summary_tokens = self.count(self.summary) + MESSAGE_OVERHEAD
+                self.stats["summaries"] += 1
+            else:
+                self.stats["dropped_turns"] += len(old)
+            self._summarizing = False
+            self._maybe_summarize()
+
+    @property
+    def has_history(self):
+        """True si la próxima petición lleva turnos anteriores o resumen."""
+        with self._lock:
+            return bool(self._turns or self.summary)
+
+    def reset(self):
+        with self._lock:
+            self._turns.clear()
+            self._turn_tokens = 0
+            self.summary = ""
+            self._summary_tokens = 0
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, tokenizer=self.count.name, pending_turns=len(self._turns),
+                        turn_tokens=self._turn_tokens, summary_tokens=self._summary_tokens,
+                        budget=self.budget)
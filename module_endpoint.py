@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+module_endpoint.py - Detección de fin de frase (endpointing)
+En vez de esperar siempre 2.5 s de silencio, decide cuándo has terminado
+según lo larga que sea la pausa, si la voz venía apagándose y, si hay
+transcripción parcial, si la frase suena terminada.
+  - Órdenes cortas: cierra en ~0.5-0.8 s
+  - Dictado largo: la paciencia crece hasta silence_limit
+"""
+
+from collections import deque
+import numpy as np
+from modules.module_settings import get_setting
+
+# Palabras con las que nadie termina una frase: si la última es una de estas, esperamos más
+TRAILING_WORDS = {
+    "y", "o", "pero", "que", "porque", "de", "del", "el", "la", "los", "las", "un", "una",
+    "con", "en", "para", "por", "si", "como", "cuando", "eh", "em", "mmm", "pues", "entonces",
+    "and", "or", "but", "the", "a", "to", "of", "with", "um", "uh", "so",
+}
+
+
+class EndpointDetector:
+    def __init__(self, short_pause=0.55, max_pause=2.5, patience_per_second=0.1,
+                 min_pause=0.35, trend_window=0.5, history=200):
+        self.short_pause = short_pause
+        self.max_pause = max_pause
+        self.patience_per_second = patience_per_second
+        self.min_pause = min_pause
+        self.trend_window = trend_window
+
+        self.latencies = deque(maxlen=history)  # Pausa (s) en el momento de cerrar
+        self.reset()
+
+    def reset(self):
+        self.speech_start = None
+        self.last_speech = None
+        self.speech_seconds = 0.0
+        self.partial_text = ""
+        self._levels = deque(maxlen=64)
+        self._slope = 0.0
+        self._in_pause = False
+
+    def start(self, t):
+        """Inicio de frase (t en segundos de audio)."""
+        self.reset()
+        self.speech_start = t
+        self.last_speech = t
+
+    def set_partial_text(self, text):
+        """Transcripción parcial opcional para juzgar si la frase está completa."""
+        self.partial_text = text or ""
+
+    def energy_trend(self):
+        """Pendiente del nivel (dB/s) en la última ventana de voz. Negativo = apagándose."""
+        if len(self._levels) < 3:
+            return 0.0
+        pts = np.array(self._levels)
+        pts = pts[pts[:, 0] >= pts[-1, 0] - self.trend_window]
+        if len(pts) < 3:
+            return 0.0
+        db = 20.0 * np.log10(pts[:, 1] + 1e-9)
+        return float(np.polyfit(pts[:, 0], db, 1)[0])
+
+    def _text_factor(self):
+        text = self.partial_text.strip()
+        if not text:
+            return 1.0
+        if text[-1] in ".!?…":
+            return 0.8
+        words = text.lower().rstrip(",;:").split()
+        if text[-1] in ",;:" or (words and words[-1] in TRAILING_WORDS):
+            return 1.6
+        return 1.0
+
+    def required_pause(self):
+        """Silencio necesario para dar la frase por terminada."""
+        pause = self.short_pause + self.patience_per_second * max(0.0, self.speech_seconds - 1.0)
+        # Voz que cae al final = entonación de cierre; voz plana/subiendo = va a seguir
+        if self._slope < -20.0:
+            pause *= 0.8
+        elif self._slope > 0.0:
+            pause *= 1.2
+        pause *= self._text_factor()
+        return float(min(self.max_pause, max(self.min_pause, pause)))
+
+    def update(self, is_speech, level, t):
+        """Procesa un bloque. Devuelve True cuando hay que cerrar la frase."""
+        if self.speech_start is None:
+            return False
+
+        if is_speech:
+            self._in_pause = False
+            self.last_speech = t
+            self.speech_seconds = t - self.speech_start
+            self._levels.append((t, level))
+            return False
+
+        pause = t - self.last_speech
+        if pause < 1e-9:
+            return False
+        if not self._in_pause:
+            # Primer bloque de pausa: congelamos la tendencia de la voz
+            self._in_pause = True
+            self._slope = self.energy_trend()
+
+        if pause >= self.required_pause():
+            self.latencies.append(pause)
+            self.speech_start = None
+            return True
+        return False
+
+    def pause_seconds(self, t):
+        return 0.0 if self.last_speech is None else t - self.last_speech
+
+    def metrics(self):
+        """Latencia de decisión (silencio esperado antes de cerrar cada frase)."""
+        if not self.latencies:
+            return {"count": 0}
+        lat = np.array(self.latencies)
+        return {
+            "count": int(lat.size),
+            "last_ms": round(1000 * float(lat[-1]), 1),
+            "mean_ms": round(1000 * float(lat.mean()), 1),
+            "p50_ms": round(1000 * float(np.percentile(lat, 50)), 1),
+            "p95_ms": round(1000 * float(np.percentile(lat, 95)), 1),
+        }
+
+
+def create_endpoint_detector(config, silence_limit=2.5):
+    return EndpointDetector(
+        short_pause=get_setting(config, 'STT', 'endpoint_short_pause', 0.55),
+        max_pause=get_setting(config, 'STT', 'silence_limit', silence_limit),
+        patience_per_second=get_setting(config, 'STT', 'endpoint_patience_per_second', 0.1),
+    )
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+module_intents.py - Órdenes locales sin pasar por el LLM
+"Apágate", "¿qué hora es?", "¿a cuánto está tu CPU?"... se reconocen aquí
+con un autómata Aho-Corasick (todas las frases clave en una sola pasada
+sobre el texto, microsegundos por frase) y se contestan en el momento con
+respuestas fijas o plantillas. Si no hay coincidencia, la frase sigue
+su camino hacia el LLM.
+
+Las frases clave se escriben normalizadas (minúsculas, sin tildes ni
+signos) y solo cuentan como palabras completas. Ninguna vale en cualquier
+sitio de la frase, o "¿a qué hora es el concierto?" daría la hora:
+  whole=True  la frase clave es toda la orden (como mucho con "tars",
+              "por favor", "ya"... alrededor) y sin negaciones
+  start=True  la orden empieza por la frase clave y sigue con sus datos
+              ("temporizador de 5 minutos")
+
+Las órdenes peligrosas (apagar) además piden confirmación de viva voz: la
+orden solo se ejecuta si la siguiente frase es un "sí" antes de
+CONFIRM_SECONDS. Así "¿cómo se apaga el sistema de riego?" o "don't shut
+down yet" siguen hacia el LLM y un "apágate" suelto no apaga nada.
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from datetime import datetime
+
+from modules.module_cputemp import CPUTempModule
+
+
+def normalize(text):
+    """Minúsculas, sin tildes ni signos de puntuación, espacios simples."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+class AhoCorasick:
+    """Autómata multipatrón: devuelve todas las frases clave presentes en una pasada."""
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(index)
+
+        # Enlaces de fallo por anchura
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text):
+        """[(posición final, índice del patrón)] de todas las apariciones."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        found = []
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.extend((i, p) for p in out[node])
+        return found
+
+
+# === Huecos (slots) ===
+
+_NUMBER_WORDS = {
+    "un": 1, "una": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6,
+    "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "once": 11, "doce": 12, "quince": 15,
+    "veinte": 20, "treinta": 30, "cuarenta": 40, "cincuenta": 50, "sesenta": 60,
+    "media": 0.5, "medio": 0.5,
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "ten": 10, "fifteen": 15,
+    "twenty": 20, "thirty": 30, "half": 0.5, "a": 1, "an": 1,
+}
+_UNITS = {
+    "segundo": 1, "segundos": 1, "second": 1, "seconds": 1,
+    "minuto": 60, "minutos": 60, "minute": 60, "minutes": 60,
+    "hora": 3600, "horas": 3600, "hour": 3600, "hours": 3600,
+}
+_DURATION = re.compile(r"\b(\d+(?:[.,]\d+)?|%s)\s+(%s)\b" % (
+    "|".join(sorted(_NUMBER_WORDS, key=len, reverse=True)),
+    "|".join(sorted(_UNITS, key=len, reverse=True))))
+
+
+def extract_duration(text):
+    """Segundos de "5 minutos", "media hora", "dos horas"... (texto normalizado) o None."""
+    match = _DURATION.search(text)
+    if not match:
+        return None
+    amount, unit = match.groups()
+    value = _NUMBER_WORDS.get(amount)
+    if value is None:
+        value = float(amount.replace(",", "."))
+    return value * _UNITS[unit]
+
+
+def describe_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600 and seconds % 3600 == 0:
+        n, unit = seconds // 3600, "hora"
+    elif seconds >= 60 and seconds % 60 == 0:
+        n, unit = seconds // 60, "minuto"
+    else:
+        n, unit = seconds, "segundo"
+    return f"{n} {unit}{'s' if n != 1 else ''}"
+
+
+# === Intenciones ===
+
+CONFIRM_SECONDS = 15.0
+# Palabras que pueden rodear una orden sin cambiarla ("tars apágate ya por favor")
+_FILLERS = {"tars", "oye", "hey", "ok", "okay", "vale", "venga", "por", "favor", "please",
+            "ya", "ahora", "now", "mismo"}
+_NEGATIONS = {"no", "nunca", "jamas", "ni", "todavia", "aun", "not", "never", "don", "dont",
+              "doesn", "isn", "yet"}
+_YES = {"si", "yes", "confirmo", "confirmado", "adelante", "hazlo", "claro", "confirm", "do it"}
+_NO = {"no", "cancela", "cancelar", "cancel", "espera", "nope"}
+
+
+def command_core(text):
+    """Texto normalizado sin las palabras de relleno del principio y del final."""
+    words = text.split()
+    while words and words[0] in _FILLERS:
+        words.pop(0)
+    while words and words[-1] in _FILLERS:
+        words.pop()
+    return " ".join(words)
+
+
+def has_negation(text):
+    return any(word in _NEGATIONS for word in text.split())
+
+
+class Intent:
+    def __init__(self, name, phrases, handler, whole=False, start=False):
+        """
+        whole=True: la frase clave tiene que ser toda la orden (ver command_core), sin negaciones.
+        start=True: la orden tiene que empezar por la frase clave.
+        Sin ninguna de las dos, la frase clave vale en cualquier sitio.
+        """
+        self.name = name
+        self.phrases = [normalize(p) for p in phrases]
+        self.handler = handler
+        self.whole = whole
+        self.start = start
+
+    def accepts(self, text, phrase):
+        if self.whole:
+            return command_core(text) == phrase and not has_negation(text)
+        if self.start:
+            core = command_core(text)
+            return core == phrase or core.startswith(phrase + " ")
+        return True
+
+
+class _Confirmation:
+    """Orden a la espera de un "sí": on_yes() devuelve el IntentResult definitivo."""
+    def __init__(self, name, on_yes, seconds=CONFIRM_SECONDS):
+        self.name = name
+        self.on_yes = on_yes
+        self.deadline = time.monotonic() + seconds
+
+
+class IntentResult:
+    """Lo que hay que decir y, opcionalmente, qué hacer después de decirlo."""
+    def __init__(self, name, reply, after=None, match_us=0.0):
+        self.name = name
+        self.reply = reply
+        self.after = after
+        self.match_us = match_us
+
+
+# Respuestas fijas: module_tts las precalienta en la caché de voz (suenan aunque no haya red)
+NAME_REPLY = "Soy TARS. Encantado, supongo."
+SHUTDOWN_CONFIRM_REPLY = "¿Seguro que quieres que me apague? Di sí para confirmar."
+SHUTDOWN_REPLY = "Apagando sistemas. Ha sido un placer... más o menos."
+CANCELLED_REPLY = "Vale, sigo aquí."
+NO_TEMPERATURE_REPLY = "No consigo leer mi sensor de temperatura. Diría que estoy fresco."
+TIMER_QUESTION_REPLY = "¿Cuánto tiempo? Dímelo en segundos, minutos u horas."
+FIXED_REPLIES = [NAME_REPLY, SHUTDOWN_CONFIRM_REPLY, SHUTDOWN_REPLY, CANCELLED_REPLY,
+                 NO_TEMPERATURE_REPLY, TIMER_QUESTION_REPLY]
+
+_DAYS = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+_MONTHS = ("enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+           "septiembre", "octubre", "noviembre", "diciembre")
+
+
+class IntentRouter:
+    def __init__(self, cpu_temp=None, speak=None):
+        """
+        cpu_temp: CPUTempModule (se crea uno si no llega).
+        speak(texto): para avisos que llegan más tarde (temporizadores).
+        """
+        self.cpu_temp = cpu_temp or CPUTempModule()
+        self.speak = speak
+        self.stats = {"matched": 0, "missed": 0, "confirmed": 0, "declined": 0}
+        self._timers = []
+        self._pending = None  # _Confirmation en curso
+        self.intents = [
+            Intent("shutdown", ["apágate", "apaga el sistema", "shutdown", "shut down"], self._shutdown,
+                   whole=True),
+            Intent("temperature", ["tu temperatura", "cuál es tu temperatura", "dime tu temperatura",
+                                   "qué temperatura tienes", "temperatura de la cpu",
+                                   "temperatura del procesador", "estás caliente", "a cuánto está tu cpu",
+                                   "your temperature", "cpu temperature", "how hot are you"], self._temperature,
+                   whole=True),
+            Intent("time", ["qué hora es", "qué hora tienes", "dime la hora", "me dices la hora",
+                            "sabes qué hora es", "what time is it"], self._time, whole=True),
+            Intent("date", ["qué día es hoy", "a qué estamos", "qué fecha es", "qué fecha es hoy",
+                            "fecha de hoy", "what day is it", "what is the date"], self._date, whole=True),
+            Intent("uptime", ["cuánto llevas encendido", "cuánto tiempo llevas encendido",
+                              "how long have you been on"], self._uptime, whole=True),
+            Intent("timer", ["temporizador", "pon un temporizador", "ponme un temporizador",
+                             "avísame en", "avísame dentro de", "set a timer", "cuenta atrás",
+                             "pon una cuenta atrás"], self._timer, start=True),
+            Intent("name", ["cómo te llamas", "quién eres", "what is your name", "who are you"],
+                   lambda text: NAME_REPLY, whole=True),
+        ]
+        self._phrase_owner = []
+        patterns = []
+        for intent in self.intents:
+            for phrase in intent.phrases:
+                patterns.append(f" {phrase} ")  # Con espacios: solo palabras completas
+                self._phrase_owner.append(intent)
+        self._automaton = AhoCorasick(patterns)
+        self._lengths = [len(p) for p in patterns]
+        self._phrases = [p.strip() for p in patterns]
+
+    def match(self, text):
+        """IntentResult si la frase es una orden local, None si debe ir al LLM."""
+        t0 = time.perf_counter()
+        norm = normalize(text)
+        pending, self._pending = self._pending, None
+        if pending is not None and time.monotonic() < pending.deadline:
+            answer = self._confirmation(pending, norm)
+            if answer is not None:
+                answer.match_us = 1e6 * (time.perf_counter() - t0)
+                return answer
+            # Ni sí ni no: la confirmación se olvida y la frase sigue su camino
+
+        found = [(end, p) for end, p in self._automaton.search(f" {norm} ")
+                 if self._phrase_owner[p].accepts(norm, self._phrases[p])]
+        if not found:
+            self.stats["missed"] += 1
+            return None
+        # Gana la frase clave más larga (la más específica)
+        _, best = max(found, key=lambda f: self._lengths[f[1]])
+        intent = self._phrase_owner[best]
+        match_us = 1e6 * (time.perf_counter() - t0)
+
+        result = intent.handler(norm)
+        if result is None:
+            self.stats["missed"] += 1
+            return None
+        self.stats["matched"] += 1
+        if isinstance(result, IntentResult):
+            result.match_us = match_us
+            return result
+        return IntentResult(intent.name, result, match_us=match_us)
+
+    def _confirmation(self, pending, norm):
+        core = command_core(norm)
+        words = core.split()
+        if core in _YES or (words and words[0] in _YES and not has_negation(core)):
+            self.stats["confirmed"] += 1
+            return pending.on_yes()
+        if core in _NO or (words and words[0] in _NO):
+            self.stats["declined"] += 1
+            return IntentResult(f"{pending.name}_cancelled", CANCELLED_REPLY)
+        return None
+
+    # --- Manejadores ---
+    def _shutdown(self, text):
+        def confirmed():
+            return IntentResult("shutdown", SHUTDOWN_REPLY, after=lambda: os.system("sudo shutdown -h now"))
+        self._pending = _Confirmation("shutdown", confirmed)
+        return IntentResult("shutdown_confirm", SHUTDOWN_CONFIRM_REPLY)
+
+    def _temperature(self, text):
+        temp = self.cpu_temp.get_temperature()
+        if not temp:
+            return NO_TEMPERATURE_REPLY
+        comment = "Todo bajo control." if temp < 65 else "Empiezo a sudar, y eso que no tengo glándulas."
+        return f"Mi CPU está a {temp:.0f} grados. {comment}"
+
+    def _time(self, text):
+        now = datetime.now()
+        return f"Son las {now.hour}:{now.minute:02d}."
+
+    def _date(self, text):
+        now = datetime.now()
+        return f"Hoy es {_DAYS[now.weekday()]}, {now.day} de {_MONTHS[now.month - 1]} de {now.year}."
+
+    def _uptime(self, text):
+        try:
+            with open("/proc/uptime") as f:
+                seconds = float(f.read().split()[0])
+        except (OSError, ValueError):
+            return None  # Sin dato: que conteste el LLM
+        hours, minutes = int(seconds // 3600), int(seconds % 3600 // 60)
+        return f"Llevo encendido {hours} horas y {minutes} minutos. Sin quejarme."
+
+    def _timer(self, text):
+        seconds = extract_duration(text)
+        if not seconds:
+            return TIMER_QUESTION_REPLY
+        label = describe_duration(seconds)
+        timer = threading.Timer(seconds, self._ring, args=(label,))
+        timer.daemon = True
+        timer.start()
+        self._timers = [t for t in self._timers if t.is_alive()] + [timer]
+        return f"Temporizador de {label} en marcha."
+
+    def _ring(self, label):
+        if self.speak is not None:
+            self.speak(f"Se acabó el tiempo: {label}.")
+        else:
+            print(f"⏰ Temporizador de {label} terminado")
+
+    def cancel_timers(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+
+    def metrics(self):
+        return dict(self.stats, timers=sum(t.is_alive() for t in self._timers))
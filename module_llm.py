@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
 # module_llm.py - LITE VERSION con Personalidad TARS
-import os
-try: 
-    from openai import OpenAI
-except: 
-    OpenAI = None
+import difflib
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
 from modules.module_config import load_config
+from modules.module_settings import get_setting
+from modules.module_clients import client_hub
+from modules.module_context import ConversationContext
+from modules.module_intents import normalize
+from modules.module_resilience import stages
+from modules.module_turns import TurnCancelled
+from modules.module_tracing import tracer
 
 CONFIG = load_config()
-client = None
+LLM_MODEL = "gpt-4o-mini"
+MAX_TOKENS = 150
+TEMPERATURE = 0.8  # Un poco de temperatura para que sea más creativo/sarcástico
 
 # Personalidad de TARS
 SYSTEM_PROMPT = (
@@ -17,25 +26,336 @@ SYSTEM_PROMPT = (
     "tienes un humor militar seco. No eres servil. Responde de forma breve y concisa."
 )
 
-if OpenAI: 
-    # Intentamos sacar la clave de diferentes sitios por si acaso
-    k = CONFIG['LLM'].get('api_key') or CONFIG['TTS'].get('openai_api_key') or os.environ.get('OPENAI_API_KEY')
-    if k: client = OpenAI(api_key=k)
+class ResponseCache:
+    """
+    Respuestas ya dadas a las preguntas de siempre ("¿qué eres?", "cuéntame
+    un chiste"...). La clave es el texto normalizado (minúsculas, sin tildes
+    ni signos) más el hash del prompt de sistema, así cambiar la personalidad
+    invalida todo. Con caducidad (TTL), tope de entradas (LRU) y, si se pide,
+    coincidencia aproximada con difflib para frases casi iguales.
+
+    Con historial solo se reutilizan frases que se entienden solas
+    (context_free): "cuéntame un chiste" sí; "¿y mañana?", "explícame eso"
+    o "¿cómo me llamo?" dependen de lo anterior y van siempre al LLM.
+    """
+    # Palabras que apuntan a lo ya hablado (o al propio usuario): la frase no se entiende sola
+    CONTEXT_WORDS = {
+        "eso", "esto", "ese", "esa", "esos", "esas", "este", "esta", "estos", "estas", "aquel",
+        "aquella", "aquello", "ello", "ella", "ellos", "ellas", "anterior", "antes", "otra", "otro",
+        "otros", "otras", "tambien", "mismo", "misma", "dicho", "entonces", "repite", "sigue",
+        "continua", "me", "mi", "mis", "yo", "nos", "nuestro", "nuestra",
+        "it", "that", "this", "those", "these", "he", "she", "they", "them", "him", "her", "again",
+        "also", "another", "else", "previous", "before", "i", "my", "we", "our", "us",
+    }
+    # Arranques de continuación: "¿y mañana?", "pero ¿por qué?"
+    FOLLOW_UPS = {"y", "pero", "o", "and", "but", "or", "so"}
+    MIN_WORDS = 3  # "¿por qué?", "¿en serio?": demasiado cortas para saber de qué hablan
+
+    def __init__(self, max_entries=128, ttl=3600.0, fuzzy=False, fuzzy_threshold=0.92):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy = fuzzy
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (hash prompt, texto normalizado) -> (respuesta, t_guardada)
+        self._miss_seconds = deque(maxlen=50)
+        self.stats = {"hits": 0, "fuzzy_hits": 0, "misses": 0, "expired": 0, "stores": 0,
+                      "saved_seconds": 0.0}
+
+    normalize = staticmethod(normalize)
+
+    @classmethod
+    def context_free(cls, text):
+        """True si la frase no depende de la conversación anterior (se puede cachear con historial)."""
+        words = cls.normalize(text).split()
+        return (len(words) >= cls.MIN_WORDS and words[0] not in cls.FOLLOW_UPS
+                and not any(word in cls.CONTEXT_WORDS for word in words))
+
+    @staticmethod
+    def prompt_hash(system_prompt):
+        return hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+    def get(self, text, system_prompt, fuzzy=None):
+        """fuzzy=None usa la configuración; True fuerza la búsqueda aproximada."""
+        fuzzy = self.fuzzy if fuzzy is None else fuzzy
+        prompt = self.prompt_hash(system_prompt)
+        key = (prompt, self.normalize(text))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None and fuzzy:
+                key, entry = self._closest(key, now)
+                if entry is not None:
+                    self.stats["fuzzy_hits"] += 1
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            if self._miss_seconds:
+                self.stats["saved_seconds"] += sum(self._miss_seconds) / len(self._miss_seconds)
+            return entry[0]
+
+    def _closest(self, key, now):
+        prompt, text = key
+        best, best_ratio = (None, None), self.fuzzy_threshold
+        matcher = difflib.SequenceMatcher(None, b=text)
+        for (p, cached_text), entry in self._entries.items():
+            if p != prompt or now - entry[1] > self.ttl:
+                continue
+            matcher.set_seq1(cached_text)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = ((p, cached_text), entry), ratio
+        return best
+
+    def put(self, text, system_prompt, reply, seconds=None):
+        """Guarda una respuesta; 'seconds' es lo que tardó el LLM (para calcular el ahorro)."""
+        if seconds is not None:
+            self._miss_seconds.append(seconds)
+        if not reply or reply.startswith("Error en el cerebro"):
+            return
+        key = (self.prompt_hash(system_prompt), self.normalize(text))
+        with self._lock:
+            self._entries[key] = (reply, time.monotonic())
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            out = dict(self.stats, entries=len(self._entries),
+                       hit_rate=round(self.stats["hits"] / lookups, 3) if lookups else None)
+            out["saved_seconds"] = round(out["saved_seconds"], 2)
+            if self._miss_seconds:
+                out["miss_ms"] = round(1000 * sum(self._miss_seconds) / len(self._miss_seconds))
+            return out
+
+response_cache = ResponseCache(
+    max_entries=get_setting(CONFIG, 'LLM', 'cache_size', 128),
+    ttl=get_setting(CONFIG, 'LLM', 'cache_ttl', 3600.0),
+    fuzzy=get_setting(CONFIG, 'LLM', 'cache_fuzzy', False),
+    fuzzy_threshold=get_setting(CONFIG, 'LLM', 'cache_fuzzy_threshold', 0.92),
+)
+CACHE_ENABLED = get_setting(CONFIG, 'LLM', 'cache_enabled', True)
+
+def get_llm_metrics():
+    return {"cache": response_cache.metrics(), "context": conversation.metrics()}
+
+def _cacheable(text):
+    """
+    La caché va por (prompt, frase): sin historial vale cualquiera; con
+    turnos o resumen, solo las frases que se entienden solas.
+    """
+    return CACHE_ENABLED and (not conversation.has_history or response_cache.context_free(text))
+
+def _cached(text, cacheable):
+    if not cacheable:
+        return None
+    reply = response_cache.get(text, SYSTEM_PROMPT)
+    if reply is not None:
+        print(f"🧠 Respuesta en caché (ahorro acumulado {response_cache.metrics()['saved_seconds']:.1f}s)")
+    return reply
 
 def initialize_manager_llm(m, c): pass
 
-def process_completion(text):
+def _summarize(previous, turns, max_tokens):
+    """Condensa el resumen anterior + turnos viejos (lo llama el hilo de contexto)."""
+    client = client_hub.openai()
+    if not client:
+        return None
+    transcript = "\n".join(f"Usuario: {u}\nTARS: {a}" for u, a in turns)
+    r = client.chat.completions.create(
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": "Resume la conversación en pocas frases, en tercera persona. "
+                                          "Conserva nombres, datos y peticiones pendientes del usuario."},
+            {"role": "user", "content": f"Resumen previo: {previous or '(ninguno)'}\n\nNuevos turnos:\n{transcript}"}
+        ],
+        max_tokens=max_tokens,
+        temperature=0.2
+    )
+    return r.choices[0].message.content
+
+# Historial con presupuesto de tokens; lo antiguo se resume en segundo plano
+conversation = ConversationContext(
+    SYSTEM_PROMPT,  # Aquí va la personalidad
+    summarize_fn=_summarize,
+    budget=get_setting(CONFIG, 'LLM', 'context_budget', 1200),
+    reply_tokens=MAX_TOKENS,
+    keep_turns=get_setting(CONFIG, 'LLM', 'context_keep_turns', 3),
+    summary_tokens=get_setting(CONFIG, 'LLM', 'summary_tokens', 150),
+    model=LLM_MODEL,
+)
+
+def _messages(text):
+    return conversation.messages(text)
+
+OFFLINE_REPLY = "Mis enlaces con la base están caídos. Pregúntamelo otra vez en un momento."
+
+def _fallback_reply(text, cacheable):
+    """Plan B con la API caída o fuera de plazo: algo parecido ya respondido (si es cacheable), o una frase fija."""
+    if not cacheable:
+        return OFFLINE_REPLY
+    return response_cache.get(text, SYSTEM_PROMPT, fuzzy=True) or OFFLINE_REPLY
+
+def process_completion(text, token=None):
+    client = client_hub.openai()  # Cliente compartido: conexión ya abierta
     if not client: return "Modo Lite. Configura OpenAI API Key."
+    tracer.mark("llm_request", token=token)
+    cacheable = _cacheable(text)
+    reply = _cached(text, cacheable)
+    if reply is not None:
+        tracer.mark("llm_first_token", token=token)
+        tracer.mark("llm_last_token", token=token)
+        conversation.add_turn(text, reply)
+        return reply
     try:
-        r = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT}, # Aquí va la personalidad
-                {"role": "user", "content": text}
-            ],
-            max_tokens=150,
-            temperature=0.8 # Un poco de temperatura para que sea más creativo/sarcástico
-        )
-        return r.choices[0].message.content
+        t0 = time.monotonic()
+        messages = _messages(text)
+
+        def ask(timeout):
+            r = client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                max_tokens=MAX_TOKENS,
+                temperature=TEMPERATURE,
+                timeout=timeout
+            )
+            return r.choices[0].message.content
+
+        fallback = []
+        reply = stages["llm"].call(ask, fallback=lambda: fallback.append(True) or _fallback_reply(text, cacheable),
+                                   token=token)
+        tracer.mark("llm_first_token", token=token)  # Sin streaming llega todo de golpe
+        tracer.mark("llm_last_token", token=token)
+        if cacheable and not fallback:
+            response_cache.put(text, SYSTEM_PROMPT, reply, time.monotonic() - t0)
+        conversation.add_turn(text, reply)
+        return reply
+    except TurnCancelled:
+        return ""  # Has vuelto a hablar: esta respuesta ya no interesa
     except Exception as e: 
         return f"Error en el cerebro de TARS: {e}"
+
+class ThinkFilter:
+    """
+    Quita los bloques <think>...</think> de un texto que llega a trozos.
+    Si un trozo acaba en lo que podría ser el principio de una etiqueta,
+    esa cola se guarda hasta ver el siguiente.
+    """
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self.inside = False
+        self._held = ""
+
+    def feed(self, text):
+        text = self._held + text
+        self._held = ""
+        visible = []
+        while text:
+            tag = self.CLOSE if self.inside else self.OPEN
+            i = text.find(tag)
+            if i >= 0:
+                if not self.inside:
+                    visible.append(text[:i])
+                text = text[i + len(tag):]
+                self.inside = not self.inside
+                continue
+            keep = next((k for k in range(min(len(tag) - 1, len(text)), 0, -1)
+                         if text.endswith(tag[:k])), 0)
+            if not self.inside:
+                visible.append(text[:len(text) - keep])
+            self._held = text[len(text) - keep:]
+            break
+        return "".join(visible)
+
+    def flush(self):
+        rest = "" if self.inside else self._held
+        self._held = ""
+        return rest
+
+def stream_completion(text, token=None):
+    """
+    Como process_completion pero va devolviendo el texto según se genera,
+    ya sin <think>. Al cerrar el generador (o cancelar 'token') se corta la petición.
+    """
+    client = client_hub.openai()
+    if not client:
+        yield "Modo Lite. Configura OpenAI API Key."
+        return
+    tracer.mark("llm_request", token=token)
+    cacheable = _cacheable(text)
+    reply = _cached(text, cacheable)
+    if reply is not None:
+        tracer.mark("llm_first_token", token=token)
+        tracer.mark("llm_last_token", token=token)
+        conversation.add_turn(text, reply)
+        yield reply
+        return
+    think = ThinkFilter()
+    t0 = time.monotonic()
+    first = True
+    visible_parts = []
+    messages = _messages(text)
+    fallback = []
+
+    def open_stream(timeout):
+        stream = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            max_tokens=MAX_TOKENS,
+            temperature=TEMPERATURE,
+            stream=True,
+            timeout=timeout
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+    try:
+        # Plazo y petición duplicada hasta el primer token; plan B si la API no responde
+        deltas = stages["llm"].stream(
+            open_stream, fallback=lambda: fallback.append(True) or [_fallback_reply(text, cacheable)], token=token)
+        try:
+            for delta in deltas:
+                if token is not None and token.cancelled:
+                    return  # Turno cancelado: se cierra la conexión y no se cachea
+                if first:
+                    print(f"🧠 Primer token en {1000 * (time.monotonic() - t0):.0f} ms")
+                    tracer.mark("llm_first_token", token=token)
+                    first = False
+                tracer.mark("llm_last_token", token=token)
+                visible = think.feed(delta)
+                if visible:
+                    visible_parts.append(visible)
+                    yield visible
+        finally:
+            if hasattr(deltas, "close"):
+                deltas.close()
+        rest = think.flush()
+        if rest:
+            visible_parts.append(rest)
+            yield rest
+        # Solo llega aquí si la respuesta se generó entera (sin interrupción)
+        if cacheable and not fallback:
+            response_cache.put(text, SYSTEM_PROMPT, "".join(visible_parts).strip(), time.monotonic() - t0)
+    except TurnCancelled:
+        pass
+    except Exception as e:
+        yield f"Error en el cerebro de TARS: {e}"
+    finally:
+        # Al historial va lo que se llegó a generar (también si te interrumpió)
+        conversation.add_turn(text, "".join(visible_parts).strip())
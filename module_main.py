@@ -3,27 +3,37 @@
 module_main.py - TARS Mirror Edition (Safe Mode)
 Lógica central limpia y formateada correctamente.
 """
-import os
 import threading
 import json
 import re
-import time
-import asyncio
 from modules.module_config import load_config
+from modules.module_settings import get_setting
 from modules.module_messageQue import queue_message
+from modules.module_state import tars_state, THINKING, SPEAKING, IDLE, LISTENING
+from modules.module_intents import IntentRouter
+from modules.module_turns import turns
+from modules.module_pipeline import Pipeline, SpeechJob
+from modules.module_tracing import tracer
 
 # Importamos versiones seguras (si existen)
 try:
-    from modules.module_llm import process_completion
+    from modules.module_llm import process_completion, stream_completion
 except ImportError:
-    process_completion = lambda x: "Error: LLM no encontrado"
+    process_completion = lambda x, token=None: "Error: LLM no encontrado"
+    stream_completion = lambda x, token=None: iter([process_completion(x)])
 
 try:
-    from modules.module_tts import play_audio_chunks
+    from modules.module_tts import speak_text, speak_stream
 except ImportError:
-    async def play_audio_chunks(*args, **kwargs): pass
+    def speak_text(*args, **kwargs): pass
+    def speak_stream(*args, **kwargs): pass
 
 CONFIG = load_config()
+# Voz y texto del LLM a la vez: la primera frase suena mientras se genera el resto
+STREAM_REPLIES = get_setting(CONFIG, 'LLM', 'stream', True)
+# El micro se abre antes que memoria/UI: lo que digas mientras tanto espera aquí a que estén
+READY_TIMEOUT = get_setting(CONFIG, 'STARTUP', 'ready_timeout', 30.0)
+managers_ready = threading.Event()
 
 # Variables Globales
 ui_manager = None
@@ -32,32 +42,52 @@ memory_manager = None
 stt_manager = None
 shutdown_event = None
 battery_module = None
+intent_router = None
+# Frase de un turno cancelado antes de que TARS contestara: se suma a la siguiente
+carry_over = ""
 
 def initialize_managers(mem_mgr, char_mgr, stt_mgr, ui_mgr, shutdown_evt, batt_mod):
-    global memory_manager, character_manager, stt_manager, ui_manager, shutdown_event, battery_module
+    global memory_manager, character_manager, stt_manager, ui_manager, shutdown_event, battery_module, intent_router
     memory_manager = mem_mgr
     character_manager = char_mgr
     stt_manager = stt_mgr
     ui_manager = ui_mgr
     shutdown_event = shutdown_evt
     battery_module = batt_mod
+    intent_router = IntentRouter(speak=_speak_later)
+    tars_state.subscribe(_on_state_change)
+    managers_ready.set()
     queue_message("SYSTEM: Managers initialized (Safe Mode).")
 
+def _on_state_change(old, new, t):
+    """Contabilidad de latencia: cuánto tardó TARS en empezar a hablar desde que terminaste."""
+    if old == THINKING and new == SPEAKING:
+        heard = tars_state.last_transition(LISTENING, THINKING)
+        if heard is not None:
+            print(f"⏱️ Respuesta en {t - heard:.2f}s (fin de tu frase -> primera palabra)")
+
+def _speak_later(text):
+    """Avisos fuera de turno (temporizadores): esperan a que TARS esté callado."""
+    tars_state.wait_for(IDLE, timeout=30)
+    if ui_manager: ui_manager.update_data("TARS", text, "TARS")
+    pipeline.say(SpeechJob(text, label="aviso"))
+
 def wake_word_callback(wake_response="Yes?"):
     """Respuesta inicial al detectar la palabra clave"""
     if ui_manager:
         ui_manager.deactivate_screensaver()
         ui_manager.update_data("TARS", wake_response, "TARS")
     
-    # Intento seguro de reproducir audio
-    try:
-        asyncio.run(play_audio_chunks(wake_response, "openai", True))
-    except Exception as e:
-        print(f"Audio Error: {e}")
+    # A la cola de voz del orquestador: no bloquea al oído
+    pipeline.say(SpeechJob(wake_response, label="wake"))
 
-def utterance_callback(message):
-    """Procesa el mensaje del usuario."""
+def utterance_callback(message, trace=None):
+    """
+    Procesa el mensaje del usuario (lo llama el oído; el turno corre en el orquestador).
+    'trace' es la traza de esa frase (module_tracing), si la hay.
+    """
     if not message:
+        tracer.finish(trace, "empty")
         return
 
     # 1. Extraer texto limpio
@@ -72,8 +102,40 @@ def utterance_callback(message):
     except:
         user_text = str(message)
 
-    if not user_text: return
+    if not user_text:
+        tracer.finish(trace, "empty")
+        tars_state.set(IDLE, expected=THINKING)
+        return
+    pipeline.submit(user_text, trace)
+
+def _take_turn(user_text, trace=None):
+    """Un turno completo (hilo 'llm' del orquestador)."""
+    global carry_over
+    if not managers_ready.is_set() and not managers_ready.wait(READY_TIMEOUT):
+        queue_message("WARNING: managers not ready, answering without them")
+        managers_ready.set()  # Solo se espera una vez
+    if carry_over:
+        user_text, carry_over = f"{carry_over} {user_text}", ""
 
+    # Token del turno: si vuelves a hablar, el oído lo cancela y todo lo de abajo se corta
+    token = turns.begin()
+    token.trace = tracer.claim(trace)  # LLM y TTS apuntan sus marcas en la traza de esta frase
+    try:
+        reply = _respond(user_text, token)
+    finally:
+        turns.finish(token)
+        tracer.finish(token.trace, "cancelled" if token.cancelled else "ok")
+        # Si el turno terminó sin hablar (comando, error...) no nos quedamos "pensando"
+        tars_state.set(IDLE, expected=THINKING)
+    if token.cancelled and not reply:
+        carry_over = user_text
+
+def _say(text, token):
+    """Dice 'text' por la etapa de voz y espera a que termine."""
+    pipeline.say(SpeechJob(text, token)).wait()
+
+def _respond(user_text, token):
+    """Contesta a 'user_text'. Devuelve lo que TARS llegó a decir."""
     # 2. Actualizar UI
     if ui_manager:
         ui_manager.deactivate_screensaver()
@@ -81,29 +143,61 @@ def utterance_callback(message):
     
     queue_message(f"USER: {user_text}")
 
-    # 3. Comandos de Sistema
-    cmd = user_text.lower()
-    if "apágate" in cmd or "shutdown" in cmd:
-        if ui_manager: ui_manager.update_data("SYSTEM", "Shutting down...", "SYSTEM")
-        os.system("sudo shutdown -h now")
-        return
+    # 3. Órdenes locales (apagado, hora, temperatura...): sin pasar por el LLM
+    intent = intent_router.match(user_text) if intent_router else None
+    if intent:
+        queue_message(f"INTENT: {intent.name} ({intent.match_us:.0f} µs)")
+        tars_state.set(THINKING, expected=(IDLE, LISTENING))
+        if ui_manager: ui_manager.update_data("TARS", intent.reply, "TARS")
+        _say(intent.reply, token)
+        if intent.after and not token.cancelled:
+            intent.after()
+        return intent.reply
 
     # 4. Generar Respuesta (LLM)
-    reply = "Processing..."
-    if ui_manager: ui_manager.update_data("TARS", reply, "TARS")
+    tars_state.set(THINKING, expected=(IDLE, LISTENING))
+    reply = ""
+    if ui_manager: ui_manager.update_data("TARS", "Processing...", "TARS")
     
     try:
-        # Llamada al cerebro
-        reply = process_completion(user_text)
-        # Limpieza básica
-        reply = re.sub(r"<think>.*?</think>", "", reply, flags=re.DOTALL).strip()
-        
-        # Mostrar y Hablar
-        if ui_manager: ui_manager.update_data("TARS", reply, "TARS")
-        asyncio.run(play_audio_chunks(reply, "openai"))
+        if STREAM_REPLIES:
+            # Llamada al cerebro en streaming: cada frase pasa a la voz en cuanto se cierra.
+            # El LLM genera en este hilo mientras la etapa de voz ya va hablando.
+            parts = []
+            job = pipeline.say(SpeechJob(token=token))
+            try:
+                for delta in stream_completion(user_text, token):
+                    parts.append(delta)
+                    if ui_manager: ui_manager.update_data("TARS", "".join(parts).strip(), "TARS")
+                    job.push(delta)
+            finally:
+                job.close()
+            job.wait()
+            reply = "".join(parts).strip()
+        else:
+            # Llamada al cerebro
+            reply = process_completion(user_text, token)
+            # Limpieza básica
+            reply = re.sub(r"<think>.*?</think>", "", reply, flags=re.DOTALL).strip()
+            if token.cancelled:
+                return ""
+
+            # Mostrar y Hablar
+            if ui_manager: ui_manager.update_data("TARS", reply, "TARS")
+            _say(reply, token)
         
     except Exception as e:
         queue_message(f"Error procesando respuesta: {e}")
+    return reply
 
 def post_utterance_callback():
     pass
+
+# Orquestador: un solo event loop para todos los turnos (app.py lo arranca y lo para)
+pipeline = Pipeline(
+    respond=_take_turn,
+    speak_text=speak_text,
+    speak_stream=speak_stream,
+    utterance_queue=get_setting(CONFIG, 'PIPELINE', 'utterance_queue', 3),
+    speech_queue=get_setting(CONFIG, 'PIPELINE', 'speech_queue', 2),
+)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+module_pipeline.py - Orquestador asyncio de larga vida (frase -> respuesta -> voz)
+Un único event loop en su propio hilo, arrancado y parado por app.py,
+en lugar de un asyncio.run() por respuesta desde el hilo que toque.
+
+  oído (captura + VAD + ASR, hilos propios en tiempo real)
+     │ submit(texto)
+     ▼
+  [utterances]  cola acotada (si se llena, se descarta la frase más vieja)
+     │ etapa "reply": intención local o LLM en el ejecutor 'llm'
+     ▼
+  [speech]      cola acotada de SpeechJob (texto fijo o flujo de texto del LLM)
+     │ etapa "speech": TTS + altavoz en el ejecutor 'audio' (un solo hilo:
+     ▼                 nunca suenan dos respuestas a la vez)
+  altavoz
+
+El loop solo coordina: todo lo bloqueante (red, síntesis, sounddevice) va a
+los ejecutores. Mientras el LLM genera en 'llm', la voz ya suena en 'audio'.
+Sin el orquestador en marcha (scripts, pruebas) todo se ejecuta en línea.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from modules.module_tracing import tracer
+from modules.module_turns import turns
+
+_END = object()
+
+
+class SpeechJob:
+    """
+    Algo que decir. Con 'text' es una frase cerrada; sin él, un flujo que
+    se va llenando con push() (tokens del LLM) hasta close().
+    """
+    def __init__(self, text=None, token=None, label="reply"):
+        self.text = text
+        self.token = token
+        self.label = label
+        self.finished = threading.Event()
+        self.queued_at = time.monotonic()
+        self._chunks = queue.Queue() if text is None else None
+
+    @property
+    def streaming(self):
+        return self._chunks is not None
+
+    def push(self, delta):
+        self._chunks.put(delta)
+
+    def close(self):
+        if self._chunks is not None:
+            self._chunks.put(_END)
+
+    def chunks(self):
+        """Texto según llega; termina al cerrar el flujo o al cancelarse el turno."""
+        while True:
+            try:
+                delta = self._chunks.get(timeout=0.05)
+            except queue.Empty:
+                if self.token is not None and self.token.cancelled:
+                    return
+                continue
+            if delta is _END:
+                return
+            yield delta
+
+    def wait(self, timeout=None):
+        """Bloquea hasta que se haya dicho (o descartado)."""
+        return self.finished.wait(timeout)
+
+
+class Pipeline:
+    def __init__(self, respond, speak_text, speak_stream, utterance_queue=3, speech_queue=2,
+                 llm_workers=1):
+        """
+        respond(texto, traza): turno completo (bloqueante, corre en el ejecutor 'llm');
+                               para hablar usa say(). 'traza' es la de la frase (o None).
+        speak_text(texto, token) / speak_stream(trozos, token): TTS + altavoz.
+        """
+        self.respond = respond
+        self.speak_text = speak_text
+        self.speak_stream = speak_stream
+        self.utterance_size = utterance_queue
+        self.speech_size = speech_queue
+        self.llm_workers = llm_workers
+
+        self.loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._tasks = []
+        self._puts = set()     # say() esperando hueco en la cola de voz
+        self._closing = False
+        self.utterances = None
+        self.speech = None
+        self.stats = {"utterances": 0, "dropped": 0, "replies": 0, "spoken": 0, "errors": 0,
+                      "rejected": 0, "max_speech_wait_ms": 0.0}
+
+    @property
+    def running(self):
+        return self.loop is not None and self.loop.is_running()
+
+    # --- Ciclo de vida ---
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._llm_exec = ThreadPoolExecutor(max_workers=self.llm_workers, thread_name_prefix="pipe-llm")
+        self._audio_exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipe-audio")
+        self._ready.clear()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="pipeline", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        print("🎛️ Orquestador en marcha (reply -> speech)")
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        # Las colas se crean dentro del loop que las va a usar
+        self.utterances = asyncio.Queue(maxsize=self.utterance_size)
+        self.speech = asyncio.Queue(maxsize=self.speech_size)
+        self._tasks = [self.loop.create_task(self._reply_stage(), name="reply"),
+                       self.loop.create_task(self._speech_stage(), name="speech")]
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def stop(self, timeout=3.0):
+        """Corta el turno en curso, vacía las colas y para el loop."""
+        if self._thread is None:
+            return
+        turns.preempt("apagado")
+        if self.running:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._llm_exec.shutdown(wait=False, cancel_futures=True)
+        self._audio_exec.shutdown(wait=False, cancel_futures=True)
+        self._thread = None
+        print("🎛️ Orquestador parado")
+
+    async def _shutdown(self):
+        self._closing = True
+        # Los say() bloqueados por cola llena se cancelan antes de vaciarla (si no, se colarían)
+        pending = self._tasks + list(self._puts)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        while not self.speech.empty():
+            self.speech.get_nowait().finished.set()  # Nadie se queda esperando
+
+    # --- Entradas (desde cualquier hilo) ---
+    def submit(self, text, trace=None):
+        """Frase transcrita (la llama el hilo de entrega del oído). No bloquea."""
+        if not self.running:
+            self._safe_respond(text, trace)
+            return
+        self.loop.call_soon_threadsafe(self._enqueue_utterance, text, trace)
+
+    def _enqueue_utterance(self, text, trace):
+        self.stats["utterances"] += 1
+        if self.utterances.full():
+            old, old_trace = self.utterances.get_nowait()
+            self.stats["dropped"] += 1
+            tracer.finish(old_trace, "dropped")
+            print(f"🚦 Orquestador: frase descartada por cola llena ('{old[:30]}')")
+        self.utterances.put_nowait((text, trace))
+
+    def say(self, job):
+        """
+        Encola un SpeechJob para la etapa de voz. Bloquea si la cola está llena
+        (contrapresión). Sin orquestador, lo dice aquí mismo. Si el orquestador
+        se para o el turno se cancela mientras espera, el trabajo se descarta
+        con job.finished puesto (job.wait() nunca se queda colgado).
+        """
+        if not self.running:
+            if job.streaming:  # Lo va llenando quien llama: la voz en otro hilo
+                threading.Thread(target=self._play, args=(job,), name="speech", daemon=True).start()
+            else:
+                self._play(job)
+            return job
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._put_speech(job), self.loop)
+        except RuntimeError:  # El loop se ha cerrado entre medias
+            return self._reject(job)
+        while True:
+            try:
+                future.result(timeout=0.25)
+                return job
+            except FutureTimeout:
+                # Se espera mientras el orquestador siga vivo y el turno siga en pie
+                if self.running and not (job.token is not None and job.token.cancelled):
+                    continue
+                future.cancel()
+            except (CancelledError, RuntimeError):
+                pass
+            return self._reject(job)
+
+    async def _put_speech(self, job):
+        if self._closing:
+            raise RuntimeError("orquestador parándose")
+        task = asyncio.current_task()
+        self._puts.add(task)
+        try:
+            await self.speech.put(job)
+        finally:
+            self._puts.discard(task)
+
+    def _reject(self, job):
+        """No se dirá: quien espere en job.wait() no se queda colgado."""
+        self.stats["rejected"] += 1
+        job.finished.set()
+        return job
+
+    # --- Etapas ---
+    async def _reply_stage(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            text, trace = await self.utterances.get()
+            await loop.run_in_executor(self._llm_exec, self._safe_respond, text, trace)
+            self.stats["replies"] += 1
+
+    async def _speech_stage(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.speech.get()
+            wait_ms = 1000 * (time.monotonic() - job.queued_at)
+            self.stats["max_speech_wait_ms"] = round(max(self.stats["max_speech_wait_ms"], wait_ms), 1)
+            await loop.run_in_executor(self._audio_exec, self._play, job)
+
+    def _safe_respond(self, text, trace=None):
+        try:
+            self.respond(text, trace)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"❌ Orquestador: error en la respuesta: {e}")
+
+    def _play(self, job):
+        try:
+            if job.token is not None and job.token.cancelled:
+                return
+            if job.streaming:
+                self.speak_stream(job.chunks(), job.token)
+            else:
+                self.speak_text(job.text, job.token)
+            self.stats["spoken"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"❌ Orquestador: error de voz ({job.label}): {e}")
+        finally:
+            job.finished.set()
+
+    def metrics(self):
+        out = dict(self.stats, running=self.running)
+        if self.running:
+            out["utterance_depth"] = self.utterances.qsize()
+            out["speech_depth"] = self.speech.qsize()
+        return out
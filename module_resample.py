@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+module_resample.py - Remuestreo y mapeo de canales en proceso
+Un único sitio para convertir audio entre tasas y número de canales:
+el oído baja 44.1 kHz estéreo a 16 kHz mono antes de subirlo y el TTS
+sube el PCM de 24 kHz mono a la tasa/canales del altavoz. Filtro
+polifásico Kaiser-sinc vectorizado con numpy, sin lanzar ffmpeg ni
+pasar por archivos temporales; los kernels se diseñan una vez por par
+de tasas y se reutilizan.
+"""
+
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def downmix(audio):
+    """Estéreo (frames, canales) -> mono (frames,)."""
+    if audio.ndim == 1:
+        return audio
+    if audio.shape[1] == 1:
+        return audio[:, 0]
+    return audio.mean(axis=1, dtype=np.float32)
+
+
+def map_channels(audio, channels):
+    """
+    Adapta (frames,) o (frames, canales) a 'channels' canales.
+    1 -> mono (frames,); N -> (frames, N) repitiendo la mezcla mono si hace falta.
+    """
+    if channels <= 1:
+        return downmix(audio)
+    if audio.ndim == 2 and audio.shape[1] == channels:
+        return audio
+    mono = downmix(audio)
+    return np.repeat(mono[:, None], channels, axis=1)
+
+
+def ratio(fs_in, fs_out):
+    """(up, down) irreducibles para pasar de fs_in a fs_out."""
+    g = gcd(int(fs_in), int(fs_out))
+    return int(fs_out) // g, int(fs_in) // g
+
+
+@lru_cache(maxsize=16)
+def design_filter(up, down, zeros=16, beta=8.0):
+    """
+    Paso bajo (sinc con ventana Kaiser) para remuestrear por up/down.
+    Corta en la Nyquist más baja de las dos tasas, así no hay aliasing.
+    Devuelve la matriz polifásica invertida (up, taps) lista para usar.
+    Se cachea por (up, down): el kernel de cada par de tasas se diseña una
+    sola vez por proceso y se comparte (de solo lectura) entre llamadas.
+    """
+    max_rate = max(up, down)
+    half = zeros * max_rate
+    t = np.arange(-half, half + 1, dtype=np.float64)
+    cutoff = 0.95 / max_rate
+    h = cutoff * np.sinc(cutoff * t) * np.kaiser(len(t), beta)
+    h *= up / h.sum()  # Ganancia unidad tras insertar ceros
+
+    taps = int(np.ceil(len(h) / up))
+    h = np.concatenate([h, np.zeros(taps * up - len(h))])
+    # polyphase[p, k] = h[p + k*up]; invertido para multiplicar por ventanas crecientes
+    polyphase = h.reshape(taps, up).T[:, ::-1]
+    polyphase = np.ascontiguousarray(polyphase, dtype=np.float32)
+    polyphase.setflags(write=False)
+    return polyphase, half
+
+
+def resample(audio, fs_in, fs_out):
+    """Remuestreo racional polifásico, vectorizado por fase. Acepta mono o (frames, canales)."""
+    if fs_in == fs_out or len(audio) == 0:
+        return audio
+    up, down = ratio(fs_in, fs_out)
+    polyphase, half = design_filter(up, down)
+    taps = polyphase.shape[1]
+
+    x = np.asarray(audio, dtype=np.float32)
+    n_out = int(np.ceil(len(x) * up / down))
+    pad = [(taps - 1, taps + 1)] + [(0, 0)] * (x.ndim - 1)
+    xpad = np.pad(x, pad)
+    # windows[s] = xpad[s:s+taps] (vista, sin copia)
+    windows = sliding_window_view(xpad, taps, axis=0)
+
+    out = np.empty((n_out,) + x.shape[1:], dtype=np.float32)
+    # Las salidas m, m+up, m+2up... comparten fase y avanzan 'down' muestras de entrada
+    for r in range(min(up, n_out)):
+        j0 = r * down + half
+        phase, i0 = j0 % up, j0 // up
+        count = len(range(r, n_out, up))
+        block = windows[i0:i0 + count * down:down]
+        out[r::up] = block @ polyphase[phase]
+    return out
+
+
+class StreamResampler:
+    """
+    Igual que resample() pero por trozos: guarda la cola de la entrada
+    entre llamadas, así el audio que llega por la red se convierte según
+    llega. La salida concatenada es idéntica a la de resample() de golpe.
+    """
+    def __init__(self, fs_in, fs_out):
+        self.up, self.down = ratio(fs_in, fs_out)
+        self.polyphase, self.half = design_filter(self.up, self.down)
+        self.taps = self.polyphase.shape[1]
+        self.reset()
+
+    def reset(self):
+        self._buf = None
+        self._base = -(self.taps - 1)  # Índice global de _buf[0] (empieza con ceros de relleno)
+        self._received = 0
+        self._produced = 0
+
+    def _outputs_until(self, n):
+        """Número de salidas calculables con n muestras de entrada."""
+        return max(0, (n * self.up - 1 - self.half) // self.down + 1)
+
+    def process(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self._buf is None:
+            self._buf = np.zeros((self.taps - 1,) + chunk.shape[1:], dtype=np.float32)
+        if self.up == self.down:
+            self._received += len(chunk)
+            self._produced += len(chunk)
+            return chunk
+
+        self._buf = np.concatenate((self._buf, chunk))
+        self._received += len(chunk)
+        m_start, m_end = self._produced, self._outputs_until(self._received)
+        count = m_end - m_start
+        out = np.empty((max(0, count),) + chunk.shape[1:], dtype=np.float32)
+
+        if count > 0:
+            windows = sliding_window_view(self._buf, self.taps, axis=0)
+            for r in range(min(self.up, count)):
+                m = m_start + r
+                j0 = m * self.down + self.half
+                phase, i0 = j0 % self.up, j0 // self.up
+                n = len(range(r, count, self.up))
+                w0 = i0 - self.taps + 1 - self._base
+                out[r::self.up] = windows[w0:w0 + n * self.down:self.down] @ self.polyphase[phase]
+            self._produced = m_end
+
+        # Tiramos lo que ya no hace falta para la siguiente salida
+        keep_from = (self._produced * self.down + self.half) // self.up - self.taps + 1
+        drop = max(0, keep_from - self._base)
+        if drop:
+            self._buf = self._buf[drop:]
+            self._base += drop
+        return out
+
+    def flush(self):
+        """Vacía el filtro al final del flujo (rellena con ceros la cola)."""
+        if self._buf is None:
+            return np.empty(0, dtype=np.float32)
+        total = int(np.ceil(self._received * self.up / self.down))
+        pad = np.zeros((self.taps + self.half // self.up + 1,) + self._buf.shape[1:], dtype=np.float32)
+        received = self._received
+        out = self.process(pad)
+        self._received = received
+        return out[:max(0, total - (self._produced - len(out)))]
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+module_resilience.py - Plazos, peticiones duplicadas y cortacircuitos
+Cada llamada a la nube (Whisper, LLM, TTS) pasa por una etapa (Stage) que:
+  - le da un plazo sacado del presupuesto de latencia del turno
+    (RESILIENCE.turn_budget segundos repartidos entre stt / llm / tts),
+  - si la respuesta tarda más que la cola habitual (percentil de las
+    últimas latencias) lanza una segunda petición igual y se queda con
+    la primera que llegue ("hedging"),
+  - cuenta fallos en un cortacircuitos: con la API degradada deja de
+    llamarla durante un rato y pasa directamente al plan B (caché o local).
+
+Para respuestas en streaming el plazo y la duplicación se aplican al
+primer trozo (lo que decide cuándo empieza a sonar TARS).
+
+Con un CancelToken (module_turns) la espera se corta en cuanto el turno
+se cancela: TurnCancelled, sin plan B y sin contar como fallo de la API.
+
+Ajustes (sección RESILIENCE):
+  turn_budget 8.0, stt_share 0.3, llm_share 0.35, tts_share 0.35,
+  min_timeout 1.0, hedge true, hedge_percentile 90, hedge_min 0.4,
+  breaker_failures 3, breaker_window 30, breaker_cooldown 20
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from modules.module_config import load_config
+from modules.module_settings import get_setting
+from modules.module_state import tars_state, IDLE, LISTENING
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+# === Presupuesto del turno ===
+
+class TurnBudget:
+    """Segundos que le quedan al turno en curso (desde que terminaste de hablar)."""
+    def __init__(self, total, shares):
+        self.total = total
+        self.shares = shares
+        self.started = time.monotonic()
+
+    def remaining(self):
+        return self.total - (time.monotonic() - self.started)
+
+    def timeout(self, stage, minimum=1.0):
+        share = self.total * self.shares.get(stage, 1.0)
+        return max(minimum, min(share, self.remaining()))
+
+
+_turn = None
+
+
+def begin_turn():
+    """Arranca el reloj del turno (lo llama el oído al cerrar tu frase)."""
+    global _turn
+    _turn = TurnBudget(TURN_BUDGET, SHARES)
+    return _turn
+
+
+def current_turn():
+    return _turn
+
+
+def _end_turn(old, new, t):
+    """El turno acaba cuando TARS vuelve a reposo o empiezas otra frase."""
+    global _turn
+    if new in (IDLE, LISTENING):
+        _turn = None
+
+
+tars_state.subscribe(_end_turn)
+
+
+# === Cortacircuitos ===
+
+class CircuitBreaker:
+    """
+    closed -> open tras 'failures' fallos en 'window' segundos; open -> half_open
+    pasado 'cooldown'; en half_open una sola petición de prueba decide.
+    """
+    def __init__(self, name, failures=3, window=30.0, cooldown=20.0):
+        self.name = name
+        self.failures = failures
+        self.window = window
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self._opened_at = None
+        self._probing = False
+        self.stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"🔌 {self.name}: API recuperada, circuito cerrado")
+            self._opened_at = None
+            self._probing = False
+            self._recent.clear()
+
+    def abandon(self):
+        """La petición se canceló sin veredicto: si era la de prueba, otra podrá probar."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._probing or self._state() == "half_open":
+                self._opened_at = now  # La prueba falló: otro periodo abierto
+                self._probing = False
+                return
+            self._recent.append(now)
+            while self._recent and now - self._recent[0] > self.window:
+                self._recent.popleft()
+            if self._opened_at is None and len(self._recent) >= self.failures:
+                self._opened_at = now
+                self._recent.clear()
+                self.stats["opened"] += 1
+                print(f"🔌 {self.name}: {self.failures} fallos seguidos, circuito abierto {self.cooldown:.0f}s")
+
+
+# === Etapas ===
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="resilience")
+_END = object()       # El stream terminó sin dar nada
+_FALLBACK = object()  # El iterable viene del plan B
+
+
+def _close(iterator):
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+class Stage:
+    def __init__(self, name, share, total=8.0, min_timeout=1.0, hedge=True,
+                 hedge_percentile=90, hedge_min=0.4, breaker=None):
+        self.name = name
+        self.share = share
+        self.total = total
+        self.min_timeout = min_timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min = hedge_min
+        self.breaker = breaker or CircuitBreaker(name)
+        self._latencies = deque(maxlen=50)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "ok": 0, "failures": 0, "timeouts": 0, "hedges": 0,
+                      "hedge_wins": 0, "short_circuited": 0, "fallbacks": 0, "cancelled": 0}
+
+    def timeout(self, cap=None, floor=None):
+        """
+        Plazo de esta etapa: su parte del presupuesto, o lo que quede del turno.
+        cap lo recorta; floor es un mínimo que el presupuesto no puede recortar
+        (p.ej. subir 20 s de audio no cabe en la parte del turno de una orden corta).
+        """
+        turn = current_turn()
+        if turn is not None and turn.remaining() > 0:
+            timeout = turn.timeout(self.name, self.min_timeout)
+        else:
+            timeout = self.total * self.share
+        timeout = min(timeout, cap) if cap else timeout
+        return max(timeout, floor) if floor else timeout
+
+    def hedge_delay(self, timeout):
+        """Cuándo lanzar la segunda petición: la cola habitual de latencias."""
+        with self._lock:
+            samples = list(self._latencies)
+        if len(samples) < 5:
+            return max(self.hedge_min, timeout / 2)
+        return max(self.hedge_min, float(np.percentile(samples, self.hedge_percentile)))
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def call(self, fn, fallback=None, timeout=None, on_discard=None, token=None, floor=None):
+        """
+        fn(timeout) -> resultado. Devuelve el primer resultado correcto dentro
+        del plazo; si no, fallback() (si hay) o la excepción. on_discard(resultado)
+        recibe lo que devuelva tarde la petición perdedora (para cerrarlo).
+        token: CancelToken del turno; si se cancela, TurnCancelled al momento.
+        timeout / floor: tope y mínimo del plazo (ver Stage.timeout).
+        """
+        self._count("calls")
+        if token is not None:
+            token.check()
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            return self._fail(CircuitOpenError(f"{self.name}: circuito abierto"), fallback)
+
+        timeout = self.timeout(timeout, floor)
+        t0 = time.monotonic()
+        deadline = t0 + timeout
+        hedge_at = t0 + self.hedge_delay(timeout) if self.hedge else None
+        pending = {_executor.submit(fn, timeout): 0}
+        launched = 1
+        error = None
+
+        while True:
+            now = time.monotonic()
+            if pending:
+                until = deadline if hedge_at is None or launched > 1 else min(deadline, hedge_at)
+                waiting = list(pending) + ([token.future] if token is not None else [])
+                done, _ = wait(waiting, timeout=max(0.0, until - now), return_when=FIRST_COMPLETED)
+                if token is not None and token.cancelled:
+                    self._discard(pending, on_discard)
+                    self._count("cancelled")
+                    self.breaker.abandon()
+                    token.check()
+                for future in done:
+                    attempt = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    self._succeed(time.monotonic() - t0, attempt, pending, on_discard)
+                    return result
+                now = time.monotonic()
+
+            if now >= deadline:
+                error = DeadlineExceeded(f"{self.name}: sin respuesta en {timeout:.1f}s")
+                self._count("timeouts")
+                break
+            # Segunda petición: por lentitud (pasado hedge_at) o porque la primera ya falló
+            if launched == 1 and self.hedge and (not pending or now >= hedge_at):
+                self._count("hedges")
+                pending[_executor.submit(fn, max(0.1, deadline - now))] = 1
+                launched += 1
+                continue
+            if not pending:
+                break
+
+        self._discard(pending, on_discard)
+        self._count("failures")
+        self.breaker.record_failure()
+        return self._fail(error, fallback)
+
+    def _succeed(self, elapsed, attempt, pending, on_discard):
+        with self._lock:
+            self._latencies.append(elapsed)
+            self.stats["ok"] += 1
+            if attempt:
+                self.stats["hedge_wins"] += 1
+        self.breaker.record_success()
+        self._discard(pending, on_discard)
+
+    @staticmethod
+    def _discard(pending, on_discard):
+        for future in pending:
+            if not future.cancel() and on_discard is not None:
+                future.add_done_callback(
+                    lambda f: f.exception() is None and on_discard(f.result()))
+
+    def _fail(self, error, fallback):
+        if fallback is None:
+            raise error
+        self._count("fallbacks")
+        print(f"🛟 {self.name}: {error} -> plan B")
+        return fallback()
+
+    def stream(self, open_fn, fallback=None, timeout=None, token=None):
+        """
+        open_fn(timeout) -> iterable (p.ej. un generador que abre la petición).
+        Plazo y duplicación se aplican hasta el primer elemento; el resto se
+        itera normalmente (quien lo consume mira el token entre trozos).
+        fallback() debe devolver otro iterable.
+        """
+        def primed(t):
+            iterator = iter(open_fn(t))
+            try:
+                return iterator, next(iterator)
+            except StopIteration:
+                return iterator, _END
+
+        opened = self.call(primed, timeout=timeout, on_discard=lambda r: _close(r[0]), token=token,
+                           fallback=None if fallback is None else lambda: (iter(fallback()), _FALLBACK))
+        iterator, first = opened
+        if first is _FALLBACK:
+            return iterator
+        return self._chain(iterator, first)
+
+    @staticmethod
+    def _chain(iterator, first):
+        try:
+            if first is not _END:
+                yield first
+                yield from iterator
+        finally:
+            _close(iterator)
+
+    def metrics(self):
+        with self._lock:
+            samples = list(self._latencies)
+            out = dict(self.stats, breaker=self.breaker.state)
+        if samples:
+            out["p50_ms"] = round(1000 * float(np.percentile(samples, 50)))
+            out["p95_ms"] = round(1000 * float(np.percentile(samples, 95)))
+        return out
+
+
+CONFIG = load_config()
+TURN_BUDGET = get_setting(CONFIG, 'RESILIENCE', 'turn_budget', 8.0)
+SHARES = {
+    "stt": get_setting(CONFIG, 'RESILIENCE', 'stt_share', 0.3),
+    "llm": get_setting(CONFIG, 'RESILIENCE', 'llm_share', 0.35),
+    "tts": get_setting(CONFIG, 'RESILIENCE', 'tts_share', 0.35),
+}
+
+
+def _make_stage(name):
+    return Stage(
+        name, SHARES[name], total=TURN_BUDGET,
+        min_timeout=get_setting(CONFIG, 'RESILIENCE', 'min_timeout', 1.0),
+        hedge=get_setting(CONFIG, 'RESILIENCE', 'hedge', True),
+        hedge_percentile=get_setting(CONFIG, 'RESILIENCE', 'hedge_percentile', 90),
+        hedge_min=get_setting(CONFIG, 'RESILIENCE', 'hedge_min', 0.4),
+        breaker=CircuitBreaker(
+            name,
+            failures=get_setting(CONFIG, 'RESILIENCE', 'breaker_failures', 3),
+            window=get_setting(CONFIG, 'RESILIENCE', 'breaker_window', 30.0),
+            cooldown=get_setting(CONFIG, 'RESILIENCE', 'breaker_cooldown', 20.0),
+        ),
+    )
+
+
+# Una etapa por servicio, compartidas por module_stt, module_llm y module_tts
+stages = {name: _make_stage(name) for name in ("stt", "llm", "tts")}
+
+
+def get_resilience_metrics():
+    return {name: stage.metrics() for name, stage in stages.items()}
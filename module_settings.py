@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+module_settings.py - Lectura tolerante de la configuración
+La config puede llegar como dict, como objeto con atributos o sin la sección;
+aquí lo normalizamos y convertimos el valor al tipo del default.
+"""
+
+_TRUE = ("1", "true", "yes", "on", "si", "sí")
+
+
+def _cast(value, default):
+    if default is None or value is None or not isinstance(value, str):
+        return value
+    try:
+        if isinstance(default, bool):
+            return value.strip().lower() in _TRUE
+        if isinstance(default, int):
+            return int(float(value))
+        if isinstance(default, float):
+            return float(value)
+        if isinstance(default, (list, tuple)):
+            return [v.strip() for v in value.split(",") if v.strip()]
+    except ValueError:
+        return default
+    return value
+
+
+def get_setting(config, section, key, default=None):
+    """Devuelve config[section][key] o el default si no existe."""
+    try:
+        sec = config[section]
+    except Exception:
+        return default
+
+    value = None
+    if isinstance(sec, dict):
+        value = sec.get(key)
+    else:
+        value = getattr(sec, key, None)
+        if value is None and hasattr(sec, "get"):
+            try:
+                value = sec.get(key)
+            except Exception:
+                value = None
+
+    if value is None or value == "":
+        return default
+    return _cast(value, default)
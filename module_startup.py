@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+module_startup.py - Cronología del arranque: qué se come los segundos hasta que TARS oye
+app.py lo importa antes que nada. Desde ese momento cada import que pase
+por Python queda cronometrado (tiempo propio, sin contar los imports que
+hace dentro) y los pasos del arranque se apuntan con step() / mark(), con
+el hilo en el que corrieron. Al terminar, report() imprime la línea de
+tiempo y los módulos más lentos de importar.
+
+  with timeline.step("oído"):
+      stt_manager = STTManager(...)
+  timeline.mark("micro abierto")
+  timeline.report(top=15)
+
+Los tiempos cuentan desde que arrancó el proceso (/proc/self/stat), así
+también sale lo que tarda el intérprete en llegar a app.py.
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _process_age():
+    """Segundos desde que arrancó el proceso (Linux). 0 si no se puede saber."""
+    try:
+        with open("/proc/self/stat") as f:
+            started = int(f.read().rsplit(")", 1)[1].split()[19])  # starttime, en ticks desde el boot
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - started / os.sysconf("SC_CLK_TCK"))
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+class _TimedLoader:
+    """Envuelve el loader de un módulo solo para cronometrar exec_module()."""
+    def __init__(self, loader, timeline):
+        self._loader = loader
+        self._timeline = timeline
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # El módulo se queda con su loader de verdad (importlib.resources, inspect...)
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._timeline._import_started()
+        t0 = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timeline._import_finished(module.__name__, time.perf_counter() - t0)
+
+
+class _ImportTimer:
+    """Buscador en sys.meta_path que no encuentra nada: solo envuelve lo que encuentran los demás."""
+    def __init__(self, timeline):
+        self._timeline = timeline
+        self._busy = threading.local()
+
+    def find_spec(self, name, path=None, target=None):
+        if getattr(self._busy, "active", False):
+            return None
+        self._busy.active = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._busy.active = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self._timeline)
+        return spec
+
+
+class StartupTimeline:
+    def __init__(self):
+        self.t0 = time.perf_counter() - _process_age()
+        self._lock = threading.Lock()
+        self.events = []    # (inicio s, duración s o None, etiqueta, hilo)
+        self.imports = {}   # módulo -> (total s, propio s, hilo)
+        self._stack = threading.local()
+        self._hook = None
+
+    # --- Imports ---
+    def install_import_hook(self):
+        if self._hook is None:
+            self._hook = _ImportTimer(self)
+            sys.meta_path.insert(0, self._hook)
+        return self
+
+    def remove_import_hook(self):
+        if self._hook is not None:
+            try:
+                sys.meta_path.remove(self._hook)
+            except ValueError:
+                pass
+            self._hook = None
+
+    def _import_started(self):
+        stack = getattr(self._stack, "children", None)
+        if stack is None:
+            stack = self._stack.children = []
+        stack.append(0.0)  # Tiempo que se llevarán los imports anidados
+
+    def _import_finished(self, name, total):
+        stack = self._stack.children
+        own = total - stack.pop()
+        if stack:
+            stack[-1] += total
+        with self._lock:
+            self.imports[name] = (total, own, threading.current_thread().name)
+
+    # --- Pasos ---
+    def now(self):
+        return time.perf_counter() - self.t0
+
+    def mark(self, label):
+        """Un hito (sin duración)."""
+        with self._lock:
+            self.events.append((self.now(), None, label, threading.current_thread().name))
+
+    @contextmanager
+    def step(self, label):
+        start = self.now()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.events.append((start, self.now() - start, label, threading.current_thread().name))
+
+    # --- Informe ---
+    def report(self, top=15, print_fn=print):
+        with self._lock:
+            events = sorted(self.events)
+            imports = sorted(self.imports.items(), key=lambda kv: -kv[1][1])
+        print_fn(f"⏱️ Arranque: {len(imports)} módulos importados, "
+                 f"{sum(own for _, (_, own, _) in imports):.2f}s en imports")
+        for start, duration, label, thread in events:
+            span = f"{start:6.2f}s +{duration:5.2f}s" if duration is not None else f"{start:6.2f}s   ---  "
+            print_fn(f"   {span}  {label} [{thread}]")
+        if top and imports:
+            print_fn("⏱️ Imports más lentos (propio / con lo que importan):")
+            for name, (total, own, thread) in imports[:top]:
+                print_fn(f"   {1000 * own:7.0f} ms / {1000 * total:7.0f} ms  {name} [{thread}]")
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "events": [{"at_s": round(s, 3), "duration_s": None if d is None else round(d, 3),
+                            "label": label, "thread": thread} for s, d, label, thread in sorted(self.events)],
+                "imports_s": {name: round(own, 4) for name, (_, own, _) in self.imports.items()},
+            }
+
+
+# Uno por proceso: empieza a contar en cuanto se importa este módulo
+timeline = StartupTimeline()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+module_state.py - Canal de estado de TARS (idle / listening / thinking / speaking)
+Sustituye al flag suelto tars_status.is_speaking: cada transición queda
+sellada con time.monotonic() y se avisa a los suscriptores al momento,
+sin bucles de sleep. Se puede esperar un estado desde un hilo (wait_for)
+o desde asyncio (wait_for_async).
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+import modules.tars_status as status
+
+IDLE = "idle"
+LISTENING = "listening"
+THINKING = "thinking"
+SPEAKING = "speaking"
+STATES = (IDLE, LISTENING, THINKING, SPEAKING)
+
+
+class TarsState:
+    def __init__(self, history=500):
+        self._cond = threading.Condition()
+        self._subscribers = []
+        self.state = IDLE
+        self.since = time.monotonic()
+        self.history = deque(maxlen=history)  # (t, anterior, nuevo, segundos en el anterior)
+        self._time_in = {s: 0.0 for s in STATES}
+        self._count = {s: 0 for s in STATES}
+
+    @property
+    def is_speaking(self):
+        return self.state == SPEAKING
+
+    def set(self, new, expected=None):
+        """
+        Cambia de estado y avisa a los suscriptores. Con 'expected' solo cambia si
+        el estado actual es uno de esos (p.ej. el TTS no pisa un LISTENING del barge-in).
+        Devuelve True si hubo transición.
+        """
+        if new not in STATES:
+            raise ValueError(f"Estado desconocido: {new}")
+        with self._cond:
+            old = self.state
+            if old == new:
+                return False
+            if expected is not None and old not in (expected if isinstance(expected, tuple) else (expected,)):
+                return False
+            now = time.monotonic()
+            elapsed = now - self.since
+            self._time_in[old] += elapsed
+            self._count[new] += 1
+            self.state, self.since = new, now
+            self.history.append((now, old, new, elapsed))
+            subscribers = list(self._subscribers)
+            self._cond.notify_all()
+
+        # Compatibilidad con módulos que aún leen el flag antiguo
+        status.is_speaking = new == SPEAKING
+
+        for callback in subscribers:
+            try:
+                callback(old, new, now)
+            except Exception as e:
+                print(f"STATE: error en suscriptor {callback}: {e}")
+        return True
+
+    def subscribe(self, callback):
+        """callback(anterior, nuevo, t_monotonic). Devuelve la función para darse de baja."""
+        with self._cond:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._cond:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def wait_for(self, states, timeout=None):
+        """Bloquea hasta estar en alguno de 'states'. Devuelve False si vence el timeout."""
+        states = states if isinstance(states, tuple) else (states,)
+        with self._cond:
+            return self._cond.wait_for(lambda: self.state in states, timeout)
+
+    async def wait_for_async(self, states):
+        """Versión asyncio de wait_for (no bloquea el event loop)."""
+        states = states if isinstance(states, tuple) else (states,)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def on_change(old, new, t):
+            if new in states:
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(new))
+
+        unsubscribe = self.subscribe(on_change)
+        try:
+            if self.state in states:
+                return self.state
+            return await future
+        finally:
+            unsubscribe()
+
+    def last_transition(self, old, new):
+        """Marca de tiempo de la última transición old -> new (o None)."""
+        for t, a, b, _ in reversed(self.history):
+            if a == old and b == new:
+                return t
+        return None
+
+    def metrics(self):
+        with self._cond:
+            time_in = dict(self._time_in)
+            time_in[self.state] += time.monotonic() - self.since
+            return {
+                "state": self.state,
+                "transitions": dict(self._count),
+                "seconds_in": {k: round(v, 2) for k, v in time_in.items()},
+            }
+
+
+# Canal compartido por STT, TTS, UI y main
+tars_state = TarsState()
@@ -3,16 +3,393 @@ import threading
 import time
 import numpy as np
 import sounddevice as sd
-import soundfile as sf
 import io
-import os
-from modules.module_config import load_config
-import modules.tars_status as status 
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from modules.module_settings import get_setting
+from modules.module_audiobuffer import AudioRingBuffer
+from modules.module_vad import create_vad
+from modules.module_endpoint import create_endpoint_detector
+from modules.module_audioprep import condition, encode, encoded_format
+from modules.module_resample import downmix
+from modules.module_workers import OrderedWorkerPool
+from modules.module_aec import EchoCanceller, playback_reference
+from modules.module_state import tars_state, IDLE, LISTENING, THINKING, SPEAKING
+from modules.module_clients import client_hub
+from modules.module_resilience import stages, begin_turn
+from modules.module_turns import turns
+from modules.module_tracing import tracer
+
+
+# === Motores de reconocimiento (ASR) ===
+# Todos reciben audio mono float32 a 16 kHz y devuelven texto (o None).
+
+class ASRBackend:
+    name = "base"
+    remote = False
+
+    def __init__(self):
+        self.stats = {"calls": 0, "errors": 0, "total_s": 0.0, "last_s": 0.0}
+
+    def transcribe(self, audio, fs, timeout=None):
+        """Transcripción en firme de una frase (o segmento)."""
+        t0 = time.monotonic()
+        self.stats["calls"] += 1
+        try:
+            return self._transcribe(audio, fs, timeout)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.monotonic() - t0
+            self.stats["last_s"] = elapsed
+            self.stats["total_s"] += elapsed
+
+    def _transcribe(self, audio, fs, timeout):
+        raise NotImplementedError
+
+    def transcribe_partial(self, audio, fs):
+        """
+        Hipótesis mientras hablas (modo streaming): muchas llamadas cortas que
+        no cuentan en las estadísticas ni pasan por la etapa "stt" (no deben
+        mover sus percentiles de hedging ni abrir su cortacircuitos).
+        """
+        return self._transcribe(audio, fs, None)
+
+    def metrics(self):
+        calls = self.stats["calls"]
+        avg = self.stats["total_s"] / calls if calls else 0.0
+        return {"backend": self.name, "calls": calls, "errors": self.stats["errors"],
+                "avg_ms": round(1000 * avg, 1), "last_ms": round(1000 * self.stats["last_s"], 1)}
+
+
+class OpenAIASRBackend(ASRBackend):
+    """
+    Whisper en la nube (lo de siempre), subiendo el audio comprimido.
+    Sin plazo de quien llama (modo "openai", no hay plan B local) el plazo
+    crece con lo que dure la frase: timeout + timeout_per_second por segundo
+    de audio, y el presupuesto del turno no lo recorta por debajo de eso.
+    """
+    name = "openai"
+    remote = True
+
+    def __init__(self, client, model="whisper-1", language="es", fmt="flac", timeout=4.0,
+                 timeout_per_second=0.4, partial_timeout=2.0):
+        super().__init__()
+        self.client = client
+        self.model = model
+        self.language = language
+        self.fmt = fmt
+        self.timeout = timeout
+        self.timeout_per_second = timeout_per_second
+        self.partial_timeout = partial_timeout
+
+    def deadline(self, seconds):
+        """Plazo para subir y transcribir 'seconds' segundos de audio."""
+        return self.timeout + self.timeout_per_second * seconds
+
+    def _upload(self, data, name, timeout):
+        # Un archivo por intento: la petición duplicada no puede compartir el buffer
+        upload_file = io.BytesIO(data)
+        upload_file.name = name
+        return self.client.audio.transcriptions.create(
+            model=self.model, 
+            file=upload_file, 
+            language=self.language,
+            timeout=timeout
+        ).text
+
+    def _transcribe(self, audio, fs, timeout):
+        buffer = encode(audio, fs, self.fmt)
+        data, name = buffer.getvalue(), buffer.name
+        print(f"📦 Subiendo {len(data) // 1024} KB {encoded_format(buffer)}")
+
+        def upload(deadline):
+            return self._upload(data, name, deadline)
+
+        # Plazo del turno, segunda petición si se atasca y cortacircuitos
+        if timeout:
+            return stages["stt"].call(upload, timeout=timeout)  # Quien llama tiene plan B (modo "auto")
+        return stages["stt"].call(upload, floor=self.deadline(len(audio) / fs))
+
+    def transcribe_partial(self, audio, fs):
+        # Una sola petición directa: si no llega a tiempo, ya vendrá la siguiente hipótesis
+        buffer = encode(audio, fs, self.fmt)
+        return self._upload(buffer.getvalue(), buffer.name, self.partial_timeout)
+
+
+class VoskASRBackend(ASRBackend):
+    """Reconocimiento local en CPU con Vosk (sin red)."""
+    name = "vosk"
+
+    def __init__(self, model_path):
+        super().__init__()
+        from vosk import Model, SetLogLevel
+        SetLogLevel(-1)
+        print(f"EAR: Cargando modelo Vosk ({model_path})...")
+        self.model = Model(model_path)
+
+    def _transcribe(self, audio, fs, timeout):
+        from vosk import KaldiRecognizer
+        recognizer = KaldiRecognizer(self.model, fs)
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        recognizer.AcceptWaveform(pcm.tobytes())
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+class WhisperCppASRBackend(ASRBackend):
+    """Whisper local (whisper.cpp vía pywhispercpp), modelos tiny/base en CPU."""
+    name = "whispercpp"
+
+    def __init__(self, model="base", language="es", threads=4):
+        super().__init__()
+        from pywhispercpp.model import Model
+        print(f"EAR: Cargando whisper.cpp ({model})...")
+        self.model = Model(model, n_threads=threads, print_progress=False,
+                           print_realtime=False)
+        self.language = language
+        self._lock = threading.Lock()  # Un contexto de whisper.cpp no es reentrante
+
+    def _transcribe(self, audio, fs, timeout):
+        with self._lock:
+            segments = self.model.transcribe(audio.astype(np.float32), language=self.language)
+        return " ".join(seg.text.strip() for seg in segments)
+
+
+class FallbackASRBackend(ASRBackend):
+    """
+    Remoto primero; si tarda más que latency_budget o falla, esa frase se
+    transcribe en local. Tras 'max_strikes' fallos seguidos nos quedamos en
+    local durante 'cooldown' segundos antes de volver a probar la nube.
+    """
+    name = "auto"
+
+    def __init__(self, remote, local, latency_budget=3.0, max_strikes=2, cooldown=60.0):
+        super().__init__()
+        self.remote_backend = remote
+        self.local_backend = local
+        self.latency_budget = latency_budget
+        self.max_strikes = max_strikes
+        self.cooldown = cooldown
+        self._strikes = 0
+        self._local_until = 0.0
+        self.stats.update({"remote": 0, "local": 0, "fallbacks": 0})
+
+    def _transcribe(self, audio, fs, timeout):
+        if time.monotonic() >= self._local_until:
+            self.stats["remote"] += 1
+            try:
+                text = self.remote_backend.transcribe(audio, fs, timeout=self.latency_budget)
+                slow = self.remote_backend.stats["last_s"] > self.latency_budget
+                self._strikes = self._strikes + 1 if slow else 0
+                if not slow:
+                    return text
+                print(f"🐢 Whisper remoto lento ({self.remote_backend.stats['last_s']:.1f}s)")
+                self._maybe_go_local()
+                return text
+            except Exception as e:
+                print(f"🌐 Whisper remoto falló ({e}), pasando a local")
+                self._strikes += 1
+                self._maybe_go_local()
+            self.stats["fallbacks"] += 1
+
+        self.stats["local"] += 1
+        return self.local_backend.transcribe(audio, fs)
+
+    def transcribe_partial(self, audio, fs):
+        # Las hipótesis no cuentan como fallos del remoto: solo siguen el modo actual
+        if time.monotonic() >= self._local_until:
+            return self.remote_backend.transcribe_partial(audio, fs)
+        return self.local_backend.transcribe_partial(audio, fs)
+
+    def _maybe_go_local(self):
+        if self._strikes >= self.max_strikes:
+            print(f"📴 Modo local durante {self.cooldown:.0f}s")
+            self._local_until = time.monotonic() + self.cooldown
+            self._strikes = 0
+
+    def metrics(self):
+        out = super().metrics()
+        out.update(remote=self.stats["remote"], local=self.stats["local"],
+                   fallbacks=self.stats["fallbacks"],
+                   remote_backend=self.remote_backend.metrics(),
+                   local_backend=self.local_backend.metrics())
+        return out
+
+
+def _create_local_backend(config, engine):
+    if engine == 'whispercpp':
+        return WhisperCppASRBackend(
+            model=get_setting(config, 'STT', 'whispercpp_model', 'base'),
+            language=get_setting(config, 'STT', 'asr_language', 'es'),
+        )
+    return VoskASRBackend(get_setting(config, 'STT', 'vosk_model_path', 'stt/vosk-model-small-es-0.42'))
+
+
+def create_asr_backend(config):
+    """
+    STT.asr_backend:
+      - "openai" (por defecto): Whisper en la nube
+      - "vosk" / "whispercpp":  solo local
+      - "auto":                 nube con caída automática a local
+    """
+    choice = get_setting(config, 'STT', 'asr_backend', 'openai')
+
+    remote = None
+    if choice in ('openai', 'auto'):
+        client = client_hub.openai()
+        if client is not None:
+            remote = OpenAIASRBackend(
+                client,
+                language=get_setting(config, 'STT', 'asr_language', 'es'),
+                fmt=get_setting(config, 'STT', 'upload_format', 'flac'),
+                timeout=get_setting(config, 'STT', 'asr_timeout', 4.0),
+                timeout_per_second=get_setting(config, 'STT', 'asr_timeout_per_second', 0.4),
+            )
+        elif choice == 'openai':
+            print("EAR ERROR: Sin API Key de OpenAI, no hay transcripción")
+            return None
+
+    if choice == 'openai':
+        return remote
+
+    engine = get_setting(config, 'STT', 'asr_local_engine', 'vosk') if choice == 'auto' else choice
+    try:
+        local = _create_local_backend(config, engine)
+    except Exception as e:
+        print(f"EAR WARNING: Motor local no disponible ({e})")
+        return remote
+
+    if choice == 'auto' and remote is not None:
+        return FallbackASRBackend(
+            remote, local,
+            latency_budget=get_setting(config, 'STT', 'asr_latency_budget', 3.0),
+            cooldown=get_setting(config, 'STT', 'asr_local_cooldown', 60.0),
+        )
+    return local
+
+
+# === Transcripción en streaming ===
+
+class StreamedUtterance:
+    """Frase troceada: Futures de segmentos ya enviados + audio final pendiente."""
+    def __init__(self, parts):
+        self.parts = parts
+
+    @staticmethod
+    def merge(a, b):
+        if isinstance(a, np.ndarray) and isinstance(b, np.ndarray):
+            return np.concatenate((a, b), axis=0)
+        parts_a = a.parts if isinstance(a, StreamedUtterance) else [a]
+        parts_b = b.parts if isinstance(b, StreamedUtterance) else [b]
+        return StreamedUtterance(parts_a + parts_b)
+
+
+class HeardUtterance:
+    """Trabajo del pool de ASR: el audio de una frase (o frase troceada) y su traza."""
+    __slots__ = ("audio", "trace")
+
+    def __init__(self, audio, trace=None):
+        self.audio = audio
+        self.trace = trace
+
+    @staticmethod
+    def merge(a, b):
+        # Cola llena: las dos frases van juntas al ASR y se contestan como la segunda
+        tracer.finish(a.trace, "merged")
+        return HeardUtterance(StreamedUtterance.merge(a.audio, b.audio), b.trace)
+
+
+class StreamingSession:
+    """
+    Transcribe mientras hablas. Cada partial_interval se manda la ventana
+    desde el último corte hasta ahora (ventanas solapadas que van creciendo)
+    y la hipótesis sale por la UI. En cada pausa interna el segmento se
+    cierra y se transcribe en firme; al terminar solo queda el último trozo.
+    """
+    def __init__(self, manager, start):
+        self.m = manager
+        self.seg_start = start
+        self.last_partial = start
+        self.parts = []
+        self.hypothesis = ""
+        self.voiced_since_cut = True
+        self._generation = 0
+        self._busy = False
+        self._lock = threading.Lock()
+
+    def on_block(self, cursor, voiced, pause_seconds):
+        m = self.m
+        if voiced:
+            self.voiced_since_cut = True
+        length = cursor - self.seg_start
+        if self.voiced_since_cut and (
+                (pause_seconds >= m.segment_pause and length >= m.min_segment_frames)
+                or length >= m.max_segment_frames):
+            self._commit(cursor)
+        elif voiced and cursor - self.last_partial >= m.partial_interval_frames:
+            self._partial(cursor)
+
+    def _commit(self, cursor):
+        audio = self.m.ring.read(self.seg_start, cursor)
+        future = self.m._segment_exec.submit(self.m._recognize, audio)
+        future.add_done_callback(lambda _: self._publish())
+        with self._lock:
+            self.parts.append(future)
+            self.hypothesis = ""
+            self._generation += 1
+        self.seg_start = self.last_partial = cursor
+        self.voiced_since_cut = False
+
+    def _partial(self, cursor):
+        if self._busy:
+            return  # Una hipótesis en vuelo como mucho
+        self._busy = True
+        self.last_partial = cursor
+        audio = self.m.ring.read(max(self.seg_start, cursor - self.m.max_segment_frames), cursor)
+        self.m._partial_exec.submit(self._run_partial, audio, self._generation)
+
+    def _run_partial(self, audio, generation):
+        try:
+            text = self.m._recognize(audio, partial=True) or ""
+        finally:
+            self._busy = False
+        with self._lock:
+            if generation != self._generation:
+                return  # El segmento ya se cerró; esta hipótesis llega tarde
+            self.hypothesis = text
+        self._publish()
+
+    def text(self):
+        """Texto firme (segmentos terminados, en orden) + hipótesis actual."""
+        words = []
+        with self._lock:
+            for future in self.parts:
+                if not future.done():
+                    break
+                if future.result():
+                    words.append(future.result())
+            if self.hypothesis:
+                words.append(self.hypothesis)
+        return " ".join(w.strip() for w in words)
+
+    def _publish(self):
+        text = self.text()
+        if not text:
+            return
+        self.m.endpoint.set_partial_text(text)
+        if self.m.ui_manager:
+            self.m.ui_manager.update_data("USER", f"{text}…", "PARTIAL")
+
+    def finish(self, end):
+        """Cierra la frase: devuelve lo que el pool tiene que completar."""
+        with self._lock:
+            self._generation += 1
+            parts = list(self.parts)
+        if self.voiced_since_cut or not parts:
+            parts.append(self.m.ring.read(self.seg_start, end))
+        return StreamedUtterance(parts)
 
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
 
 class STTManager:
     def __init__(self, config, shutdown_event, ui_manager, amp_gain=1.0):
@@ -20,122 +397,336 @@ class STTManager:
         self.shutdown_event = shutdown_event
         self.ui_manager = ui_manager
         self.running = False
+        self.utterance_callback = None
+        self.barge_in_callback = None
+        self.backend = None
+        # El motor ASR (openai, modelo local...) se prepara en paralelo: el micro se abre antes
+        self._backend_ready = threading.Event()
+        self.mic_open = threading.Event()  # Para la cronología del arranque
+        self.backend_timeout = get_setting(config, 'STT', 'backend_timeout', 30.0)
         
         self.fs = 44100 
         self.channels = 2 
+        self.blocksize = 2048
         
         # --- AJUSTES DE TERApeuta ---
         # Umbral muy bajo para captar las bajadas de voz entre palabras
         self.threshold = 0.03 
-        # 2.5 segundos de pura paciencia
+        # 2.5 segundos de paciencia como MÁXIMO (dictado largo); las órdenes cortas cierran antes
         self.silence_limit = 2.5 
+        self.endpoint = create_endpoint_detector(config, self.silence_limit)
+        # Golpes y clics más cortos que esto no se mandan a Whisper
+        self.min_speech_seconds = get_setting(config, 'STT', 'min_speech_seconds', 0.2)
+
+        # Lo que recibe el motor ASR: mono 16 kHz (el remoto lo comprime, ver STT.upload_format)
+        self.upload_rate = get_setting(config, 'STT', 'upload_rate', 16000)
+
+        # Recorte de silencios antes de subir (bordes + pausas internas largas)
+        self.trim = None
+        if get_setting(config, 'STT', 'trim_enabled', True):
+            self.trim = {
+                "margin_ms": get_setting(config, 'STT', 'trim_margin_ms', 150),
+                "max_pause_ms": get_setting(config, 'STT', 'trim_max_pause_ms', 500),
+            }
+        self.trim_stats = {"turns": 0, "saved_seconds": 0.0, "last_saved_seconds": 0.0}
+
+        # Transcripción: N hilos fijos + cola con tope; las frases se entregan en orden
+        self.pool = OrderedWorkerPool(
+            work_fn=self._transcribe,
+            deliver_fn=self._deliver,
+            workers=get_setting(config, 'STT', 'asr_workers', 2),
+            max_queue=get_setting(config, 'STT', 'asr_queue_size', 3),
+            policy=get_setting(config, 'STT', 'asr_queue_policy', 'merge'),
+            merge_fn=HeardUtterance.merge,
+            name="asr",
+        )
         
         self.amp_gain = amp_gain
-        self.current_recording = []
+        # Detector de voz enchufable (STT.vad_engine: 'adaptive' o 'energy')
+        self.vad = create_vad(config, self.fs, amp_gain, threshold=self.threshold)
+
+        # Pre-roll: audio guardado ANTES de cruzar el umbral (no perder la primera sílaba)
+        self.preroll_ms = get_setting(config, 'STT', 'preroll_ms', 300)
+        self.max_utterance_seconds = get_setting(config, 'STT', 'max_utterance_seconds', 30.0)
+        self.preroll_frames = int(self.fs * self.preroll_ms / 1000)
+
+        # Buffer circular preasignado: el micro escribe siempre, el bucle solo mira
+        self.ring = AudioRingBuffer(
+            seconds=self.max_utterance_seconds + self.preroll_ms / 1000 + 1.0,
+            fs=self.fs, channels=self.channels, blocksize=self.blocksize
+        )
+        self.max_utterance_frames = self.ring.capacity - self.preroll_frames - self.blocksize
+
+        # Full-duplex: el micro no se cierra nunca. Mientras TARS habla restamos su eco
+        # y si detectamos voz sostenida lo interrumpimos (barge-in)
+        self.aec_enabled = get_setting(config, 'STT', 'aec_enabled', True)
+        self.aec_delay_ms = get_setting(config, 'STT', 'aec_delay_ms', -1.0)  # -1 = latencias del driver
+        self.barge_in = get_setting(config, 'STT', 'barge_in', True)
+        self.barge_in_frames = int(self.fs * get_setting(config, 'STT', 'barge_in_ms', 300) / 1000)
+        self.aec = EchoCanceller(self.blocksize)
+        # Posición de la referencia del altavoz en el momento de capturar cada bloque (-1 = callado)
+        self._ref_marks = np.full(self.ring.capacity // self.blocksize, -1, dtype=np.int64)
+        self._input_latency = 0.0
+        self._barge_run = 0
+        tars_state.subscribe(self._on_state_change)
+
+        # Modo streaming: hipótesis parciales mientras hablas (cada parcial es una llamada al ASR)
+        self.streaming = get_setting(config, 'STT', 'streaming', False)
+        self.partial_interval_frames = int(self.fs * get_setting(config, 'STT', 'partial_interval', 0.8))
+        self.segment_pause = get_setting(config, 'STT', 'segment_pause', 0.3)
+        self.min_segment_frames = int(self.fs * get_setting(config, 'STT', 'min_segment_seconds', 1.5))
+        self.max_segment_frames = int(self.fs * get_setting(config, 'STT', 'max_segment_seconds', 8.0))
+        self.session = None
+        if self.streaming:
+            self._partial_exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr-partial")
+            self._segment_exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr-segment")
 
     def start(self):
         self.running = True
         print("EAR: Sistema Síncrono (Modo Paciente Activado)")
+        self.pool.start()
         threading.Thread(target=self._listen_loop, daemon=True).start()
 
+    def _load_backend(self):
+        # Motor de reconocimiento según config (nube, local o nube con red de seguridad)
+        try:
+            self.backend = create_asr_backend(self.config)
+            if self.backend:
+                print(f"EAR: Motor ASR = {self.backend.name}")
+        finally:
+            self._backend_ready.set()
+
     def _listen_loop(self):
-        tts_conf = self.config['TTS']
-        api_key = getattr(tts_conf, 'openai_api_key', None) or os.environ.get("OPENAI_API_KEY")
-        client = OpenAI(api_key=api_key) if (OpenAI and api_key) else None
+        # Lo que digas mientras carga el motor se graba igual y espera en _recognize
+        threading.Thread(target=self._load_backend, name="asr-backend", daemon=True).start()
 
+        # El bucle exterior solo reabre el micro si el hardware falla
         while self.running and not self.shutdown_event.is_set():
-            if status.is_speaking:
-                time.sleep(0.1)
-                continue
-
             try:
                 with sd.InputStream(samplerate=self.fs, channels=self.channels, 
-                                  blocksize=2048, device=None) as stream:
+                                  blocksize=self.blocksize, device=None,
+                                  dtype='float32', callback=self._audio_callback) as stream:
                     
-                    print("EAR: 👂 Oído ABIERTO y escuchando...")
+                    self._input_latency = stream.latency
+                    self.mic_open.set()
+                    print("EAR: 👂 Oído ABIERTO y escuchando (full-duplex)...")
                     
                     is_recording = False
-                    silence_start = None
-                    self.current_recording = []
+                    utterance_start = 0
+                    cursor = self.ring.total
                     
                     while self.running:
-                        if status.is_speaking:
-                            print("EAR: 🔇 TARS va a hablar -> Apagando oído...")
-                            break 
-
-                        chunk, overflowed = stream.read(2048)
-                        volume = np.sqrt(np.mean(chunk**2)) * self.amp_gain
-                        
-                        if volume > self.threshold:
-                            if not is_recording:
-                                print(f"🎤 VOZ DETECTADA (Vol: {volume:.4f})")
+                        if not self.ring.data_ready.wait(0.5):
+                            continue
+                        self.ring.data_ready.clear()
+
+                        # Si nos hemos quedado atrás más que el buffer, saltamos al presente
+                        if cursor < self.ring.oldest:
+                            cursor = self.ring.total - self.ring.total % self.blocksize
+
+                        while cursor + self.blocksize <= self.ring.total:
+                            chunk = self.ring.view(cursor, self.blocksize)
+                            if self.aec_enabled:
+                                chunk = self._cancel_echo(chunk, cursor)
+                            cursor += self.blocksize
+                            
+                            is_speech = self.vad.process(chunk)
+                            t = cursor / self.fs
+
+                            if tars_state.is_speaking and not is_recording:
+                                # TARS hablando: solo buscamos una interrupción clara
+                                self._barge_run = self._barge_run + self.blocksize if self.vad.voiced else 0
+                                if not (self.barge_in and self._barge_run >= self.barge_in_frames):
+                                    continue
+                                print(f"✋ BARGE-IN: te escucho (Vol: {self.vad.level:.4f})")
+                                if self.barge_in_callback:
+                                    self.barge_in_callback()
+                                turns.preempt("barge-in")
+                                tars_state.set(LISTENING)
                                 is_recording = True
-                                self.current_recording = [chunk]
-                            else:
-                                self.current_recording.append(chunk)
-                                # Si estábamos contando silencio, lo cancelamos al volver a oírte
-                                if silence_start is not None:
-                                    print("🗣️ (Sigues hablando, reseteando reloj...)")
-                            silence_start = None
+                                utterance_start = max(self.ring.oldest,
+                                                      cursor - self._barge_run - self.preroll_frames)
+                                self._barge_run = 0
+                                self.endpoint.start(t)
+                                if self.streaming:
+                                    self.session = StreamingSession(self, utterance_start)
+                                continue
                             
-                        elif is_recording:
-                            self.current_recording.append(chunk)
-                            if silence_start is None:
-                                silence_start = time.time()
-                                print("⏳ (Pausa detectada, esperando 2.5s...)")
-                            elif time.time() - silence_start > self.silence_limit:
-                                print("🛑 PROCESANDO LA FRASE COMPLETA...")
-                                is_recording = False
-                                
-                                audio_to_send = self.current_recording.copy()
-                                self.current_recording = []
+                            if is_speech and not is_recording:
+                                print(f"🎤 VOZ DETECTADA (Vol: {self.vad.level:.4f})")
+                                is_recording = True
+                                tars_state.set(LISTENING, expected=(IDLE, THINKING))
+                                utterance_start = max(self.ring.oldest,
+                                                      cursor - self.blocksize - self.preroll_frames)
+                                self.endpoint.start(t)
+                                if self.streaming:
+                                    self.session = StreamingSession(self, utterance_start)
                                 
-                                threading.Thread(target=self._transcribe, 
-                                               args=(audio_to_send, client)).start()
+                            elif is_recording:
+                                # El reloj de pausa va con la voz cruda (sin el hangover del VAD)
+                                if self.endpoint.update(self.vad.voiced, self.vad.level, t):
+                                    is_recording = False
+                                    if self.endpoint.speech_seconds < self.min_speech_seconds:
+                                        print("🔕 (Ruido corto, descartado)")
+                                        self.session = None
+                                        tars_state.set(IDLE, expected=LISTENING)
+                                        continue
+                                    print(f"🛑 PROCESANDO LA FRASE COMPLETA... "
+                                          f"(pausa {self.endpoint.latencies[-1]:.2f}s)")
+                                    self._dispatch(utterance_start, cursor, self.endpoint.latencies[-1])
+                                    continue
+                                if self.session:
+                                    self.session.on_block(cursor, self.vad.voiced,
+                                                          self.endpoint.pause_seconds(t))
+
+                            # Frase más larga que el buffer: la cortamos aquí
+                            if is_recording and cursor - utterance_start >= self.max_utterance_frames:
+                                print("✂️ Frase demasiado larga, enviando lo que hay...")
+                                is_recording = False
+                                self.endpoint.reset()
+                                self._dispatch(utterance_start, cursor)
                                 
             except Exception as e:
                 print(f"EAR ERROR DE HARDWARE: {e}")
                 time.sleep(1) 
 
-            if status.is_speaking:
-                while status.is_speaking:
-                    time.sleep(0.1)
-                time.sleep(0.5) 
+    def _audio_callback(self, indata, frames, time_info, status_flags):
+        # Hilo de PortAudio: solo copiamos al buffer circular, nada de reservar memoria
+        block = (self.ring.total // self.blocksize) % len(self._ref_marks)
+        self._ref_marks[block] = playback_reference.total if playback_reference.active else -1
+        self.ring.write(indata)
+
+    def _cancel_echo(self, chunk, start):
+        """Resta el eco de lo que suena por el altavoz. Escribe el resultado en el propio buffer."""
+        mark = self._ref_marks[(start // self.blocksize) % len(self._ref_marks)]
+        if mark < 0:
+            return chunk
+
+        if self.aec_delay_ms >= 0:
+            delay = self.aec_delay_ms / 1000.0
+        else:
+            delay = playback_reference.output_latency + self._input_latency
+        # Dejamos un cuarto de bloque de margen: el filtro de N taps absorbe el resto
+        ref_end = mark - max(0, int(delay * self.fs) - self.blocksize // 4)
+        ref = playback_reference.read(ref_end - self.blocksize, ref_end)
+        if len(ref) < self.blocksize:
+            ref = np.concatenate((np.zeros(self.blocksize - len(ref), dtype=np.float32), ref))
 
-    def _transcribe(self, audio_data, client):
-        if not audio_data: return
+        cleaned = self.aec.process(downmix(chunk), ref)
+        chunk[:] = cleaned[:, None]
+        return chunk
+
+    def _on_state_change(self, old, new, t):
+        if new == SPEAKING:
+            self._barge_run = 0  # Cada respuesta empieza sin interrupción acumulada
+
+    def _dispatch(self, start, end, pause=0.0):
+        # La respuesta anterior no se cancela aquí sino en _deliver, cuando sabemos
+        # que la frase tiene palabras (una tos no debe tirar la respuesta en curso)
+        begin_turn()  # Desde aquí corre el presupuesto de latencia del turno
+        now = time.monotonic()
+        trace = tracer.begin()  # Va con el audio hasta el ASR y con el texto hasta el turno
+        tracer.mark("speech_end", now - pause, trace=trace)  # Dejaste de hablar 'pause' segundos antes
+        tracer.mark("eou", now, trace=trace)
+        tars_state.set(THINKING, expected=LISTENING)
+        if self.session:
+            # En streaming casi todo está ya transcrito: solo falta el último trozo
+            audio_to_send = self.session.finish(end)
+            self.session = None
+        else:
+            # Una sola copia de la frase (con pre-roll) fuera del buffer circular
+            audio_to_send = self.ring.read(start, end)
+        if not self.pool.submit(HeardUtterance(audio_to_send, trace)):
+            tracer.finish(trace, "dropped")
+            print("🚦 Cola de transcripción llena: frase descartada")
+        elif self.pool.depth() > 1:
+            print(f"🚦 Cola de transcripción: {self.pool.depth()} frases esperando")
+
+    def _transcribe(self, heard):
+        """Trabajo del pool: HeardUtterance -> (texto, traza), o None si no hay nada útil."""
+        tracer.mark("asr_request", first=True, trace=heard.trace)
+        item = heard.audio
+        if isinstance(item, StreamedUtterance):
+            texts = []
+            for part in item.parts:
+                text = part.result() if isinstance(part, Future) else self._recognize(part)
+                if text:
+                    texts.append(text.strip())
+            text = " ".join(texts) or None
+        else:
+            text = self._recognize(item)
+        tracer.mark("asr_response", trace=heard.trace)
+        if not text:
+            tracer.finish(heard.trace, "empty")
+            if turns.active is None:
+                tars_state.set(IDLE, expected=THINKING)  # Nada útil y nadie contestando: volvemos a esperar
+            return None
+        return text, heard.trace
+
+    def _recognize(self, recording, partial=False):
+        if recording is None or len(recording) == 0: return None
+        if not self._backend_ready.wait(self.backend_timeout):
+            print("EAR ERROR: El motor ASR no ha terminado de cargar")
+        backend = self.backend
         
         try:
-            recording = np.concatenate(audio_data, axis=0)
-            buffer = io.BytesIO()
-            buffer.name = 'audio.wav'
-            sf.write(buffer, recording, self.fs)
-            buffer.seek(0)
-            
-            if not client: return
+            if not backend: return None
 
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1", 
-                file=buffer, 
-                language="es",
-                timeout=10.0
-            )
-            
-            text = transcript.text
-            
-            if not text or len(text.strip()) < 2: return
-            if "Subtítulos" in text or "Amara" in text: return
+            audio, prep = condition(recording, self.fs, self.upload_rate, trim=self.trim)
+            if not partial:
+                self.trim_stats["turns"] += 1
+                self.trim_stats["saved_seconds"] += prep["trimmed_seconds"]
+                self.trim_stats["last_saved_seconds"] = prep["trimmed_seconds"]
+                print(f"✂️ Audio {prep['seconds']:.1f}s (-{prep['trimmed_seconds']:.1f}s silencio, "
+                      f"{prep['resample_ms']:.0f} ms)")
 
-            print(f"🗣️ TARS: '{text}'")
-            if self.utterance_callback:
-                self.utterance_callback(text)
+            if partial:
+                text = backend.transcribe_partial(audio, self.upload_rate)
+            else:
+                text = backend.transcribe(audio, self.upload_rate)
+            
+            if not text or len(text.strip()) < 2: return None
+            if "Subtítulos" in text or "Amara" in text: return None
+            return text
                 
         except Exception as e:
             print(f"❌ Error Whisper: {e}")
+            return None
 
-    def stop(self): self.running = False
+    def _deliver(self, result):
+        # Hilo de entrega del pool: siempre en el orden de captura
+        text, trace = result
+        print(f"🗣️ TARS: '{text}'")
+        # Frase con palabras: la respuesta anterior (si sigue pensando o hablando) se cancela
+        turns.preempt()
+        if self.utterance_callback:
+            # El turno sigue en el orquestador: él nos devuelve a IDLE al terminar
+            # callback(texto, traza): la traza es la de esta frase (module_tracing)
+            self.utterance_callback(text, trace)
+        else:
+            tracer.finish(trace, "dropped")
+            tars_state.set(IDLE, expected=THINKING)
+
+    def get_metrics(self):
+        """Métricas del oído (fin de frase, silencio recortado, cola de transcripción, conexiones)."""
+        return {
+            "endpoint": self.endpoint.metrics(),
+            "trim": dict(self.trim_stats),
+            "asr_queue": self.pool.metrics(),
+            "asr": self.backend.metrics() if self.backend else {},
+            "aec": {"erle_db": round(self.aec.erle_smooth, 1), "double_talk": self.aec.double_talk},
+            "connections": client_hub.metrics(),
+        }
+
+    def stop(self):
+        self.running = False
+        self.pool.stop()
+        if self.streaming:
+            self._partial_exec.shutdown(wait=False)
+            self._segment_exec.shutdown(wait=False)
     def set_wake_word_callback(self, cb): pass
     def set_utterance_callback(self, cb): self.utterance_callback = cb
+    def set_barge_in_callback(self, cb): self.barge_in_callback = cb
     def set_post_utterance_callback(self, cb): pass
     def play_wav(self, f): pass
     def pause(self): pass
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+module_tracing.py - Trazas por turno: ¿por qué tardó 6 segundos esa respuesta?
+Cada turno apunta marcas con time.monotonic() a medida que pasa por las
+etapas, y al terminar se convierten en duraciones que van a histogramas
+(p50 / p95 / p99), a un fichero JSONL (una línea por turno) y, si se
+activa, a un pequeño servidor HTTP local.
+
+Marcas (en orden):
+  speech_end      dejaste de hablar (decisión de fin de frase - pausa)
+  eou             el detector decidió que la frase había terminado
+  asr_request     sale el audio hacia el ASR
+  asr_response    vuelve el texto
+  llm_request     sale la petición al LLM
+  llm_first_token / llm_last_token
+  tts_request     primera frase hacia el TTS
+  tts_first_byte  primer audio del TTS (o de la caché)
+  playback_start / playback_end
+
+Duraciones (ms) que se agregan: ver DURATIONS.
+
+La traza nace en el oído al cerrar la frase (begin), viaja con su audio
+por la cola del ASR y con su texto por el orquestador, y el turno que
+contesta esa frase la reclama (claim) y la guarda en su CancelToken. Nada
+se apunta en "la traza en curso": cada marca va a la traza de su frase o
+de su token, así lo que llegue tarde de una frase o de un turno cancelado
+no ensucia el siguiente.
+
+Ajustes (sección TRACING): enabled true, jsonl logs/traces.jsonl,
+jsonl_max_bytes 5 MB (al pasarse, el fichero se rota a .1 y se empieza
+otro: como mucho dos ficheros), http_port 0 (0 = sin servidor), history 500
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from modules.module_config import load_config
+from modules.module_settings import get_setting
+
+# nombre -> (marca inicial, marca final)
+DURATIONS = {
+    "endpoint": ("speech_end", "eou"),
+    "asr": ("asr_request", "asr_response"),
+    "llm_first_token": ("llm_request", "llm_first_token"),
+    "llm_total": ("llm_request", "llm_last_token"),
+    "tts_first_byte": ("tts_request", "tts_first_byte"),
+    "playback": ("playback_start", "playback_end"),
+    "response": ("speech_end", "playback_start"),  # Lo que tú notas: silencio hasta la primera palabra
+    "turn": ("speech_end", "playback_end"),
+}
+PERCENTILES = (50, 95, 99)
+
+
+class Trace:
+    def __init__(self, turn_id, t0=None):
+        self.turn_id = turn_id
+        self.t0 = time.monotonic() if t0 is None else t0
+        self.wall = time.time()
+        self.events = {}
+        self.status = None
+        self.owned = False
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status is not None
+
+    def mark(self, event, t=None, first=False):
+        """Apunta 'event' (monotonic). Con first=True solo cuenta la primera vez."""
+        with self._lock:
+            if self.status is not None or (first and event in self.events):
+                return
+            self.events[event] = time.monotonic() if t is None else t
+
+    def durations(self):
+        out = {}
+        for name, (start, end) in DURATIONS.items():
+            if start in self.events and end in self.events:
+                out[name] = round(1000 * (self.events[end] - self.events[start]), 1)
+        return out
+
+    def to_dict(self):
+        return {
+            "turn": self.turn_id,
+            "wall": round(self.wall, 3),
+            "status": self.status,
+            "events_ms": {k: round(1000 * (v - self.t0), 1)
+                          for k, v in sorted(self.events.items(), key=lambda kv: kv[1])},
+            "durations_ms": self.durations(),
+        }
+
+
+class Tracer:
+    def __init__(self, enabled=True, jsonl_path=None, history=500, jsonl_max_bytes=5 << 20):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.jsonl_max_bytes = jsonl_max_bytes
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._samples = {name: deque(maxlen=history) for name in DURATIONS}
+        self._recent = deque(maxlen=50)
+        self._server = None
+        self.stats = {"traces": 0, "ok": 0, "cancelled": 0, "dropped": 0, "write_errors": 0, "rotations": 0}
+
+    # --- Ciclo de una traza ---
+    def begin(self, t0=None):
+        """Traza nueva para una frase (la abre el oído al cerrarla). None si está desactivado."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._next_id += 1
+            return Trace(self._next_id, t0)
+
+    def claim(self, trace):
+        """El turno que contesta la frase de 'trace' se queda con ella."""
+        if trace is not None:
+            trace.owned = True
+        return trace
+
+    def mark(self, event, t=None, first=False, token=None, trace=None):
+        """Marca en 'trace' o en la traza del turno de 'token'. Sin ninguna de las dos, nada."""
+        trace = trace or getattr(token, "trace", None)
+        if trace is not None:
+            trace.mark(event, t, first)
+
+    def finish(self, trace, status="ok"):
+        if trace is None or trace.finished:
+            return
+        with trace._lock:
+            trace.status = status
+        record = trace.to_dict()
+        with self._lock:
+            self.stats["traces"] += 1
+            self.stats[status] = self.stats.get(status, 0) + 1
+            for name, value in record["durations_ms"].items():
+                self._samples[name].append(value)
+            self._recent.append(record)
+        self._write(record)
+        durations = record["durations_ms"]
+        if "response" in durations:
+            parts = ", ".join(f"{k} {v:.0f}" for k, v in durations.items() if k not in ("response", "turn"))
+            print(f"📈 Turno {trace.turn_id}: respuesta en {durations['response']:.0f} ms ({parts})")
+
+    def _write(self, record):
+        if not self.jsonl_path:
+            return
+        try:
+            directory = os.path.dirname(self.jsonl_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            line = json.dumps(record, ensure_ascii=False)
+            with self._lock:
+                self._rotate()
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            self.stats["write_errors"] += 1
+            print(f"TRACING: no se pudo escribir {self.jsonl_path}: {e}")
+
+    def _rotate(self):
+        """Con el lock tomado: si el JSONL pasa de jsonl_max_bytes, pasa a ser el .1 (el .1 viejo se pierde)."""
+        if not self.jsonl_max_bytes:
+            return
+        try:
+            if os.path.getsize(self.jsonl_path) < self.jsonl_max_bytes:
+                return
+        except OSError:
+            return  # Todavía no existe
+        os.replace(self.jsonl_path, self.jsonl_path + ".1")
+        self.stats["rotations"] += 1
+
+    # --- Agregados ---
+    def reset(self):
+        """Vacía histogramas y contadores (p.ej. entre fases de bench_e2e.py)."""
+        with self._lock:
+            for values in self._samples.values():
+                values.clear()
+            self._recent.clear()
+            self.stats = {key: 0 for key in self.stats}
+
+    def histograms(self):
+        out = {}
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+        for name, values in samples.items():
+            if not values:
+                continue
+            row = {"count": len(values), "mean": round(float(np.mean(values)), 1)}
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                row[f"p{p}"] = round(float(value), 1)
+            out[name] = row
+        return out
+
+    def recent(self, n=20):
+        with self._lock:
+            return list(self._recent)[-n:]
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+        return {"stats": stats, "histograms_ms": self.histograms()}
+
+    # --- Servidor HTTP local (opcional) ---
+    def serve(self, port, host="127.0.0.1"):
+        """GET /metrics (histogramas) y /traces?n=20 (últimos turnos), en JSON."""
+        if self._server is not None or not port:
+            return None
+        tracer = self
+
+        class Handler(_MetricsHandler):
+            source = tracer
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="tracing-http", daemon=True).start()
+        print(f"📈 Métricas en http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    source = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            payload = self.source.metrics()
+        elif url.path == "/traces":
+            n = int(parse_qs(url.query).get("n", ["20"])[0])
+            payload = self.source.recent(n)
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+CONFIG = load_config()
+TRACING_HTTP_PORT = get_setting(CONFIG, 'TRACING', 'http_port', 0)
+
+# Compartido por oído, main, LLM y TTS
+tracer = Tracer(
+    enabled=get_setting(CONFIG, 'TRACING', 'enabled', True),
+    jsonl_path=get_setting(CONFIG, 'TRACING', 'jsonl', os.path.join("logs", "traces.jsonl")),
+    history=get_setting(CONFIG, 'TRACING', 'history', 500),
+    jsonl_max_bytes=get_setting(CONFIG, 'TRACING', 'jsonl_max_bytes', 5 << 20),
+)
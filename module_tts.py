@@ -1,65 +1,469 @@
 #!/usr/bin/env python3
+import asyncio
 import os
-import subprocess
-from openai import OpenAI
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import sounddevice as sd
 from modules.module_config import load_config
-import modules.tars_status as status 
+from modules.module_settings import get_setting
+from modules.module_resample import StreamResampler, map_channels
+from modules.module_aec import playback_reference
+from modules.module_state import tars_state, SPEAKING, IDLE
+from modules.module_ttscache import TTSCache
+from modules.module_clients import client_hub
+from modules.module_resilience import stages
+from modules.module_turns import TurnCancelled
+from modules.module_tracing import tracer
+from modules.module_intents import FIXED_REPLIES
+from modules.module_llm import OFFLINE_REPLY
 
 CONFIG = load_config()
+PLAYBACK_BLOCK = 2048
+TTS_PCM_RATE = 24000  # response_format="pcm": 24 kHz, 16 bits, mono
+OUTPUT_RATE = get_setting(CONFIG, 'TTS', 'output_rate', 44100)       # El WM8960 quiere 44.1 kHz
+OUTPUT_CHANNELS = get_setting(CONFIG, 'TTS', 'output_channels', 2)   # ...y estéreo
+STREAM_CHUNK = 4800  # 100 ms de PCM a 24 kHz
+PIPELINE_DEPTH = get_setting(CONFIG, 'TTS', 'pipeline_depth', 2)        # Frases sintetizándose por delante
+SEGMENT_MIN_CHARS = get_setting(CONFIG, 'TTS', 'segment_min_chars', 15)  # "Sí." va con la siguiente
+SEGMENT_MAX_CHARS = get_setting(CONFIG, 'TTS', 'segment_max_chars', 180) # Frases largas se parten por comas
+TTS_MODEL = "tts-1"
+TTS_VOICE = "onyx"
+TTS_FORMAT = "pcm"
+
+# Frases que se sintetizan al arrancar para que suenen sin esperar a la red:
+# el "Yes?" de la palabra clave, las respuestas fijas de las órdenes locales y
+# el aviso de LLM caído (si no, con la red caída ese aviso tampoco sonaría).
+# TTS.prewarm añade más, separadas por '|' (pueden llevar comas).
+PREWARM_PHRASES = ["Yes?", OFFLINE_REPLY] + FIXED_REPLIES
+
+tts_cache = TTSCache(
+    directory=get_setting(CONFIG, 'TTS', 'cache_dir', os.path.join("cache", "tts")),
+    max_disk_bytes=get_setting(CONFIG, 'TTS', 'cache_disk_mb', 64) << 20,
+    max_memory_bytes=get_setting(CONFIG, 'TTS', 'cache_memory_mb', 8) << 20,
+)
+
+# Barge-in: el oído pide silencio y la reproducción se corta en el siguiente bloque.
+# Cada respuesta (_SpeechQueue) tiene su propio evento de parada: una nueva no
+# "descancela" la anterior, cuyos hilos de síntesis siguen viendo que deben parar.
+_active_lock = threading.Lock()
+_active_speech = set()
+
+def stop_playback():
+    """Corta lo que TARS esté diciendo (lo llama el oído al detectar una interrupción)."""
+    with _active_lock:
+        speeches = list(_active_speech)
+    for speech in speeches:
+        speech.stop()
+
+class _SpeechPlayer:
+    """
+    Escribe PCM en el altavoz según llega: remuestrea 24 kHz mono -> salida
+    del HAT en proceso y deja copia de cada trozo para el cancelador de eco.
+    """
+    def __init__(self, started, stopped, source_rate=TTS_PCM_RATE, token=None):
+        self.started = started
+        self.stopped = stopped  # Evento de parada de la respuesta que suena
+        self.token = token
+        self.resampler = StreamResampler(source_rate, OUTPUT_RATE)
+        self.stream = None
+        self.first_audio = None
+        self._pending = b""
+
+    def __enter__(self):
+        self.stream = sd.OutputStream(samplerate=OUTPUT_RATE, channels=OUTPUT_CHANNELS,
+                                      blocksize=PLAYBACK_BLOCK, dtype='float32')
+        self.stream.start()
+        playback_reference.output_latency = self.stream.latency
+        playback_reference.active = True
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if self.stopped.is_set():
+                self.stream.abort()  # Descarta lo que quede en el buffer: silencio ya
+                if self.token is not None and self.first_audio is not None:
+                    self.token.silenced()
+            else:
+                self.stream.stop()  # Espera a que suene lo que queda en el buffer
+            self.stream.close()
+            if self.token is not None and self.first_audio is not None:
+                tracer.mark("playback_end", token=self.token)
+        finally:
+            playback_reference.active = False
+
+    def feed(self, data):
+        """Bytes PCM s16le (pueden venir cortados a mitad de muestra)."""
+        data = self._pending + data
+        usable = len(data) - len(data) % 2
+        self._pending = data[usable:]
+        if usable:
+            pcm = np.frombuffer(data[:usable], dtype='<i2').astype(np.float32) / 32768.0
+            self._write(self.resampler.process(pcm))
+
+    def finish(self):
+        self._write(self.resampler.flush())
+
+    def _write(self, mono):
+        if len(mono) == 0:
+            return
+        if self.first_audio is None:
+            self.first_audio = time.monotonic()
+            tars_state.set(SPEAKING)
+            if self.token is not None:
+                tracer.mark("playback_start", t=self.first_audio, first=True, token=self.token)
+            print(f"🔊 TARS HABLANDO... (primer audio en {1000 * (self.first_audio - self.started):.0f} ms)")
+        playback_reference.push(mono)
+        out = map_channels(mono, OUTPUT_CHANNELS)
+        # Bloque a bloque: una interrupción no espera a que acabe el trozo entero
+        for i in range(0, len(out), PLAYBACK_BLOCK):
+            if self.stopped.is_set():
+                return
+            self.stream.write(out[i:i + PLAYBACK_BLOCK])
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…;:])\s+')
+_CLAUSE_END = re.compile(r'(?<=[,—])\s+')
+
+def split_sentences(text, min_chars=SEGMENT_MIN_CHARS, max_chars=SEGMENT_MAX_CHARS):
+    """
+    Trocea la respuesta en frases para sintetizarlas por separado.
+    Los trozos muy cortos se juntan con el siguiente (cada petición cuesta
+    una ida y vuelta) y los muy largos se parten por comas.
+    """
+    pieces = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        current = ""
+        for clause in _CLAUSE_END.split(sentence):
+            if current and len(current) + len(clause) + 1 > max_chars:
+                pieces.append(current)
+                current = clause
+            else:
+                current = f"{current} {clause}" if current else clause
+        if current:
+            pieces.append(current)
+
+    segments, current = [], ""
+    for piece in filter(None, (p.strip() for p in pieces)):
+        current = f"{current} {piece}" if current else piece
+        if len(current) >= min_chars:
+            segments.append(current)
+            current = ""
+    if current:
+        if segments and len(segments[-1]) + len(current) < max_chars:
+            segments[-1] = f"{segments[-1]} {current}"
+        else:
+            segments.append(current)
+    return segments
+
+class PhraseChunker:
+    """
+    Junta texto que llega a trozos (tokens del LLM) y suelta cada frase en
+    cuanto se cierra, con los mismos topes que split_sentences.
+    """
+    def __init__(self, min_chars=SEGMENT_MIN_CHARS, max_chars=SEGMENT_MAX_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        phrases = []
+        cut = self._find_cut()
+        while cut is not None:
+            phrase, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:].lstrip()
+            if phrase:
+                phrases.append(phrase)
+            cut = self._find_cut()
+        return phrases
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+    def _find_cut(self):
+        # Fin de frase confirmado (puntuación + espacio) pasado el mínimo
+        for m in _SENTENCE_END.finditer(self.buffer):
+            if m.start() >= self.min_chars:
+                return m.start()
+        if len(self.buffer) <= self.max_chars:
+            return None
+        # Frase demasiado larga: última coma antes del tope, o último espacio
+        clauses = [m.start() for m in _CLAUSE_END.finditer(self.buffer, 0, self.max_chars)]
+        if clauses:
+            return clauses[-1]
+        space = self.buffer.rfind(" ", 0, self.max_chars)
+        return space if space > 0 else None
+
+class _Segment:
+    """Una frase en síntesis: sus bytes PCM van llegando a una cola."""
+    _DONE = None
+
+    def __init__(self, index, text, stopped, token=None):
+        self.index = index
+        self.text = text
+        self.stopped = stopped  # El de su _SpeechQueue
+        self.token = token
+        self.chunks = queue.Queue()
+        self.error = None
+        self.cached = tts_cache.get(text, TTS_VOICE, TTS_MODEL, TTS_FORMAT)
+
+    def _traced(self, event):
+        # Solo las frases de un turno (los avisos sin token no son parte de ninguna traza)
+        if self.token is not None:
+            tracer.mark(event, first=True, token=self.token)
+
+    def synthesize(self, client):
+        try:
+            self._traced("tts_request")
+            if self.cached is not None:
+                self._traced("tts_first_byte")
+                for i in range(0, len(self.cached), STREAM_CHUNK):
+                    self.chunks.put(self.cached[i:i + STREAM_CHUNK])
+                return
+            if self.stopped.is_set():
+                return
+            if client is None:
+                raise RuntimeError("sin cliente de OpenAI")
+
+            def open_speech(timeout):
+                with client.audio.speech.with_streaming_response.create(
+                    model=TTS_MODEL,
+                    voice=TTS_VOICE,
+                    input=self.text,
+                    response_format=TTS_FORMAT,
+                    timeout=timeout
+                ) as response:
+                    yield from response.iter_bytes(chunk_size=STREAM_CHUNK)
+
+            # Plazo hasta el primer audio, petición duplicada si se atasca y cortacircuitos
+            # (sin plan B: lo que ya estaba en caché no llega aquí)
+            received = []
+            chunks = stages["tts"].stream(open_speech, token=self.token)
+            try:
+                for data in chunks:
+                    if self.stopped.is_set():
+                        return  # Suelta el hilo de síntesis: la respuesta ya no suena
+                    if not received:
+                        self._traced("tts_first_byte")
+                    self.chunks.put(data)
+                    received.append(data)
+            finally:
+                chunks.close()  # Cierra la conexión
+            tts_cache.put(self.text, TTS_VOICE, TTS_MODEL, TTS_FORMAT, b"".join(received))
+        except TurnCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            self.chunks.put(self._DONE)
+
+    def stream(self):
+        """Bytes según llegan; termina al acabar la frase o si se corta la reproducción."""
+        while True:
+            try:
+                data = self.chunks.get(timeout=0.05)
+            except queue.Empty:
+                if self.stopped.is_set():
+                    return
+                continue
+            if data is self._DONE:
+                return
+            yield data
+
+# Hilos de síntesis compartidos entre respuestas (uno de más para la frase que suena)
+_synth_pool = ThreadPoolExecutor(max_workers=PIPELINE_DEPTH + 1, thread_name_prefix="tts-synth")
+
+class _SpeechQueue:
+    """
+    Frases en orden de reproducción. Pueden llegar todas de golpe o según
+    las genera el LLM; en cuanto hay hueco, las PIPELINE_DEPTH siguientes
+    a la que suena se mandan a sintetizar.
+    """
+    def __init__(self, token=None):
+        self.stopped = threading.Event()
+        self._cond = threading.Condition()
+        self.token = token
+        self.segments = []
+        self.futures = []
+        self.closed = False
+        self.playing = 0
+        with _active_lock:
+            _active_speech.add(self)
+        if token is not None:
+            # Turno cancelado: callarse y no sintetizar nada más
+            token.on_cancel(self.stop)
+
+    def add(self, text):
+        with self._cond:
+            self.segments.append(_Segment(len(self.segments), text, self.stopped, self.token))
+            self._pump()
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def stop(self):
+        """Se calla y no sintetiza nada más (barge-in, turno cancelado o fin de la respuesta)."""
+        self.stopped.set()
+        with self._cond:
+            for future in self.futures:
+                future.cancel()
+            self._cond.notify_all()
+        with _active_lock:
+            _active_speech.discard(self)
+
+    def _pump(self):
+        limit = min(len(self.segments), self.playing + 1 + PIPELINE_DEPTH)
+        while len(self.futures) < limit:
+            segment = self.segments[len(self.futures)]
+            client = None if segment.cached is not None else get_openai_client()
+            self.futures.append(_synth_pool.submit(segment.synthesize, client))
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.segments) and not self.closed and not self.stopped.is_set():
+                    self._cond.wait(0.05)
+                if index >= len(self.segments):
+                    return
+                self.playing = index
+                self._pump()
+                segment = self.segments[index]
+            yield segment
+            index += 1
 
 def get_openai_client():
-    tts_conf = CONFIG['TTS']
-    api_key = getattr(tts_conf, 'openai_api_key', None) or os.environ.get("OPENAI_API_KEY")
-    if api_key:
-        return OpenAI(api_key=api_key)
-    return None
+    return client_hub.openai()
 
-async def play_audio_chunks(text, tts_option=None, is_wakeword=False):
-    if not text: return
-    client = get_openai_client()
-    if not client: return
+def prewarm_cache(phrases=None):
+    """Sintetiza (si no están ya) las frases fijas. Pensado para un hilo al arrancar."""
+    if phrases is None:
+        extra = get_setting(CONFIG, 'TTS', 'prewarm', "")
+        phrases = PREWARM_PHRASES + [p.strip() for p in extra.split("|") if p.strip()]
+    client = None
+    warmed = 0
+    for phrase in phrases:
+        # Mismo troceo que al hablar, para que las claves coincidan
+        for text in split_sentences(phrase):
+            if (text, TTS_VOICE, TTS_MODEL, TTS_FORMAT) in tts_cache:
+                continue
+            client = client or get_openai_client()
+            if client is None:
+                return warmed
+            try:
+                with client.audio.speech.with_streaming_response.create(
+                    model=TTS_MODEL, voice=TTS_VOICE, input=text, response_format=TTS_FORMAT
+                ) as response:
+                    data = b"".join(response.iter_bytes(chunk_size=STREAM_CHUNK))
+                tts_cache.put(text, TTS_VOICE, TTS_MODEL, TTS_FORMAT, data)
+                warmed += 1
+            except Exception as e:
+                print(f"TTS CACHE: no se pudo precalentar '{text}': {e}")
+    print(f"🔊 Caché TTS lista ({warmed} frases nuevas, {tts_cache.metrics()['disk_entries']} en disco)")
+    return warmed
 
+def get_tts_metrics():
+    return {"cache": tts_cache.metrics()}
+
+def _speak(speech, producer=None):
+    """Reproduce las frases de 'speech' por orden; 'producer' (si hay) las va añadiendo desde otro hilo."""
     try:
-        # 1. SEMÁFORO ROJO (Apagamos el oído)
-        status.is_speaking = True 
+        # 1. El oído sigue abierto; el estado pasa a SPEAKING con el primer trozo de audio
+        t0 = time.monotonic()
+        if producer is not None:
+            threading.Thread(target=producer, name="tts-producer", daemon=True).start()
         
         print(f"🔊 Generando voz...")
-        
-        # 2. Pedimos el WAV a OpenAI
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice="onyx",
-            input=text,
-            response_format="wav" 
-        )
-        
-        raw_file = "speech_raw.wav"
-        ready_file = "speech_ready.wav"
-        
-        with open(raw_file, "wb") as f:
-            f.write(response.content)
-
-        # 3. CONVERSIÓN CRÍTICA: Forzamos 44100Hz y 2 Canales
-        subprocess.run(
-            f"ffmpeg -y -i {raw_file} -ar 44100 -ac 2 {ready_file} -loglevel quiet", 
-            shell=True
-        )
 
-        print(f"🔊 TARS HABLANDO...")
-        
-        # 4. Reproducimos
-        subprocess.run(
-            f"aplay -D default {ready_file} -q", 
-            shell=True
-        )
+        # 2. Mientras suena una frase, las PIPELINE_DEPTH siguientes ya se están sintetizando.
+        #    Todas van al mismo OutputStream y al mismo remuestreador: sin huecos entre frases.
+        starved = 0.0
+        with _SpeechPlayer(started=t0, stopped=speech.stopped, token=speech.token) as player:
+            for segment in speech:
+                waiting = time.monotonic()
+                for data in segment.stream():
+                    if waiting is not None:
+                        if player.first_audio is not None:
+                            starved += time.monotonic() - waiting  # Esperando el primer audio de la frase
+                        waiting = None
+                    player.feed(data)
+                    if speech.stopped.is_set():
+                        break
+                if speech.stopped.is_set():
+                    print("✋ TARS interrumpido")
+                    return
+                if segment.error is not None:
+                    print(f"TTS ERROR (frase {segment.index + 1}): {segment.error}")
+            if speech.stopped.is_set():
+                print("✋ TARS interrumpido")  # Cancelado antes de la primera frase
+                return
+            player.finish()
+        hits = sum(s.cached is not None for s in speech.segments)
+        print(f"🔊 {len(speech.segments)} frases ({hits} en caché), espera entre frases: {1000 * starved:.0f} ms")
 
     except Exception as e:
         print(f"TTS ERROR: {e}")
         
     finally:
-        # 5. SEMÁFORO VERDE (Oído, despierta)
+        # 4. Nada de lo pendiente debe sonar ya (ni seguir ocupando hilos de síntesis)
+        speech.stop()
+        # 5. SEMÁFORO VERDE
         print("✅ Fin de frase.")
-        status.is_speaking = False
+        # Si hubo barge-in el oído ya nos ha pasado a LISTENING: no lo pisamos
+        tars_state.set(IDLE, expected=SPEAKING)
+
+def speak_text(text, token=None):
+    """Dice 'text' (bloquea hasta terminar o hasta que se cancele 'token')."""
+    if not text: return
+    speech = _SpeechQueue(token)
+    for sentence in split_sentences(text):
+        speech.add(sentence)
+    speech.close()
+    _speak(speech)
+
+def speak_stream(chunks, token=None):
+    """
+    Habla un texto que llega a trozos (p.ej. tokens del LLM): cada frase
+    se sintetiza en cuanto se cierra, sin esperar al resto de la respuesta.
+    Si 'token' se cancela, se calla y deja de pedir texto. Bloquea hasta terminar.
+    """
+    speech = _SpeechQueue(token)
+
+    def produce():
+        chunker = PhraseChunker()
+        try:
+            for chunk in chunks:
+                if speech.stopped.is_set():
+                    break
+                for phrase in chunker.feed(chunk):
+                    speech.add(phrase)
+            else:
+                for phrase in chunker.flush():
+                    speech.add(phrase)
+        except Exception as e:
+            print(f"TTS ERROR (texto de entrada): {e}")
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()  # Corta la generación si nos han interrumpido
+            speech.close()
+
+    _speak(speech, producer=produce)
+
+# Versiones para asyncio: lo bloqueante (red, altavoz) va a un hilo, no al event loop
+async def play_audio_chunks(text, tts_option=None, is_wakeword=False, token=None):
+    await asyncio.to_thread(speak_text, text, token)
+
+async def play_text_stream(chunks, token=None):
+    await asyncio.to_thread(speak_stream, chunks, token)
 
 def update_tts_settings(*args, **kwargs): 
     pass
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+module_ttscache.py - Caché de audio TTS (memoria + disco, LRU)
+"Yes?" y las frases de siempre no tienen por qué pasar por la API cada
+vez. Cada audio se guarda por el hash de (texto, voz, modelo, formato):
+primero en un LRU en RAM y después en disco, ambos con tope de bytes.
+Un acierto suena sin tocar la red.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class TTSCache:
+    def __init__(self, directory="cache/tts", max_disk_bytes=64 << 20, max_memory_bytes=8 << 20):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # clave -> bytes, el más reciente al final
+        self._memory_bytes = 0
+        self._disk = OrderedDict()    # clave -> tamaño, por orden de último uso
+        self._disk_bytes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._load_index()
+
+    @staticmethod
+    def key(text, voice, model, fmt):
+        raw = json.dumps([text.strip(), voice, model, fmt], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _load_index(self):
+        """Reconstruye el LRU de disco a partir de las fechas de acceso de los ficheros."""
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith(".bin"):
+                    st = os.stat(os.path.join(self.directory, name))
+                    entries.append((st.st_mtime, name[:-4], st.st_size))
+        except OSError as e:
+            print(f"TTS CACHE: disco no disponible ({e}), solo memoria")
+            self.directory = None
+            return
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    # --- Consulta ---
+    def get(self, text, voice, model, fmt):
+        key = self.key(text, voice, model, fmt)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+            on_disk = key in self._disk
+
+        data = self._read_disk(key) if on_disk else None
+        with self._lock:
+            if data is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._remember(key, data)
+        return data
+
+    def __contains__(self, entry):
+        key = self.key(*entry)
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # La fecha del fichero hace de "último uso" entre arranques
+            return data
+        except OSError:
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+
+    # --- Alta ---
+    def put(self, text, voice, model, fmt, data):
+        if not data:
+            return
+        key = self.key(text, voice, model, fmt)
+        with self._lock:
+            self._remember(key, data)
+            self.stats["stores"] += 1
+            known = key in self._disk
+        if self.directory and not known:
+            self._write_disk(key, data)
+
+    def _write_disk(self, key, data):
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)  # Atómico: nunca queda un audio a medias
+        except OSError as e:
+            print(f"TTS CACHE: no se pudo guardar en disco: {e}")
+            return
+        with self._lock:
+            old = self._disk.pop(key, None)  # Dos put a la vez de la misma clave
+            if old is not None:
+                self._disk_bytes -= old
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def _remember(self, key, data):
+        """Mete en el LRU de memoria (con el lock tomado)."""
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_bytes -= len(dropped)
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    # --- Métricas ---
+    def metrics(self):
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return dict(self.stats,
+                        hit_rate=round(hits / lookups, 3) if lookups else None,
+                        memory_entries=len(self._memory), memory_bytes=self._memory_bytes,
+                        disk_entries=len(self._disk), disk_bytes=self._disk_bytes)
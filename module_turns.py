@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+module_turns.py - Cancelación de turnos (STT -> LLM -> TTS)
+Cada respuesta de TARS lleva un CancelToken. Si vuelves a hablar antes de
+que termine (y el ASR saca palabras: una tos no cuenta), el oído adelanta
+el turno (preempt) y el token del anterior se cancela: se corta la
+petición al LLM, no se sintetiza lo pendiente y el altavoz se calla en el
+siguiente bloque. Así nunca hay dos respuestas sonando a la vez.
+
+Métricas:
+  silence_ms  cancelación -> altavoz abortado (si estaba sonando)
+  release_ms  cancelación -> el turno viejo ha soltado el hilo de entrega
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class TurnCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    def __init__(self, turn_id):
+        self.turn_id = turn_id
+        self.reason = None
+        self.cancelled_at = None
+        self.silenced_ms = None
+        self.trace = None  # Traza del turno (module_tracing), si la hay
+        # Se completa al cancelar: sirve para wait() junto a otras peticiones
+        self.future = Future()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self.cancelled_at is not None
+
+    def cancel(self, reason="cancelado"):
+        """Cancela el turno y avisa a quien se haya apuntado. Devuelve False si ya lo estaba."""
+        with self._lock:
+            if self.cancelled_at is not None:
+                return False
+            self.cancelled_at = time.monotonic()
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        self.future.set_result(reason)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"TURN: error al cancelar: {e}")
+        return True
+
+    def on_cancel(self, callback):
+        """callback() al cancelar (o ya mismo si el turno está cancelado)."""
+        with self._lock:
+            if self.cancelled_at is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        if self.cancelled_at is not None:
+            raise TurnCancelled(f"turno {self.turn_id}: {self.reason}")
+
+    def silenced(self):
+        """Lo llama el TTS al abortar el altavoz: mide cancelación -> silencio."""
+        if self.cancelled_at is not None and self.silenced_ms is None:
+            self.silenced_ms = 1000 * (time.monotonic() - self.cancelled_at)
+        return self.silenced_ms
+
+
+class TurnManager:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.active = None
+        self._silence = deque(maxlen=100)
+        self._release = deque(maxlen=100)
+        self.stats = {"turns": 0, "cancelled": 0}
+
+    def begin(self):
+        """Token para la respuesta que empieza (cancela la anterior si siguiera viva)."""
+        with self._lock:
+            previous = self.active
+            self._next_id += 1
+            token = self.active = CancelToken(self._next_id)
+            self.stats["turns"] += 1
+        if previous is not None:
+            self._cancel(previous, "turno nuevo")
+        return token
+
+    def preempt(self, reason="nueva frase"):
+        """El usuario ha vuelto a hablar: cancela la respuesta en curso (si hay)."""
+        with self._lock:
+            token = self.active
+        return token is not None and self._cancel(token, reason)
+
+    def _cancel(self, token, reason):
+        if not token.cancel(reason):
+            return False
+        with self._lock:
+            self.stats["cancelled"] += 1
+        print(f"⏹️ Turno {token.turn_id} cancelado ({reason})")
+        return True
+
+    def finish(self, token):
+        """Fin de la respuesta de 'token' (cancelada o no)."""
+        with self._lock:
+            if self.active is token:
+                self.active = None
+        if not token.cancelled:
+            return
+        release = 1000 * (time.monotonic() - token.cancelled_at)
+        with self._lock:
+            self._release.append(release)
+            if token.silenced_ms is not None:
+                self._silence.append(token.silenced_ms)
+        silence = f"silencio en {token.silenced_ms:.0f} ms, " if token.silenced_ms is not None else ""
+        print(f"🤫 Turno {token.turn_id}: {silence}liberado en {release:.0f} ms")
+
+    def metrics(self):
+        with self._lock:
+            out = dict(self.stats)
+            for name, samples in (("silence_ms", self._silence), ("release_ms", self._release)):
+                if samples:
+                    out[f"{name}_p50"] = round(float(np.percentile(samples, 50)), 1)
+                    out[f"{name}_max"] = round(max(samples), 1)
+        return out
+
+
+# Compartido por el oído (preempt), main (begin/finish), LLM y TTS
+turns = TurnManager()
@@ -13,6 +13,7 @@ os.environ["SDL_VIDEO_CENTERED"] = "1"
 import pygame
 import threading
 import time
+from modules.module_state import tars_state, SPEAKING, THINKING, LISTENING
 
 # Colores TARS
 BLUE_BG = (10, 20, 40)
@@ -29,6 +30,8 @@ class UIManager(threading.Thread):
         self.status_text = "TARS ONLINE"
         self.sub_text = "System Ready"
         self.is_speaking = False
+        self.state = tars_state.state
+        tars_state.subscribe(self._on_state_change)
         
         # Inicializar Pygame sin modos acelerados
         try:
@@ -55,14 +58,11 @@ class UIManager(threading.Thread):
     def update_data(self, source, message, category="INFO"):
         self.status_text = message[:60]
         self.sub_text = f"[{source}]"
-        
-        if category == "TARS":
-            self.is_speaking = True
-            # Dejar de "hablar" visualmente tras 2 segundos
-            threading.Timer(2.0, self._stop_speaking).start()
 
-    def _stop_speaking(self):
-        self.is_speaking = False
+    def _on_state_change(self, old, new, t):
+        # Los bloques brillan exactamente mientras suena la voz, sin temporizadores
+        self.state = new
+        self.is_speaking = new == SPEAKING
 
     def run(self):
         if not self.running: return
@@ -86,8 +86,9 @@ class UIManager(threading.Thread):
             
             # Bloque Izq
             pygame.draw.rect(self.screen, block_color, (cx - 160, cy - 50, 100, 150), border_radius=5)
-            # Bloque Centro
-            pygame.draw.rect(self.screen, BLUE_BLOCK, (cx - 50, cy - 50, 100, 150), border_radius=5)
+            # Bloque Centro (se ilumina mientras te escucha o piensa)
+            center_color = BLUE_ACTIVE if self.state in (LISTENING, THINKING) else BLUE_BLOCK
+            pygame.draw.rect(self.screen, center_color, (cx - 50, cy - 50, 100, 150), border_radius=5)
             # Bloque Der
             pygame.draw.rect(self.screen, block_color, (cx + 60, cy - 50, 100, 150), border_radius=5)
             
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+module_vad.py - Detección de voz (VAD) para el oído de TARS
+Motores intercambiables por config (STT.vad_engine):
+  - "energy":   el umbral RMS fijo de siempre
+  - "adaptive": energía + cruces por cero + energía en banda de voz,
+                con suelo de ruido adaptativo y hangover
+"""
+
+from collections import deque
+
+import numpy as np
+from modules.module_settings import get_setting
+
+EPS = 1e-12
+
+
+class VADEngine:
+    """Interfaz común: process(chunk) -> True si el bloque contiene voz."""
+    name = "base"
+
+    def __init__(self, fs, amp_gain=1.0):
+        self.fs = fs
+        self.amp_gain = amp_gain
+        self.level = 0.0  # Último nivel medido (para los logs)
+        self.voiced = False  # Decisión cruda del último bloque, sin hangover
+
+    def process(self, chunk):
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class EnergyVAD(VADEngine):
+    """El detector original: RMS * ganancia contra un umbral fijo."""
+    name = "energy"
+
+    def __init__(self, fs, amp_gain=1.0, threshold=0.03):
+        super().__init__(fs, amp_gain)
+        self.threshold = threshold
+
+    def process(self, chunk):
+        flat = chunk.reshape(-1)
+        self.level = np.sqrt(np.dot(flat, flat) / flat.size) * self.amp_gain
+        self.voiced = self.level > self.threshold
+        return self.voiced
+
+
+class AdaptiveVAD(VADEngine):
+    """
+    Parte cada bloque en tramas cortas y calcula por trama (vectorizado):
+    energía, tasa de cruces por cero y fracción de energía en 300-3400 Hz.
+    Una trama es voz si su energía en banda de voz supera el suelo de ruido
+    (de esa misma banda) en snr_db, tiene la energía concentrada en la banda
+    y no parece ruido blanco (ZCR alto). Así un ventilador, que mete casi
+    todo por debajo de 300 Hz, apenas sube el suelo.
+
+    El suelo se aprende de las tramas que no son voz y, además, con
+    estadística de mínimos: si en min_window_ms ninguna trama ha bajado al
+    suelo (una tele o un ruido en banda que arranca después de calibrar y
+    todo parece voz), el suelo sube hacia el mínimo de esa ventana. La voz
+    de verdad siempre tiene pausas que dejan el mínimo abajo.
+
+    snr_db 5 sale de bench_vad.py --seeds 6 a 30 y 60 s: con 9 dB se perdían
+    enteros los hablantes flojos sobre el ventilador fuerte (recall 0.54 en
+    el peor corpus); con 5 dB el peor queda en 0.73 y la precisión baja poco.
+    """
+    name = "adaptive"
+
+    def __init__(self, fs, amp_gain=1.0, frame_ms=20, snr_db=5.0,
+                 min_band_ratio=0.45, max_zcr=0.35, hangover_ms=300,
+                 onset_frames=2, min_noise_floor=1e-8,
+                 noise_fall=0.3, noise_rise=0.02, band=(300.0, 3400.0),
+                 min_window_ms=5000):
+        super().__init__(fs, amp_gain)
+        self.frame_len = max(64, int(fs * frame_ms / 1000))
+        self.snr_db = snr_db
+        self.min_band_ratio = min_band_ratio
+        self.max_zcr = max_zcr
+        self.hangover_frames = max(0, int(round(hangover_ms / frame_ms)))
+        self.onset_frames = max(1, onset_frames)
+        self.min_noise_floor = min_noise_floor
+        self.noise_fall = noise_fall
+        self.noise_rise = noise_rise
+        self.min_window_frames = max(1, int(round(min_window_ms / frame_ms)))
+
+        self._window = np.hanning(self.frame_len).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.frame_len, 1.0 / fs)
+        self._band = (freqs >= band[0]) & (freqs <= band[1])
+        self.reset()
+
+    def reset(self):
+        self.noise_floor = None  # Se inicializa con el primer bloque
+        self._hang = 0
+        self._run = 0
+        self._active = False
+        self.snr = 0.0
+        self._minima = deque()  # (tramas, mínimo de energía en banda) por bloque
+        self._minima_frames = 0
+        self._tail = np.empty(0, dtype=np.float32)  # Muestras que no llenaron la última trama
+
+    def features(self, chunk):
+        """
+        Devuelve (energía, zcr, ratio_banda) por trama del bloque. Lo que sobra
+        al final (2048 muestras no son un número entero de tramas) se guarda
+        y abre la primera trama del bloque siguiente: no se pierde audio.
+        """
+        mono = chunk.mean(axis=1) if chunk.ndim == 2 else chunk.reshape(-1)
+        if self._tail.size:
+            mono = np.concatenate((self._tail, mono))
+        n = (len(mono) // self.frame_len) * self.frame_len
+        self._tail = mono[n:].copy()
+        if n == 0:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty, empty
+        frames = mono[:n].reshape(-1, self.frame_len) * self.amp_gain
+
+        energy = np.einsum('ij,ij->i', frames, frames) / self.frame_len
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_len
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        band_ratio = power[:, self._band].sum(axis=1) / (power.sum(axis=1) + EPS)
+        return energy, zcr, band_ratio
+
+    def _update_noise(self, energy):
+        # Baja rápido cuando hay menos ruido, sube despacio (un ventilador que arranca)
+        target = float(np.min(energy))
+        rate = self.noise_fall if target < self.noise_floor else self.noise_rise
+        self.noise_floor += rate * (target - self.noise_floor)
+        self.noise_floor = max(self.noise_floor, self.min_noise_floor)
+
+    def _track_minimum(self, band_energy):
+        # Mínimo de todas las tramas (voz incluida) en los últimos min_window_ms
+        self._minima.append((band_energy.size, float(np.min(band_energy))))
+        self._minima_frames += band_energy.size
+        while self._minima_frames - self._minima[0][0] >= self.min_window_frames:
+            self._minima_frames -= self._minima.popleft()[0]
+        if self._minima_frames < self.min_window_frames:
+            return
+        floor = min(m for _, m in self._minima)
+        if floor > self.noise_floor:
+            # Ninguna trama ha tocado el suelo en toda la ventana: el suelo se ha quedado corto
+            self.noise_floor += self.noise_rise * (floor - self.noise_floor)
+
+    def process(self, chunk):
+        energy, zcr, band_ratio = self.features(chunk)
+        if energy.size == 0:
+            return self._active
+
+        band_energy = energy * band_ratio
+        if self.noise_floor is None:
+            self.noise_floor = max(float(np.min(band_energy)), self.min_noise_floor)
+        snr = 10.0 * np.log10((band_energy + EPS) / self.noise_floor)
+        is_voice = (snr > self.snr_db) & (band_ratio > self.min_band_ratio) & (zcr < self.max_zcr)
+
+        self.snr = float(snr.max())
+        self.voiced = bool(is_voice.any())
+        self.level = float(np.sqrt(energy.max()))
+
+        # Solo aprendemos el ruido de las tramas que no son voz
+        quiet = band_energy[~is_voice]
+        if quiet.size:
+            self._update_noise(quiet)
+        self._track_minimum(band_energy)
+
+        # Arranque con N tramas seguidas + hangover para no cortar entre palabras
+        for voiced in is_voice:
+            if voiced:
+                self._run += 1
+                if self._run >= self.onset_frames:
+                    self._active = True
+                    self._hang = self.hangover_frames
+            else:
+                self._run = 0
+                if self._hang > 0:
+                    self._hang -= 1
+                else:
+                    self._active = False
+
+        return self._active
+
+
+VAD_ENGINES = {
+    EnergyVAD.name: EnergyVAD,
+    AdaptiveVAD.name: AdaptiveVAD,
+}
+
+
+def register_vad(name, cls):
+    """Permite enchufar otro motor (p.ej. uno basado en un modelo)."""
+    VAD_ENGINES[name] = cls
+
+
+def create_vad(config, fs, amp_gain=1.0, threshold=0.03):
+    """Crea el motor configurado en STT.vad_engine (por defecto 'adaptive')."""
+    engine = get_setting(config, 'STT', 'vad_engine', 'adaptive')
+    cls = VAD_ENGINES.get(engine)
+    if cls is None:
+        print(f"EAR WARNING: VAD '{engine}' desconocido, usando 'adaptive'")
+        cls = AdaptiveVAD
+
+    if cls is EnergyVAD:
+        return EnergyVAD(fs, amp_gain, threshold=get_setting(config, 'STT', 'threshold', threshold))
+    if cls is AdaptiveVAD:
+        return AdaptiveVAD(
+            fs, amp_gain,
+            snr_db=get_setting(config, 'STT', 'vad_snr_db', 5.0),
+            hangover_ms=get_setting(config, 'STT', 'vad_hangover_ms', 300),
+            min_band_ratio=get_setting(config, 'STT', 'vad_min_band_ratio', 0.45),
+        )
+    return cls(fs, amp_gain)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+module_workers.py - Pool de trabajadores acotado con entrega en orden
+Sustituye el "un hilo nuevo por frase": N hilos fijos, cola con tope y
+una política para cuando se llena. Los resultados salen por un único hilo
+de entrega en el mismo orden en que se capturaron.
+
+Políticas con la cola llena:
+  - "merge":       se junta con el último trabajo pendiente (merge_fn)
+  - "drop_oldest": se descarta el trabajo pendiente más antiguo
+  - "drop_newest": se descarta el que acaba de llegar
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+_SKIPPED = object()
+POLICIES = ("merge", "drop_oldest", "drop_newest")
+
+
+class OrderedWorkerPool:
+    def __init__(self, work_fn, deliver_fn, workers=2, max_queue=3,
+                 policy="merge", merge_fn=None, name="pool"):
+        if policy not in POLICIES:
+            print(f"POOL {name} WARNING: política '{policy}' desconocida, usando 'merge'")
+            policy = "merge"
+        if policy == "merge" and merge_fn is None:
+            policy = "drop_oldest"
+
+        self.work_fn = work_fn
+        self.deliver_fn = deliver_fn
+        self.n_workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.policy = policy
+        self.merge_fn = merge_fn
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._pending = deque()      # (seq, item, t_encolado)
+        self._results = {}           # seq -> resultado (o _SKIPPED)
+        self._next_seq = 0
+        self._next_delivery = 0
+        self._running = False
+        self._threads = []
+
+        self._waits = deque(maxlen=200)
+        self.stats = {"submitted": 0, "processed": 0, "merged": 0, "dropped": 0,
+                      "errors": 0, "max_depth": 0}
+
+    # --- Ciclo de vida ---
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        for i in range(self.n_workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._delivery, name=f"{self.name}-delivery", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    # --- Entrada ---
+    def submit(self, item):
+        """Encola un trabajo. Devuelve False si la política lo ha descartado."""
+        with self._cond:
+            self.stats["submitted"] += 1
+            if len(self._pending) >= self.max_queue:
+                if self.policy == "drop_newest":
+                    self.stats["dropped"] += 1
+                    return False
+                if self.policy == "merge":
+                    seq, old, queued_at = self._pending.pop()
+                    self._pending.append((seq, self.merge_fn(old, item), queued_at))
+                    self.stats["merged"] += 1
+                    return True
+                seq, _, _ = self._pending.popleft()
+                self._results[seq] = _SKIPPED
+                self.stats["dropped"] += 1
+
+            self._pending.append((self._next_seq, item, time.monotonic()))
+            self._next_seq += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], len(self._pending))
+            self._cond.notify_all()
+            return True
+
+    # --- Hilos ---
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                seq, item, queued_at = self._pending.popleft()
+                self._waits.append(time.monotonic() - queued_at)
+
+            try:
+                result = self.work_fn(item)
+            except Exception as e:
+                print(f"❌ Error en {self.name}: {e}")
+                result = None
+                self.stats["errors"] += 1
+
+            with self._cond:
+                self._results[seq] = _SKIPPED if result is None else result
+                self.stats["processed"] += 1
+                self._cond.notify_all()
+
+    def _delivery(self):
+        while True:
+            with self._cond:
+                while self._running and self._next_delivery not in self._results:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                result = self._results.pop(self._next_delivery)
+                self._next_delivery += 1
+
+            if result is not _SKIPPED:
+                try:
+                    self.deliver_fn(result)
+                except Exception as e:
+                    print(f"❌ Error entregando resultado ({self.name}): {e}")
+
+    # --- Métricas ---
+    def depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def metrics(self):
+        with self._cond:
+            waits = np.array(self._waits) if self._waits else None
+            out = dict(self.stats, depth=len(self._pending), policy=self.policy)
+        if waits is not None:
+            out["wait_mean_ms"] = round(1000 * float(waits.mean()), 1)
+            out["wait_p95_ms"] = round(1000 * float(np.percentile(waits, 95)), 1)
+        return out
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+test_context.py - Memoria de la conversación (module_context)
+
+Uso: python3 -m pytest -q test_context.py
+"""
+
+import threading
+
+from modules.module_context import ConversationContext
+
+
+def contents(messages):
+    return [(m["role"], m["content"]) for m in messages]
+
+
+def test_first_request_has_no_history():
+    context = ConversationContext("Eres TARS.")
+    assert not context.has_history
+    assert contents(context.messages("hola")) == [("system", "Eres TARS."), ("user", "hola")]
+
+
+def test_turns_are_sent_and_counted_as_history():
+    context = ConversationContext("Eres TARS.")
+    context.add_turn("hola", "hola, humano")
+    context.add_turn("", "sin pregunta")  # No cuenta
+    assert context.has_history
+    assert contents(context.messages("¿qué tal?"))[1:] == [
+        ("user", "hola"), ("assistant", "hola, humano"), ("user", "¿qué tal?")]
+    context.reset()
+    assert not context.has_history
+
+
+def test_budget_keeps_most_recent_turns():
+    context = ConversationContext("Eres TARS.", budget=200, reply_tokens=50, keep_turns=100)
+    for i in range(20):
+        context.add_turn(f"pregunta {i} " + "bla " * 10, f"respuesta {i} " + "bla " * 10)
+    messages = context.messages("última")
+    assert context.stats["last_prompt_tokens"] <= 200 - 50
+    assert messages[-2]["content"].startswith("respuesta 19")
+    assert not any(m["content"].startswith("pregunta 0 ") for m in messages)
+
+
+def test_old_turns_are_summarized():
+    done = threading.Event()
+    calls = []
+
+    def summarize(previous, turns, max_tokens):
+        calls.append((previous, turns))
+        done.set()
+        return "hablamos de cosas"
+    context = ConversationContext("Eres TARS.", summarize_fn=summarize, budget=300, reply_tokens=50,
+                                  keep_turns=2, summary_tokens=50)
+    for i in range(12):
+        context.add_turn(f"pregunta {i} " + "bla " * 8, f"respuesta {i} " + "bla " * 8)
+    assert done.wait(2.0)
+    context._executor.shutdown(wait=True)
+    assert calls[0][0] == "" and calls[0][1][0][0].startswith("pregunta 0")
+    assert context.summary == "hablamos de cosas"
+    assert "hablamos de cosas" in context.messages("sigue")[0]["content"]
+    assert context.metrics()["pending_turns"] >= 2
+
+
+def test_summary_alone_counts_as_history():
+    context = ConversationContext("Eres TARS.")
+    context.summary = "antes hablamos del tiempo"
+    assert context.has_history
+
+
+def test_failed_summary_drops_old_turns():
+    def broken(previous, turns, max_tokens):
+        raise RuntimeError("sin red")
+    context = ConversationContext("Eres TARS.", summarize_fn=broken, budget=300, reply_tokens=50,
+                                  keep_turns=2, summary_tokens=50)
+    for i in range(12):
+        context.add_turn(f"pregunta {i} " + "bla " * 8, f"respuesta {i} " + "bla " * 8)
+    context._executor.shutdown(wait=True)
+    assert context.stats["summary_errors"] >= 1
+    assert context.stats["dropped_turns"] > 0
+    assert context.summary == ""
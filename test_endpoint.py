@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+test_endpoint.py - Fin de frase (module_endpoint)
+Se simulan bloques de 20 ms: voz con un nivel dado y luego silencio,
+y se mira cuánta pausa hace falta para cerrar.
+
+Uso: python3 -m pytest -q test_endpoint.py
+"""
+
+import pytest
+
+from modules.module_endpoint import EndpointDetector
+
+BLOCK = 0.02
+
+
+def steady(t):
+    """Voz casi plana (-10 dB/s): ni cierre ni subida de entonación."""
+    return 0.1 * 10 ** (-0.5 * t)
+
+
+def speak(detector, seconds, level=steady, t0=0.0):
+    """Bloques de voz desde t0; devuelve el instante del último."""
+    detector.start(t0)
+    t = t0
+    while t < t0 + seconds:
+        t += BLOCK
+        assert detector.update(True, level(t - t0), t) is False
+    return t
+
+
+def pause_until_close(detector, t, limit=5.0):
+    """Silencio hasta que el detector cierra; devuelve la pausa."""
+    start = t
+    while t - start < limit:
+        t += BLOCK
+        if detector.update(False, 0.0, t):
+            return t - start
+    return None
+
+
+def test_short_command_closes_fast():
+    detector = EndpointDetector()
+    t = speak(detector, 0.8)
+    assert pause_until_close(detector, t) == pytest.approx(0.55, abs=BLOCK)
+
+
+def test_fading_voice_closes_sooner():
+    detector = EndpointDetector()
+    t = speak(detector, 0.8, level=lambda t: 0.2 * 10 ** (-2.5 * t))  # -50 dB/s
+    assert detector.energy_trend() < -20.0
+    assert pause_until_close(detector, t) == pytest.approx(0.55 * 0.8, abs=BLOCK)
+
+
+def test_long_dictation_gets_more_patience():
+    detector = EndpointDetector()
+    t = speak(detector, 11.0)
+    assert pause_until_close(detector, t) == pytest.approx(0.55 + 0.1 * 10.0, abs=2 * BLOCK)
+
+
+def test_partial_text():
+    detector = EndpointDetector()
+    t = speak(detector, 0.8)
+    detector.set_partial_text("quiero saber si")
+    assert detector.required_pause() == pytest.approx(0.55 * 1.6)
+    detector.set_partial_text("¿qué hora es?")
+    assert detector.required_pause() == pytest.approx(0.55 * 0.8)
+    assert pause_until_close(detector, t) == pytest.approx(0.44, abs=BLOCK)
+
+
+def test_pause_is_capped():
+    detector = EndpointDetector(max_pause=1.0)
+    t = speak(detector, 30.0)
+    detector.set_partial_text("y")
+    assert pause_until_close(detector, t) == pytest.approx(1.0, abs=BLOCK)
+
+
+def test_idle_and_metrics():
+    detector = EndpointDetector()
+    assert detector.update(False, 0.0, 1.0) is False  # Sin frase empezada no hay nada que cerrar
+    assert detector.metrics() == {"count": 0}
+    t = speak(detector, 0.8)
+    pause_until_close(detector, t)
+    assert detector.update(False, 0.0, t + 3.0) is False  # Ya cerrada
+    assert detector.metrics()["count"] == 1
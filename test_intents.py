@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+test_intents.py - Órdenes locales (module_intents)
+Sobre todo la de apagar: solo cuenta como orden completa, sin negaciones,
+y no se ejecuta hasta que se confirma de viva voz.
+
+Uso: python3 -m pytest -q test_intents.py
+"""
+
+import pytest
+
+from modules.module_intents import (FIXED_REPLIES, IntentRouter, command_core, describe_duration,
+                                    extract_duration, normalize)
+
+
+class FixedTemp:
+    def get_temperature(self):
+        return 48.0
+
+
+@pytest.fixture
+def router():
+    router = IntentRouter(cpu_temp=FixedTemp())
+    yield router
+    router.cancel_timers()
+
+
+@pytest.mark.parametrize("text", [
+    "¿Cómo se apaga el sistema de riego?",
+    "apaga el sistema de riego",
+    "Don't shut down yet",
+    "what does shutdown mean",
+    "No te apagues",
+    "no, apágate no",
+])
+def test_shutdown_needs_whole_command(router, text):
+    assert router.match(text) is None
+
+
+@pytest.mark.parametrize("text", ["Tars, apágate.", "apágate ya", "shutdown please", "Oye TARS, apaga el sistema"])
+def test_shutdown_asks_for_confirmation(router, text):
+    result = router.match(text)
+    assert result.name == "shutdown_confirm"
+    assert result.after is None  # Todavía no se apaga nada
+
+
+@pytest.mark.parametrize("answer", ["Sí", "sí, hazlo", "yes", "confirmo"])
+def test_shutdown_confirmed(router, answer):
+    router.match("apágate")
+    result = router.match(answer)
+    assert result.name == "shutdown"
+    assert result.after is not None
+    assert router.stats["confirmed"] == 1
+
+
+@pytest.mark.parametrize("answer", ["no", "cancela", "espera, no"])
+def test_shutdown_declined(router, answer):
+    router.match("apágate")
+    result = router.match(answer)
+    assert result.name == "shutdown_cancelled"
+    assert result.after is None
+    assert router.stats["declined"] == 1
+
+
+def test_confirmation_is_forgotten_on_other_topics(router):
+    router.match("apágate ya")
+    assert router.match("¿qué hora es?").name == "time"
+    assert router.match("sí") is None  # La confirmación ya no está pendiente
+
+
+def test_hedged_yes_does_not_confirm(router):
+    router.match("apágate")
+    assert router.match("sí, pero no") is None
+
+
+def test_confirmation_expires(router):
+    router.match("apágate")
+    router._pending.deadline = 0.0
+    assert router.match("sí") is None
+
+
+@pytest.mark.parametrize("text, name", [
+    ("Oye, ¿qué hora es ahora?", "time"), ("What time is it?", "time"), ("¿A qué estamos?", "date"),
+    ("¿Cuál es tu temperatura?", "temperature"), ("Tars, ¿quién eres?", "name"),
+    ("pon un temporizador de 5 minutos", "timer"), ("avísame en media hora", "timer"),
+])
+def test_other_intents(router, text, name):
+    assert router.match(text).name == name
+
+
+@pytest.mark.parametrize("text", [
+    "¿A qué hora es el concierto del sábado?",
+    "¿Qué hora es en Tokio?",
+    "explícame qué es un temporizador 555",
+    "¿cómo funciona la cuenta atrás de un cohete?",
+    "¿a qué estamos esperando?",
+    "sube tu temperatura ideal en la calefacción",
+    "¿quién eres tú para decirme eso?",
+    "cuéntame un chiste",
+])
+def test_other_intents_need_the_whole_command(router, text):
+    assert router.match(text) is None
+    assert router.metrics()["timers"] == 0
+
+
+def test_temperature_reply(router):
+    assert "48 grados" in router.match("¿a cuánto está tu CPU?").reply
+
+
+def test_timer(router):
+    result = router.match("pon un temporizador de 2 minutos")
+    assert result.name == "timer"
+    assert result.reply == "Temporizador de 2 minutos en marcha."
+
+
+def test_normalize_and_core():
+    assert normalize("¿Qué HORA es?") == "que hora es"
+    assert command_core("tars apagate ya por favor") == "apagate"
+    assert command_core("por favor") == ""
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("en 5 minutos", 300), ("dentro de una hora", 3600), ("90 segundos", 90), ("sin número", None),
+])
+def test_extract_duration(text, seconds):
+    assert extract_duration(normalize(text)) == seconds
+
+
+def test_describe_duration():
+    assert describe_duration(1) == "1 segundo"
+    assert describe_duration(120) == "2 minutos"
+    assert describe_duration(1800) == "30 minutos"
+
+
+def test_spoken_replies_are_prewarmable(router):
+    """Las respuestas fijas que da el router son las que module_tts precalienta (FIXED_REPLIES)."""
+    replies = [router.match("apágate").reply, router.match("sí").reply,
+               router.match("shutdown").reply, router.match("no").reply,
+               router.match("¿quién eres?").reply, router.match("pon un temporizador").reply]
+    assert all(reply in FIXED_REPLIES for reply in replies)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+test_llm.py - Caché de respuestas del LLM con historial (module_llm)
+Contra fake_api_server.py: las frases que se entienden solas se siguen
+sirviendo de la caché en el turno 2 y siguientes; las que dependen de lo
+anterior van siempre al LLM.
+
+Uso: python3 -m pytest -q test_llm.py
+"""
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("modules.module_config", reason="module_config es del árbol completo de TARS")
+
+from fake_api_server import FakeAPIServer
+from modules.module_clients import client_hub
+import modules.module_llm as llm
+
+ResponseCache = llm.ResponseCache
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeAPIServer(token_delay=0.0).start()
+    client_hub.point_to(server.base_url, api_key="test")
+    monkeypatch.setattr(llm, "CACHE_ENABLED", True)
+    monkeypatch.setattr(llm, "response_cache", ResponseCache())
+    llm.conversation.reset()
+    yield server
+    llm.conversation.reset()
+    client_hub.close()
+    server.stop()
+
+
+@pytest.mark.parametrize("text", [
+    "cuéntame un chiste de robots", "¿cuál es la capital de Francia?", "what is the capital of France",
+])
+def test_context_free(text):
+    assert ResponseCache.context_free(text)
+
+
+@pytest.mark.parametrize("text", [
+    "¿y mañana?", "explícame eso mejor", "¿cómo me llamo?", "cuéntame otro chiste", "¿por qué?",
+    "pero eso no es verdad", "what did I just say",
+])
+def test_depends_on_context(text):
+    assert not ResponseCache.context_free(text)
+
+
+def test_cache_hit_after_first_turn(server):
+    llm.process_completion("hola, soy Ana y me gustan los robots")
+    first = llm.process_completion("cuéntame un chiste de robots")
+    assert llm.conversation.has_history
+    before = server.requests["chat"]
+    assert llm.process_completion("Cuéntame un chiste de robots.") == first  # Turno 3: de la caché
+    assert server.requests["chat"] == before
+    assert llm.response_cache.stats["hits"] == 1
+
+
+def test_streaming_cache_hit_after_first_turn(server):
+    llm.process_completion("qué tal estás hoy")
+    first = "".join(llm.stream_completion("dime un dato curioso del espacio"))
+    before = server.requests["chat"]
+    assert "".join(llm.stream_completion("dime un dato curioso del espacio")) == first
+    assert server.requests["chat"] == before
+
+
+def test_follow_up_skips_cache_with_history(server):
+    llm.process_completion("¿y mañana?")  # Sin historial: se guarda
+    assert llm.response_cache.stats["stores"] == 1
+    before = server.requests["chat"]
+    llm.process_completion("¿y mañana?")  # Ya con historial: depende de lo anterior
+    assert server.requests["chat"] == before + 1
+    assert llm.response_cache.stats["hits"] == 0
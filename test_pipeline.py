@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+test_pipeline.py - Orquestador (module_pipeline)
+Colas acotadas, contrapresión en say() y que nadie se quede colgado en
+job.wait() cuando el orquestador se para o el turno se cancela.
+
+Uso: python3 -m pytest -q test_pipeline.py
+"""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("modules.module_config", reason="module_config es del árbol completo de TARS")
+
+from modules.module_pipeline import Pipeline, SpeechJob
+from modules.module_tracing import Tracer
+from modules.module_turns import CancelToken
+
+
+class Recorder:
+    """respond / speak_text / speak_stream que apuntan lo que reciben."""
+    def __init__(self, speak_gate=None):
+        self.replies = []
+        self.spoken = []
+        self.speak_gate = speak_gate
+
+    def respond(self, text, trace):
+        self.replies.append((text, trace))
+
+    def speak_text(self, text, token):
+        if self.speak_gate is not None:
+            self.speak_gate.wait(5.0)
+        self.spoken.append(text)
+
+    def speak_stream(self, chunks, token):
+        self.spoken.append("".join(chunks))
+
+
+@pytest.fixture
+def pipeline_factory():
+    created = []
+
+    def make(recorder, **kwargs):
+        pipeline = Pipeline(recorder.respond, recorder.speak_text, recorder.speak_stream, **kwargs)
+        created.append(pipeline)
+        return pipeline
+    yield make
+    for pipeline in created:
+        pipeline.stop()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_inline_without_loop(pipeline_factory):
+    recorder = Recorder()
+    pipeline = pipeline_factory(recorder)
+    pipeline.submit("hola", "traza")
+    job = pipeline.say(SpeechJob("qué tal"))
+    assert recorder.replies == [("hola", "traza")]
+    assert job.wait(0) and recorder.spoken == ["qué tal"]
+
+
+def test_submit_and_stream(pipeline_factory):
+    recorder = Recorder()
+    pipeline = pipeline_factory(recorder).start()
+    pipeline.submit("hola")
+    assert wait_for(lambda: recorder.replies == [("hola", None)])
+    job = pipeline.say(SpeechJob())
+    for delta in ("Afirmativo", ", ", "humano."):
+        job.push(delta)
+    job.close()
+    assert job.wait(2.0)
+    assert recorder.spoken == ["Afirmativo, humano."]
+
+
+def test_full_utterance_queue_drops_oldest(pipeline_factory, monkeypatch):
+    tracer = Tracer()
+    monkeypatch.setattr("modules.module_pipeline.tracer", tracer)
+    started, gate = threading.Event(), threading.Event()
+    recorder = Recorder()
+
+    def respond(text, trace):
+        started.set()
+        gate.wait(5.0)
+        recorder.replies.append((text, trace))
+    recorder.respond = respond
+    pipeline = pipeline_factory(recorder, utterance_queue=1).start()
+    pipeline.submit("primera")  # La coge la etapa y se queda esperando en gate
+    assert started.wait(2.0)
+    old = tracer.begin()
+    pipeline.submit("segunda", old)
+    pipeline.submit("tercera")
+    assert wait_for(lambda: pipeline.stats["dropped"] == 1)
+    assert old.status == "dropped"
+    gate.set()
+    assert wait_for(lambda: [t for t, _ in recorder.replies] == ["primera", "tercera"])
+
+
+def test_stop_releases_blocked_say(pipeline_factory):
+    gate = threading.Event()
+    recorder = Recorder(speak_gate=gate)
+    pipeline = pipeline_factory(recorder, speech_queue=1).start()
+    pipeline.say(SpeechJob("suena"))          # En el altavoz, esperando a gate
+    assert wait_for(lambda: pipeline.speech.empty())
+    pipeline.say(SpeechJob("en cola"))        # Llena la cola
+    blocked = SpeechJob("bloqueado")
+    waiter = threading.Thread(target=pipeline.say, args=(blocked,), daemon=True)
+    waiter.start()
+    time.sleep(0.1)
+    assert waiter.is_alive()                  # Contrapresión
+    pipeline.stop()
+    waiter.join(2.0)
+    gate.set()
+    assert not waiter.is_alive()
+    assert blocked.wait(0)
+
+
+def test_cancelled_turn_releases_blocked_say(pipeline_factory):
+    gate = threading.Event()
+    recorder = Recorder(speak_gate=gate)
+    pipeline = pipeline_factory(recorder, speech_queue=1).start()
+    pipeline.say(SpeechJob("suena"))
+    assert wait_for(lambda: pipeline.speech.empty())
+    pipeline.say(SpeechJob("en cola"))
+    token = CancelToken(1)
+    blocked = SpeechJob("bloqueado", token=token)
+    waiter = threading.Thread(target=pipeline.say, args=(blocked,), daemon=True)
+    waiter.start()
+    time.sleep(0.1)
+    token.cancel()
+    waiter.join(2.0)
+    assert not waiter.is_alive() and blocked.wait(0)
+    assert pipeline.stats["rejected"] == 1
+    gate.set()
+    assert wait_for(lambda: recorder.spoken == ["suena", "en cola"])
+
+
+def test_say_after_stop_does_not_hang(pipeline_factory):
+    recorder = Recorder()
+    pipeline = pipeline_factory(recorder).start()
+    pipeline.stop()
+    job = pipeline.say(SpeechJob("tarde"))
+    assert job.wait(2.0)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+test_resilience.py - Comprobación de plazos, hedging y cortacircuitos
+Levanta fake_api_server.py en local, le inyecta retrasos y errores y
+verifica que las etapas de module_resilience se comportan: responden a
+tiempo, duplican la petición atascada, abren el circuito y vuelven a
+cerrarlo. No necesita red ni API key.
+
+Uso: python3 -m pytest -q test_resilience.py
+"""
+
+import time
+
+import pytest
+
+openai = pytest.importorskip("openai")
+pytest.importorskip("modules.module_config", reason="module_config es del árbol completo de TARS")
+
+from fake_api_server import FakeAPIServer
+from modules.module_resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, Stage
+
+
+def timed(fn):
+    t0 = time.monotonic()
+    result = fn()
+    return result, time.monotonic() - t0
+
+
+@pytest.fixture
+def server():
+    server = FakeAPIServer(token_delay=0.0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    return openai.OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+
+
+@pytest.fixture
+def chat(client):
+    def chat(timeout):
+        r = client.chat.completions.create(model="fake", messages=[{"role": "user", "content": "hola"}],
+                                           timeout=timeout)
+        return r.choices[0].message.content
+    return chat
+
+
+def test_deadline_returns_fallback(server, chat):
+    """El LLM tarda 3 s y la etapa solo da 1 s."""
+    server.inject("chat", delay=3.0, times=2)
+    stage = Stage("llm", share=1.0, total=1.0, hedge=False)
+    reply, elapsed = timed(lambda: stage.call(chat, fallback=lambda: "plan B"))
+    assert reply == "plan B"
+    assert elapsed < 1.5
+    with pytest.raises(DeadlineExceeded):
+        stage.call(chat)
+
+
+def test_hedging_beats_stuck_request(server, client):
+    """La primera transcripción se atasca 2 s: gana la petición duplicada."""
+    server.inject("transcriptions", delay=2.0, times=1)
+    # Sin historial de latencias la segunda petición sale a mitad de plazo (0.75 s)
+    stage = Stage("stt", share=1.0, total=1.5, hedge=True, hedge_min=0.3)
+
+    def transcribe(timeout):
+        return client.audio.transcriptions.create(model="whisper-1", file=("a.wav", b"RIFF"),
+                                                  timeout=timeout).text
+    text, elapsed = timed(lambda: stage.call(transcribe))
+    assert text == server.transcript
+    assert stage.stats["hedge_wins"] == 1
+    assert elapsed < 1.2
+
+
+def test_floor_outlasts_turn_budget(server, client):
+    """Una frase larga tarda en subir más que la parte del turno (2.4 s): floor la deja terminar."""
+    stage = Stage("stt", share=0.3, total=8.0, hedge=False)
+    assert stage.timeout() == pytest.approx(2.4)
+    assert stage.timeout(cap=1.0) == 1.0
+    assert stage.timeout(floor=6.0) == 6.0
+    server.inject("transcriptions", delay=3.0, times=1)
+
+    def transcribe(timeout):
+        return client.audio.transcriptions.create(model="whisper-1", file=("a.wav", b"RIFF"),
+                                                  timeout=timeout).text
+    assert stage.call(transcribe, floor=4.0) == server.transcript
+    assert stage.stats["timeouts"] == 0
+
+
+def test_hedging_streaming(server, client):
+    """El primer audio del TTS tarda 2 s: el flujo duplicado empieza antes y llega entero."""
+    server.inject("speech", delay=2.0, times=1)
+    stage = Stage("tts", share=1.0, total=1.5, hedge=True, hedge_min=0.3)
+
+    def open_speech(timeout):
+        with client.audio.speech.with_streaming_response.create(
+                model="tts-1", voice="onyx", input="Hola humano.", response_format="pcm",
+                timeout=timeout) as response:
+            yield from response.iter_bytes(4800)
+    t0 = time.monotonic()
+    chunks = stage.stream(open_speech)
+    first = next(chunks)
+    first_at = time.monotonic() - t0
+    audio = first + b"".join(chunks)
+    assert first_at < 1.2
+    assert len(audio) == 2 * int(len("Hola humano.") * server.speech_seconds_per_char * 24000)
+
+
+def test_breaker_opens_and_recovers(server, chat):
+    """La API devuelve 500: el circuito se abre, falla rápido y se cierra al volver la API."""
+    server.inject("chat", status=500)
+    breaker = CircuitBreaker("llm", failures=3, window=10.0, cooldown=1.0)
+    stage = Stage("llm", share=1.0, total=2.0, hedge=False, breaker=breaker)
+    for _ in range(3):
+        stage.call(chat, fallback=lambda: "plan B")
+    assert breaker.state == "open"
+
+    before = server.requests["chat"]
+    reply, elapsed = timed(lambda: stage.call(chat, fallback=lambda: "plan B"))
+    assert reply == "plan B"
+    assert server.requests["chat"] == before  # Sin llamar a la API
+    assert elapsed < 0.01
+    with pytest.raises(CircuitOpenError):
+        stage.call(chat)
+
+    server.clear()
+    time.sleep(1.1)
+    assert breaker.state == "half_open"
+    assert stage.call(chat, fallback=lambda: "plan B") == server.reply
+    assert breaker.state == "closed"
+
+
+def test_llm_streaming(server, client):
+    """Streaming del LLM con la API sana: llega el texto completo."""
+    stage = Stage("llm", share=1.0, total=3.0)
+
+    def open_chat(timeout):
+        stream = client.chat.completions.create(
+            model="fake", messages=[{"role": "user", "content": "hola"}], stream=True, timeout=timeout)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+    assert "".join(stage.stream(open_chat)) == server.reply
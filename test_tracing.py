@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+test_tracing.py - Trazas por turno (module_tracing)
+Cada frase lleva su propia traza desde el oído hasta el turno que la
+contesta: con varias frases en vuelo, las marcas no se cruzan.
+
+Uso: python3 -m pytest -q test_tracing.py
+"""
+
+import json
+import os
+
+import pytest
+
+pytest.importorskip("modules.module_config", reason="module_config es del árbol completo de TARS")
+
+from modules.module_tracing import Tracer
+from modules.module_turns import CancelToken
+
+
+def test_marks_stay_in_their_trace():
+    tracer = Tracer()
+    a, b = tracer.begin(t0=0.0), tracer.begin(t0=0.0)
+    tracer.mark("asr_request", t=1.0, trace=a)
+    tracer.mark("asr_request", t=2.0, trace=b)
+    tracer.mark("asr_response", t=1.5, trace=a)
+    assert a.events == {"asr_request": 1.0, "asr_response": 1.5}
+    assert b.events == {"asr_request": 2.0}
+
+
+def test_turn_claims_the_trace_of_its_utterance():
+    """B se abre después que A, pero el turno que contesta a A se queda con A."""
+    tracer = Tracer()
+    a, b = tracer.begin(), tracer.begin()
+    token = CancelToken(1)
+    token.trace = tracer.claim(a)
+    assert token.trace is a and a.owned and not b.owned
+    tracer.mark("llm_request", t=3.0, token=token)
+    assert "llm_request" in a.events and "llm_request" not in b.events
+
+
+def test_mark_without_trace_is_a_noop():
+    tracer = Tracer()
+    a = tracer.begin()
+    tracer.mark("llm_request")
+    tracer.mark("llm_request", token=CancelToken(1))
+    assert a.events == {}
+    assert tracer.claim(None) is None
+
+
+def test_first_and_finished():
+    tracer = Tracer()
+    trace = tracer.begin(t0=0.0)
+    tracer.mark("llm_first_token", t=1.0, first=True, trace=trace)
+    tracer.mark("llm_first_token", t=2.0, first=True, trace=trace)
+    assert trace.events["llm_first_token"] == 1.0
+    tracer.finish(trace, "cancelled")
+    tracer.finish(trace, "ok")  # Una traza se cierra una sola vez
+    tracer.mark("playback_start", t=3.0, trace=trace)
+    assert trace.status == "cancelled" and "playback_start" not in trace.events
+    assert tracer.stats["traces"] == 1 and tracer.stats["cancelled"] == 1
+
+
+def test_disabled_tracer():
+    tracer = Tracer(enabled=False)
+    assert tracer.begin() is None
+    tracer.finish(None)
+    assert tracer.stats["traces"] == 0
+
+
+def test_durations_and_histograms():
+    tracer = Tracer()
+    for i in range(4):
+        trace = tracer.begin(t0=0.0)
+        for event, t in (("speech_end", 0.0), ("eou", 0.5), ("asr_request", 0.5),
+                         ("asr_response", 0.5 + 0.1 * (i + 1)), ("playback_start", 2.0)):
+            trace.mark(event, t=t)
+        tracer.finish(trace)
+    histograms = tracer.histograms()
+    assert histograms["response"]["count"] == 4
+    assert histograms["response"]["p50"] == 2000.0
+    assert tracer.recent(1)[0]["durations_ms"]["response"] == 2000.0
+
+
+def test_jsonl_rotates(tmp_path):
+    path = os.path.join(tmp_path, "logs", "traces.jsonl")
+    tracer = Tracer(jsonl_path=path, jsonl_max_bytes=1000)
+    for _ in range(40):
+        trace = tracer.begin()
+        trace.mark("speech_end")
+        tracer.finish(trace)
+    assert tracer.stats["rotations"] > 0
+    assert sorted(os.listdir(os.path.dirname(path))) == ["traces.jsonl", "traces.jsonl.1"]
+    for name in ("traces.jsonl", "traces.jsonl.1"):
+        size = os.path.getsize(os.path.join(tmp_path, "logs", name))
+        assert size < 1000 + 200  # Como mucho una línea por encima del tope
+    with open(path, encoding="utf-8") as f:
+        assert all(json.loads(line)["status"] == "ok" for line in f)
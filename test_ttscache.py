@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+test_ttscache.py - Caché de audio TTS (module_ttscache)
+
+Uso: python3 -m pytest -q test_ttscache.py
+"""
+
+import os
+
+from modules.module_ttscache import TTSCache
+
+VOICE = ("onyx", "tts-1", "pcm")
+
+
+def test_miss_then_memory_hit(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    assert cache.get("Yes?", *VOICE) is None
+    cache.put("Yes?", *VOICE, b"audio")
+    assert cache.get(" Yes? ", *VOICE) == b"audio"  # Los espacios de los extremos no cuentan
+    assert ("Yes?",) + VOICE in cache
+    assert cache.get("Yes?", "alloy", "tts-1", "pcm") is None
+    metrics = cache.metrics()
+    assert (metrics["memory_hits"], metrics["misses"], metrics["stores"]) == (1, 2, 1)
+
+
+def test_disk_survives_restart(tmp_path):
+    TTSCache(str(tmp_path)).put("Hola.", *VOICE, b"x" * 100)
+    cache = TTSCache(str(tmp_path))
+    assert cache.metrics()["disk_entries"] == 1
+    assert cache.get("Hola.", *VOICE) == b"x" * 100
+    assert cache.stats["disk_hits"] == 1
+    assert cache.get("Hola.", *VOICE) == b"x" * 100
+    assert cache.stats["memory_hits"] == 1  # La segunda vez ya está en memoria
+
+
+def test_memory_lru_is_bounded(tmp_path):
+    cache = TTSCache(None, max_memory_bytes=250)
+    for text in ("a", "b", "c"):
+        cache.put(text, *VOICE, b"x" * 100)
+    assert cache.get("a", *VOICE) is None  # El más viejo ha salido
+    assert cache.get("c", *VOICE) is not None
+    cache.put("grande", *VOICE, b"x" * 1000)  # No cabe: ni se guarda en memoria
+    assert cache.metrics()["memory_bytes"] <= 250
+
+
+def test_disk_eviction_removes_least_recent(tmp_path):
+    cache = TTSCache(str(tmp_path), max_disk_bytes=250, max_memory_bytes=0)
+    cache.put("a", *VOICE, b"x" * 100)
+    cache.put("b", *VOICE, b"x" * 100)
+    assert cache.get("a", *VOICE) is not None  # 'a' pasa a ser la más reciente
+    cache.put("c", *VOICE, b"x" * 100)
+    assert cache.get("b", *VOICE) is None
+    assert cache.get("a", *VOICE) is not None
+    assert cache.stats["evictions"] == 1
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".bin")]) == 2
+
+
+def test_missing_file_is_a_miss(tmp_path):
+    cache = TTSCache(str(tmp_path), max_memory_bytes=0)
+    cache.put("Hola.", *VOICE, b"audio")
+    os.remove(os.path.join(tmp_path, TTSCache.key("Hola.", *VOICE) + ".bin"))
+    assert cache.get("Hola.", *VOICE) is None
+    assert cache.metrics()["disk_entries"] == 0
+
+
+def test_same_key_written_twice_counts_once(tmp_path):
+    """Dos put simultáneos de la misma frase escriben el mismo fichero dos veces."""
+    cache = TTSCache(str(tmp_path))
+    key = TTSCache.key("Hola.", *VOICE)
+    cache._write_disk(key, b"x" * 100)
+    cache._write_disk(key, b"x" * 120)
+    metrics = cache.metrics()
+    assert (metrics["disk_entries"], metrics["disk_bytes"]) == (1, 120)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+test_turns.py - Cancelación de turnos (module_turns)
+
+Uso: python3 -m pytest -q test_turns.py
+"""
+
+import pytest
+
+from modules.module_turns import TurnCancelled, TurnManager
+
+
+def test_new_turn_cancels_previous():
+    turns = TurnManager()
+    first = turns.begin()
+    second = turns.begin()
+    assert first.cancelled and first.reason == "turno nuevo"
+    assert not second.cancelled and turns.active is second
+    assert turns.stats == {"turns": 2, "cancelled": 1}
+
+
+def test_preempt_only_with_an_active_turn():
+    turns = TurnManager()
+    assert turns.preempt() is False
+    token = turns.begin()
+    assert turns.preempt() is True
+    assert token.cancelled and token.reason == "nueva frase"
+    assert turns.preempt() is False  # Ya estaba cancelado
+
+
+def test_finish_releases_only_its_own_turn():
+    turns = TurnManager()
+    old = turns.begin()
+    new = turns.begin()
+    turns.finish(old)
+    assert turns.active is new
+    turns.finish(new)
+    assert turns.active is None
+    assert "release_ms_p50" in turns.metrics()
+
+
+def test_cancel_callbacks_and_check():
+    turns = TurnManager()
+    token = turns.begin()
+    calls = []
+    token.on_cancel(lambda: calls.append("antes"))
+    token.check()
+    assert token.cancel("prueba") is True
+    assert token.cancel("otra vez") is False
+    token.on_cancel(lambda: calls.append("después"))  # Ya cancelado: en el momento
+    assert calls == ["antes", "después"]
+    assert token.future.result(timeout=0) == "prueba"
+    with pytest.raises(TurnCancelled):
+        token.check()
+
+
+def test_silenced_measures_only_after_cancel():
+    turns = TurnManager()
+    token = turns.begin()
+    assert token.silenced() is None
+    token.cancel()
+    ms = token.silenced()
+    assert ms is not None and ms >= 0.0
+    assert token.silenced() == ms  # Solo cuenta la primera vez
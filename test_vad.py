@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+test_vad.py - Detección de voz (module_vad)
+
+Uso: python3 -m pytest -q test_vad.py
+"""
+
+import numpy as np
+
+from modules.module_vad import AdaptiveVAD, EnergyVAD
+
+FS = 44100
+BLOCK = 2048
+
+
+def band_noise(rng, n, level, low=400.0, high=3000.0):
+    """Ruido solo dentro de la banda de voz (lo que el filtro de banda no puede quitar)."""
+    spectrum = np.fft.rfft(rng.standard_normal(n))
+    freqs = np.fft.rfftfreq(n, 1.0 / FS)
+    spectrum[(freqs < low) | (freqs > high)] = 0
+    noise = np.fft.irfft(spectrum, n)
+    return level * noise / np.sqrt(np.mean(noise ** 2))
+
+
+def test_leftover_samples_carry_over():
+    """2048 muestras no son tramas enteras: lo que sobra entra en el bloque siguiente."""
+    vad = AdaptiveVAD(FS)
+    rng = np.random.default_rng(0)
+    frames = 0
+    for _ in range(50):
+        energy, _, _ = vad.features(rng.standard_normal((BLOCK, 2)).astype(np.float32))
+        frames += energy.size
+    assert frames == (50 * BLOCK) // vad.frame_len
+    vad.reset()
+    assert vad.features(np.zeros(100, dtype=np.float32))[0].size == 0
+
+
+def test_floor_recovers_from_in_band_noise():
+    """Un ruido en banda que arranca después de calibrar no deja el VAD enganchado en 'voz'."""
+    rng = np.random.default_rng(0)
+    vad = AdaptiveVAD(FS)
+    for _ in range(40):
+        vad.process((0.001 * rng.standard_normal(BLOCK)).astype(np.float32))
+    active = [vad.process((0.001 * rng.standard_normal(BLOCK) + band_noise(rng, BLOCK, 0.02))
+                          .astype(np.float32)) for _ in range(400)]
+    assert any(active[:20])         # Al principio parece voz...
+    assert not any(active[-100:])   # ...pero el suelo sube y se suelta (~5 s de ventana)
+
+
+def test_energy_vad_threshold():
+    vad = EnergyVAD(FS, threshold=0.03)
+    assert not vad.process(np.full((BLOCK, 2), 0.01, dtype=np.float32))
+    assert vad.process(np.full((BLOCK, 2), 0.05, dtype=np.float32))